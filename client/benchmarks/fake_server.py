@@ -0,0 +1,110 @@
+import threading
+import time
+from concurrent import futures
+from typing import Dict, Tuple
+
+import grpc
+
+import swh.graph.grpc.swhgraph_pb2 as swhgraph
+import swh.graph.grpc.swhgraph_pb2_grpc as swhgraph_grpc
+
+from helpers.controllers import GraphError
+from helpers.local_graph import LocalGraphBackend, parse_edges
+
+SERVER_WORKERS = 32
+
+
+class FakeTraversalService(swhgraph_grpc.TraversalServiceServicer):
+    """
+    Stand-in for the swh-graph TraversalService, answering from a LocalGraphBackend.
+
+    Every RPC sleeps for `latency` seconds before answering, to model the network
+    and server cost. Calls and response bytes are counted per method.
+
+    Args:
+        backend (LocalGraphBackend): The graph to serve.
+        latency (float): The delay added to every RPC, in seconds.
+    """
+
+    def __init__(self, backend: LocalGraphBackend, latency: float = 0.0):
+        self.backend = backend
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self.bytes_sent: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, method: str, calls: int = 0, size: int = 0):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + calls
+            self.bytes_sent[method] = self.bytes_sent.get(method, 0) + size
+
+    def reset(self):
+        """
+        Clears the counters.
+        """
+        with self._lock:
+            self.calls.clear()
+            self.bytes_sent.clear()
+
+    def _delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _mask(self, request):
+        return list(request.mask.paths) if request.HasField("mask") else None
+
+    def GetNode(self, request, context):
+        self._count("GetNode", calls=1)
+        self._delay()
+        index = self.backend.index(request.swhid)
+        if index is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Unknown SWHID: {request.swhid}")
+        node = self.backend.build_node(index, mask=self._mask(request))
+        self._count("GetNode", size=node.ByteSize())
+        return node
+
+    def Traverse(self, request, context):
+        self._count("Traverse", calls=1)
+        self._delay()
+        allowed = parse_edges(request.edges)
+        mask = self._mask(request)
+        try:
+            for index in self.backend.walk(request):
+                node = self.backend.build_node(index, allowed, mask)
+                self._count("Traverse", size=node.ByteSize())
+                yield node
+        except GraphError as e:
+            context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+
+    def CountNodes(self, request, context):
+        self._count("CountNodes", calls=1)
+        self._delay()
+        try:
+            return swhgraph.CountResponse(count=sum(1 for _ in self.backend.walk(request)))
+        except GraphError as e:
+            context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+
+    def Stats(self, request, context):
+        self._count("Stats", calls=1)
+        stats, _ = self.backend.get_stats()
+        return stats
+
+
+def start_fake_server(backend: LocalGraphBackend, latency: float = 0.0, port: int = 0) -> Tuple[grpc.Server, int, FakeTraversalService]:
+    """
+    Starts a FakeTraversalService on localhost.
+
+    Args:
+        backend (LocalGraphBackend): The graph to serve.
+        latency (float): The delay added to every RPC, in seconds.
+        port (int): The port to listen on, 0 for any free port.
+
+    Returns:
+        Tuple[grpc.Server, int, FakeTraversalService]: The server, its port and the service, for its counters.
+    """
+    service = FakeTraversalService(backend, latency)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=SERVER_WORKERS))
+    swhgraph_grpc.add_TraversalServiceServicer_to_server(service, server)
+    port = server.add_insecure_port(f"localhost:{port}")
+    server.start()
+    return server, port, service
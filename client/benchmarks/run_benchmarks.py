@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.fake_server import start_fake_server
+from benchmarks.synthetic_graph import generate_graph
+from helpers.async_controllers import AsyncGraphClient
+from helpers.controllers import GraphClient, set_client
+from helpers.local_graph import LocalGraphBackend, build_arrays
+from helpers.node_cache import configure_node_cache
+from helpers.revisions_traversal import EXTRACTION_MODES, get_revisions_from_latest
+from helpers.subtree_cache import SUBTREE_CACHE_SIZE, configure_subtree_cache
+import main
+
+# Measures the per-origin cost of the client against an in-process fake
+# TraversalService serving a synthetic graph. Run from the client directory:
+#   python -m benchmarks.run_benchmarks --output data/bench.json
+#   python -m benchmarks.run_benchmarks --baseline data/bench.json
+
+BENCHMARK_OUTPUT = "data/benchmark.json"
+SCENARIOS = ["revisions", "metrics", "metrics-async"]
+DEFAULT_TOLERANCE = 0.2
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list, 0 if it is empty.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def run_scenario(scenario: str, origins: List[str], server: str, extraction: str, concurrency: int) -> List[float]:
+    """
+    Processes every origin once and times each of them.
+
+    Args:
+        scenario (str): One of SCENARIOS.
+        origins (List[str]): The origin swhids.
+        server (str): The address of the fake server.
+        extraction (str): One of EXTRACTION_MODES.
+        concurrency (int): The number of origins in flight for metrics-async.
+
+    Returns:
+        List[float]: The per-origin latencies, in seconds.
+    """
+    latencies = []
+    if scenario == "metrics-async":
+        async def run():
+            async with AsyncGraphClient(server) as client:
+                semaphore = asyncio.Semaphore(max(1, concurrency))
+
+                async def timed(origin):
+                    async with semaphore:
+                        start = time.perf_counter()
+                        await main.process_origin_async(client, origin, extraction)
+                        latencies.append(time.perf_counter() - start)
+
+                await asyncio.gather(*(timed(origin) for origin in origins))
+        asyncio.run(run())
+        return latencies
+
+    for origin in origins:
+        start = time.perf_counter()
+        if scenario == "revisions":
+            get_revisions_from_latest(origin, extraction)
+        else:
+            main.process_origin(origin, extraction)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def run_benchmarks(args) -> Dict:
+    """
+    Generates the graph, starts the fake server and runs every scenario and extraction mode.
+
+    Returns:
+        Dict: The report.
+    """
+    start = time.perf_counter()
+    nodes, origins = generate_graph(args.origins, args.depth, args.branches, args.fork_share,
+                                    args.tree_dirs, args.tree_files, args.authors, args.seed)
+    arrays, labels, urls = build_arrays(nodes)
+    backend = LocalGraphBackend.from_arrays(arrays, labels, urls)
+    generation_time = time.perf_counter() - start
+
+    grpc_server, port, service = start_fake_server(backend, args.latency_ms / 1000)
+    server = f"localhost:{port}"
+    set_client(GraphClient(server))
+    configure_node_cache(None)
+
+    results = []
+    try:
+        for scenario in args.scenarios:
+            for extraction in args.extractions:
+                configure_subtree_cache(args.subtree_cache_size)
+                service.reset()
+                start = time.perf_counter()
+                latencies = run_scenario(scenario, origins, server, extraction, args.concurrency)
+                elapsed = time.perf_counter() - start
+                result = {
+                    "scenario": scenario,
+                    "extraction": extraction,
+                    "origins": len(origins),
+                    "seconds": round(elapsed, 4),
+                    "origins_per_s": round(len(origins) / elapsed, 2) if elapsed else None,
+                    "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+                    "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+                    "rpcs": dict(service.calls),
+                    "bytes_sent": sum(service.bytes_sent.values()),  # Serialized responses, counted by the server
+                }
+                results.append(result)
+                print(f"{scenario:14} {extraction:8} {result['origins_per_s']:>9} origins/s  "
+                      f"p50 {result['p50_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+                      f"{sum(result['rpcs'].values())} RPCs  {result['bytes_sent']} bytes sent")
+    finally:
+        set_client(None)
+        grpc_server.stop(None)
+
+    return {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "tolerance")},
+        "graph": {"nodes": len(arrays["keys"]), "edges": len(arrays["targets"]), "generation_s": round(generation_time, 3)},
+        "results": results,
+    }
+
+def git_version() -> Optional[str]:
+    """
+    Returns the current commit, None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Lists the scenarios whose throughput dropped by more than `tolerance` against a baseline report.
+
+    Args:
+        report (Dict): The current report.
+        baseline (Dict): A previous report.
+        tolerance (float): The accepted relative slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        List[str]: One message per regression.
+    """
+    previous = {(result["scenario"], result["extraction"]): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get((result["scenario"], result["extraction"]))
+        if not before or not before.get("origins_per_s") or not result["origins_per_s"]:
+            continue
+        ratio = result["origins_per_s"] / before["origins_per_s"]
+        print(f"{result['scenario']:14} {result['extraction']:8} {ratio:.2f}x baseline ({before['origins_per_s']} origins/s)")
+        if ratio < 1 - tolerance:
+            regressions.append(f"{result['scenario']}/{result['extraction']}: {result['origins_per_s']} origins/s, "
+                               f"baseline {before['origins_per_s']} origins/s")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the client against a fake swh-graph server.")
+    parser.add_argument("--origins", type=int, default=100, help="Number of synthetic origins.")
+    parser.add_argument("--depth", type=int, default=200, help="Revisions on each main branch.")
+    parser.add_argument("--branches", type=int, default=3, help="Branches per snapshot.")
+    parser.add_argument("--fork-share", type=float, default=0.3, help="Probability that an origin forks an earlier one.")
+    parser.add_argument("--tree-dirs", type=int, default=8, help="Subdirectories of each root directory.")
+    parser.add_argument("--tree-files", type=int, default=16, help="Contents of each subdirectory.")
+    parser.add_argument("--authors", type=int, default=20, help="Distinct authors per origin.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the generator.")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Delay added by the server to every RPC.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--extractions", nargs="+", choices=EXTRACTION_MODES, default=EXTRACTION_MODES)
+    parser.add_argument("--concurrency", type=int, default=main.DEFAULT_CONCURRENCY, help="Origins in flight for metrics-async.")
+    parser.add_argument("--subtree-cache-size", type=int, default=SUBTREE_CACHE_SIZE)
+    parser.add_argument("--output", default=BENCHMARK_OUTPUT, help="Where to save the JSON report.")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Accepted relative throughput drop against the baseline.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Errors only, on the console: the benchmark must not write to the client's log file
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+
+    report = run_benchmarks(args)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved report to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,99 @@
+import hashlib
+import random
+from typing import Dict, List, Tuple
+
+# Deterministic generator of swh-graph-like subgraphs for the benchmarks. The
+# nodes use the collected-node format of local_graph.build_arrays, so a graph
+# can be served from memory by LocalGraphBackend.from_arrays.
+
+URL_KINDS = ["https://github.com/bench/{}", "https://pypi.org/project/{}/", "https://example.org/{}.git"]
+
+
+def _swhid(node_type: str, *parts) -> str:
+    return f"swh:1:{node_type}:{hashlib.sha1(repr(parts).encode()).hexdigest()}"
+
+def generate_graph(origins: int = 100, depth: int = 200, branches: int = 3, fork_share: float = 0.3,
+                   tree_dirs: int = 8, tree_files: int = 16, authors: int = 20, seed: int = 0) -> Tuple[Dict[str, Tuple], List[str]]:
+    """
+    Generates a graph of origins with one snapshot each.
+
+    Every origin has a main history of `depth` revisions and `branches - 1` side
+    branches forking off it. A fork (with probability fork_share) starts its
+    history from a revision of an earlier origin, so both share that prefix. Each
+    revision's root directory holds `tree_dirs` subdirectories of `tree_files`
+    contents, one of which changes at every commit.
+
+    Args:
+        origins (int): The number of origins.
+        depth (int): The number of revisions of each main branch.
+        branches (int): The number of branches per snapshot.
+        fork_share (float): The probability that an origin is a fork of an earlier one.
+        tree_dirs (int): The number of subdirectories of each root directory.
+        tree_files (int): The number of contents of each subdirectory.
+        authors (int): The number of distinct authors per origin.
+        seed (int): The random seed.
+
+    Returns:
+        Tuple[Dict[str, Tuple], List[str]]: The nodes, in local_graph.build_arrays format, and the origin swhids.
+    """
+    rng = random.Random(seed)
+    nodes: Dict[str, Tuple] = {}
+    origin_ids: List[str] = []
+    mains: List[List[str]] = []
+
+    def add(swhid, successors=(), author=0, author_date=0, length=-1, url=None):
+        nodes[swhid] = (list(successors), author, author_date, length, url)
+
+    def add_subdir(o, d, version):
+        subdir = _swhid("dir", o, d, version)
+        files = []
+        for f in range(tree_files):
+            content = _swhid("cnt", o, d, f, version if f == 0 else 0)
+            if content not in nodes:
+                add(content, length=rng.randint(1, 20_000))
+            files.append((content, ()))
+        add(subdir, files)
+        return subdir
+
+    def add_history(o, label, parent, count, first_date, tree):
+        head = parent
+        for c in range(count):
+            changed = rng.randrange(tree_dirs) if tree_dirs else 0
+            if tree_dirs:
+                tree[changed] = add_subdir(o, changed, f"{label}-{c}")
+            root = _swhid("dir", o, label, c)
+            add(root, [(subdir, ()) for subdir in tree])
+            rev = _swhid("rev", o, label, c)
+            successors = [(root, ())] + ([(head, ())] if head else [])
+            add(rev, successors, author=o * authors + rng.randrange(authors), author_date=first_date + c * 3600)
+            head = rev
+        return head
+
+    for o in range(origins):
+        tree = [add_subdir(o, d, "base") for d in range(tree_dirs)]
+        parent = None
+        if mains and rng.random() < fork_share:
+            base = rng.choice(mains)
+            parent = base[rng.randrange(len(base))]
+
+        main = []
+        head = parent
+        for c in range(depth):
+            head = add_history(o, f"main{c}", head, 1, 1_500_000_000 + c * 3600, tree)
+            main.append(head)
+        mains.append(main)
+
+        branch_names = [b"refs/heads/main" if o % 2 else b"refs/heads/master"]
+        heads = [head]
+        for b in range(1, branches):
+            start = main[rng.randrange(len(main))] if main else parent
+            heads.append(add_history(o, f"branch{b}", start, max(1, depth // 4), 1_600_000_000, list(tree)))
+            branch_names.append(f"refs/heads/branch{b}".encode())
+
+        snapshot = _swhid("snp", o)
+        add(snapshot, [(h, (name,)) for h, name in zip(heads, branch_names) if h])
+        origin = _swhid("ori", o)
+        add(origin, [(snapshot, ())], url=URL_KINDS[o % len(URL_KINDS)].format(f"project{o}"))
+        origin_ids.append(origin)
+
+    return nodes, origin_ids
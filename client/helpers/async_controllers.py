@@ -0,0 +1,199 @@
+import asyncio
+import grpc
+
+from typing import AsyncIterator, Optional, Tuple, List
+
+import swh.graph.grpc.swhgraph_pb2 as swhgraph
+import swh.graph.grpc.swhgraph_pb2_grpc as swhgraph_grpc
+
+from helpers.budget import BudgetExceeded, get_budget
+from helpers.instrumentation import get_instrumentation
+from helpers.node_cache import get_node_cache
+from helpers.controllers import (
+    GRAPH_GRPC_SERVER,
+    CHANNEL_POOL_SIZE,
+    CHANNEL_OPTIONS,
+    GET_NODE_TIMEOUT,
+    GET_NODES_IN_FLIGHT,
+    TRAVERSE_TIMEOUT,
+    GraphError,
+    build_traversal_request,
+    rpc_timeout,
+)
+
+
+class AsyncGraphClient:
+    """
+    asyncio counterpart of GraphClient built on grpc.aio.
+
+    The channels must be opened and closed from inside the running event loop,
+    so the client is meant to be used as an async context manager.
+
+    Args:
+        server (str): The address of the gRPC server.
+        pool_size (int): The number of channels to keep open.
+    """
+
+    def __init__(self, server: str = GRAPH_GRPC_SERVER, pool_size: int = CHANNEL_POOL_SIZE):
+        self.server = server
+        self.pool_size = max(1, pool_size)
+        self._channels: List[grpc.aio.Channel] = []
+        self._stubs: List[swhgraph_grpc.TraversalServiceStub] = []
+        self._next = 0
+
+    async def __aenter__(self):
+        for _ in range(self.pool_size):
+            channel = grpc.aio.insecure_channel(self.server, options=CHANNEL_OPTIONS, interceptors=get_instrumentation().aio_interceptors() or None)
+            self._channels.append(channel)
+            self._stubs.append(swhgraph_grpc.TraversalServiceStub(channel))
+        return self
+
+    async def __aexit__(self, *exc):
+        for channel in self._channels:
+            await channel.close()
+        self._channels = []
+        self._stubs = []
+
+    def stub(self) -> swhgraph_grpc.TraversalServiceStub:
+        """
+        Returns a stub bound to one of the pooled channels in round-robin order.
+
+        Returns:
+            swhgraph_grpc.TraversalServiceStub: An asyncio stub.
+        """
+        # Only ever called from the event loop thread, no locking needed
+        stub = self._stubs[self._next % len(self._stubs)]
+        self._next += 1
+        return stub
+
+    async def get_node(self, swhid: str, fresh: bool = False) -> Tuple[Optional[swhgraph.Node], Optional[str]]:
+        """
+        Fetches a node from the gRPC server.
+
+        Args:
+            swhid (str): The identifier of the node to fetch.
+            fresh (bool): Fetch the node even if it is cached, and cache the new one.
+
+        Returns:
+            Tuple[Optional[swhgraph.Node], Optional[str]]:
+            - The node if successful, None otherwise.
+            - An error message if an error occurs, None otherwise.
+        """
+        cache = get_node_cache()
+        if cache is not None and not fresh:
+            node = cache.get(swhid)
+            if node is not None:
+                return node, None
+        try:
+            response = await self.stub().GetNode(swhgraph.GetNodeRequest(swhid=swhid), timeout=rpc_timeout(GET_NODE_TIMEOUT))
+            if cache is not None:
+                cache.put(swhid, response)
+            return response, None
+        except grpc.RpcError as e:
+            return None, f"gRPC request failed: {e.details()} (Code: {e.code()})"
+        except Exception as e:
+            return None, f"Unexpected error during stub.GetNode: {e}"
+
+    async def get_nodes(self, swhids: List[str], max_in_flight: int = GET_NODES_IN_FLIGHT) -> List[Tuple[Optional[swhgraph.Node], Optional[str]]]:
+        """
+        Fetches several nodes with concurrent GetNode calls.
+
+        Args:
+            swhids (List[str]): The identifiers of the nodes to fetch.
+            max_in_flight (int): The maximum number of calls in flight at once.
+
+        Returns:
+            List[Tuple[Optional[swhgraph.Node], Optional[str]]]: One (node, error message)
+            pair per identifier, in input order.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+        async def fetch(swhid):
+            async with semaphore:
+                return await self.get_node(swhid)
+
+        unique = list(dict.fromkeys(swhids))
+        fetched = dict(zip(unique, await asyncio.gather(*(fetch(swhid) for swhid in unique))))
+        return [fetched[swhid] for swhid in swhids]
+
+    async def count_nodes(self, src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Counts the nodes a traversal would return, without streaming them.
+
+        Args:
+            src (List[str]): The identifiers of the source nodes to start the traversal from.
+            node_filter (Optional[str]): The type of nodes to count (e.g., "rev"). Defaults to None.
+            profile (Optional[str]): The name of a traversal profile in TRAVERSAL_PROFILES. Defaults to None.
+
+        Returns:
+            Tuple[Optional[int], Optional[str]]:
+            - The number of nodes if successful, None otherwise.
+            - An error message if an error occurs, None otherwise.
+        """
+        try:
+            request = build_traversal_request(src, node_filter, profile)
+            response = await self.stub().CountNodes(request, timeout=rpc_timeout(TRAVERSE_TIMEOUT))
+            return response.count, None
+        except grpc.RpcError as e:
+            return None, f"gRPC request failed: {e.details()} (Code: {e.code()})"
+        except Exception as e:
+            return None, f"Unexpected error during stub.CountNodes: {e}"
+
+    async def traverse_iter(self, src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> AsyncIterator[swhgraph.Node]:
+        """
+        Traverses the graph like traverse, but yields the nodes as they arrive.
+
+        Args:
+            src (List[str]): The identifiers of the source nodes to start the traversal from.
+            node_filter (Optional[str]): The type of nodes to return (e.g., "ori"). Defaults to None.
+            profile (Optional[str]): The name of a traversal profile in TRAVERSAL_PROFILES. Defaults to None.
+
+        Yields:
+            swhgraph.Node: The nodes encountered during traversal.
+
+        Raises:
+            GraphError: If the traversal cannot be started or fails midway.
+            BudgetExceeded: If the budget of the current origin runs out, the stream is then cancelled.
+        """
+        try:
+            request = build_traversal_request(src, node_filter, profile)
+        except ValueError as e:
+            raise GraphError(str(e)) from e
+
+        budget = get_budget()
+        call = self.stub().Traverse(request, timeout=rpc_timeout(TRAVERSE_TIMEOUT))
+        try:
+            async for node in call:
+                if budget is not None:
+                    budget.charge(node)
+                yield node
+        except BudgetExceeded:
+            raise
+        except grpc.RpcError as e:
+            if budget is not None and budget.expired():
+                raise budget.exceed("timeout", "Time budget exceeded") from e
+            raise GraphError(f"gRPC request failed: {e.details()} (Code: {e.code()})") from e
+        except Exception as e:
+            raise GraphError(f"Unexpected error during stub.Traverse: {e}") from e
+        finally:
+            call.cancel()
+
+    async def traverse(self, src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Tuple[Optional[List[swhgraph.Node]], Optional[str]]:
+        """
+        Traverses the graph starting from the given source nodes with an optional node filter.
+
+        Args:
+            src (List[str]): The identifiers of the source nodes to start the traversal from.
+            node_filter (Optional[str]): The type of nodes to return (e.g., "ori"). Defaults to None.
+            profile (Optional[str]): The name of a traversal profile in TRAVERSAL_PROFILES. Defaults to None.
+
+        Returns:
+            Tuple[Optional[List[swhgraph.Node]], Optional[str]]:
+            - A list of nodes encountered during traversal if successful, None otherwise.
+            - An error message if an error occurs, None otherwise.
+        """
+        try:
+            nodes = [node async for node in self.traverse_iter(src, node_filter, profile)]
+            return nodes, None
+        except GraphError as e:
+            return None, str(e)
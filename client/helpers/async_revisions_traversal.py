@@ -0,0 +1,220 @@
+from helpers.async_controllers import AsyncGraphClient, GraphError
+from helpers.budget import BudgetExceeded, budget_exhausted
+from helpers.instrumentation import span
+from helpers.reducers import ContentLengthSum
+from helpers.revision_frame import REV_PREFIX, RevisionFrame
+from helpers.sketches import needs_sketch, new_sketch_frame, sketch_mode
+import helpers.reducers as reducers
+from helpers.subtree_cache import ContentSet, get_subtree_cache
+from helpers.revisions_traversal import history_sources, resolve_branches, summarize_history, walk_history, walks_single_head
+from typing import Optional, Tuple, List, Set, Dict
+
+import numpy as np
+
+# asyncio versions of the pipeline in revisions_traversal.py. The RPC
+# orchestration is mirrored step by step so both paths produce the same
+# metrics; the pure parts are shared.
+
+async def reduce_stream(nodes, consumers: List):
+    """
+    Async counterpart of reducers.reduce_stream.
+    """
+    updates = [consumer.update for consumer in consumers]
+    async for node in nodes:
+        for update in updates:
+            update(node)
+
+async def subtree_contents(client: AsyncGraphClient, dir_id: str) -> Tuple[Optional[ContentSet], Optional[str]]:
+    """
+    Async version of revisions_traversal.subtree_contents.
+    """
+    cache = get_subtree_cache()
+    cached = cache.get(dir_id)
+    if cached is not None:
+        return cached, None
+
+    contents = ContentLengthSum()
+    try:
+        await reduce_stream(client.traverse_iter([dir_id], profile="tree-size"), [contents])
+    except GraphError as e:
+        return None, str(e)
+    entry = ContentSet.from_lengths(contents.lengths)
+    cache.put(dir_id, entry)
+    return entry, None
+
+async def tree_size(client: AsyncGraphClient, dir_id: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Async version of revisions_traversal.tree_size.
+    """
+    cache = get_subtree_cache()
+    if not cache.enabled:
+        contents = ContentLengthSum()
+        try:
+            await reduce_stream(client.traverse_iter([dir_id], profile="tree-size"), [contents])
+        except GraphError as e:
+            return None, str(e)
+        return contents.total, None
+
+    cached = cache.get(dir_id)
+    if cached is not None:
+        return cached.size, None
+
+    dir_node, error_msg = await client.get_node(dir_id)
+    if error_msg:
+        return None, error_msg
+
+    files = ContentLengthSum()
+    try:
+        await reduce_stream(client.traverse_iter([dir_id], profile="dir-files"), [files])
+    except GraphError as e:
+        return None, str(e)
+    parts = [ContentSet.from_lengths(files.lengths)]
+
+    for successor in dir_node.successor:
+        if successor.swhid.startswith("swh:1:dir"):
+            entry, error_msg = await subtree_contents(client, successor.swhid)
+            if error_msg:
+                return None, error_msg
+            parts.append(entry)
+
+    contents = ContentSet.union(parts)
+    cache.put(dir_id, contents)
+    return contents.size, None
+
+async def extract_origin_history(client: AsyncGraphClient, origin_node) -> Tuple[Optional[Dict[str, object]], Optional[str]]:
+    """
+    Async version of revisions_traversal.extract_origin_history.
+    """
+    profile = "origin-snapshots" if walks_single_head(origin_node) else "origin-history"
+    nodes = {}
+    try:
+        async for node in client.traverse_iter([origin_node.swhid], profile=profile):
+            nodes[node.swhid] = node
+    except BudgetExceeded:
+        pass  # Keep what was streamed, the traversal reaches the snapshots first
+    except GraphError as e:
+        return None, str(e)
+    return nodes, None
+
+async def history_frame(client: AsyncGraphClient, revision_ids: List[str], history: Optional[Dict[str, object]] = None):
+    """
+    Async version of revisions_traversal.history_frame.
+    """
+    revision_count = None
+    if sketch_mode() == "auto":
+        if history is not None:
+            revision_count = sum(1 for swhid in history if swhid.startswith(REV_PREFIX))
+        else:
+            revision_count, _ = await client.count_nodes(revision_ids, profile="history")  # Counted exactly on error
+    return new_sketch_frame() if needs_sketch(revision_count) else RevisionFrame()
+
+async def collect_revisions_timestamps_and_devs_and_size(client: AsyncGraphClient, revision_ids: List[str], history: Optional[Dict[str, object]] = None, multi_source: bool = False) -> Tuple[int, Optional[Tuple[int, int]], int, List[int], Optional[int], np.ndarray, Optional[Dict[str, int]], Optional[str]]:
+    """
+    Async version of revisions_traversal.collect_revisions_timestamps_and_devs_and_size.
+
+    Args:
+        client (AsyncGraphClient): The client to issue the RPCs with.
+        revision_ids (List[str]): The list of revision IDs to traverse from.
+        history (Optional[Dict[str, Node]]): Revisions already fetched by extract_origin_history.
+        multi_source (bool): Walk the history from every head at once, see revisions_traversal.history_sources.
+
+    Returns:
+        Tuple[int, Optional[Tuple[int, int]], int, List[int], Optional[int], np.ndarray, Optional[Dict[str, int]], Optional[str]]:
+        Same values as the synchronous version.
+    """
+    with span("history"):
+        frame = await history_frame(client, revision_ids, history)
+        for src in history_sources(revision_ids, multi_source):
+            try:
+                if history is not None:
+                    reducers.reduce_stream(walk_history(history, src), [frame])
+                else:
+                    await reduce_stream(client.traverse_iter(src, profile="history"), [frame])
+            except BudgetExceeded:
+                break  # Keep the revisions gathered so far
+            except GraphError as e:
+                return 0, None, 0, [], 0, [], None, str(e)
+
+    with span("size"):
+        total_size = None  # Left unknown once the budget of the origin is exhausted
+        if not budget_exhausted():
+            revnode, error_msg = await client.get_node(revision_ids[0])
+            if error_msg and not budget_exhausted():
+                return None, None, None, None, None, None, None, error_msg
+
+            if not error_msg:
+                total_size = 0
+                try:
+                    if revnode and revnode.successor:
+                        for successor in revnode.successor:
+                            if successor.swhid.startswith("swh:1:dir"):
+                                dir_size, error_msg = await tree_size(client, successor.swhid)
+                                if error_msg:
+                                    total_size = None  # Mark size calculation as failed
+                                    break
+                                total_size += dir_size
+                except BudgetExceeded:
+                    total_size = None
+
+    return frame.commit_count(), frame.timestamp_range(), frame.developer_count(), list(frame.commits_per_developer()), total_size, frame.developer_counts(), frame.error_bounds(), None
+
+async def get_revisions_from_latest(client: AsyncGraphClient, swhid: str, extraction: str = "classic"):
+    """
+    Async version of revisions_traversal.get_revisions_from_latest.
+
+    Args:
+        client (AsyncGraphClient): The client to issue the RPCs with.
+        swhid (str): The identifier of the repository to fetch revisions from.
+        extraction (str): How the history is fetched, one of revisions_traversal.EXTRACTION_MODES.
+
+    Returns:
+        Same 10-tuple as the synchronous version: url, commits, latest commit, age,
+        developer count, developers, Gini index, size, error bounds and an error message.
+    """
+    if not swhid:
+        return None, None, None, None, None, None, None, None, None, "No swhid provided"
+    if not swhid.startswith("swh:1:ori:"):
+        return None, None, None, None, None, None, None, None, None, "Invalid swhid format"
+
+    # Step 1: Get the origin node
+    with span("fetch-origin"):
+        origin_node, error_msg = await client.get_node(swhid)
+    if error_msg:
+        return None, None, None, None, None, None, None, None, None, error_msg
+    if not origin_node:
+        return None, None, None, None, None, None, None, None, None, "No origin node found"
+    url = origin_node.ori.url
+
+    # Step 2: Get the latest snapshot node
+    if not origin_node.successor:
+        return None, None, None, None, None, None, None, None, None, "No successors found"
+
+    snapshot_ids = [successor.swhid for successor in origin_node.successor if successor.swhid.startswith("swh:1:snp")]
+    history = None
+    if extraction == "single":
+        with span("history"):
+            history, error_msg = await extract_origin_history(client, origin_node)
+        if error_msg:
+            return None, None, None, None, None, None, None, None, None, error_msg
+        snapshot_candidates = ((history.get(snapshot_id), None) for snapshot_id in snapshot_ids)
+    else:
+        with span("snapshot"):
+            snapshot_candidates = await client.get_nodes(snapshot_ids)
+
+    # Step 3: Extract the main or master revision from the snapshot
+    with span("snapshot"):
+        snapshot_node, revision_ids, error_msg = resolve_branches(origin_node, snapshot_candidates)
+    if error_msg:
+        return None, None, None, None, None, None, None, None, None, error_msg
+    if history is not None and walks_single_head(origin_node):
+        history = None  # Only the snapshots were streamed, the head is traversed on the server
+
+    # Step 4: Collect distinct 'rev' nodes, timestamps, devs, and calculate repo size
+    distinct_revs, timestamp_range, num_devs, devs, repo_size, developer_counts, error_bounds, error_msg = await collect_revisions_timestamps_and_devs_and_size(client, revision_ids, history, extraction == "multi-source")
+    if error_msg:
+        return None, None, None, None, None, None, None, None, None, error_msg
+
+    with span("metrics"):
+        latest_commit, age, gini = summarize_history(timestamp_range, developer_counts)
+
+    return url, distinct_revs, latest_commit, age, num_devs, devs, gini, repo_size, error_bounds, None
@@ -0,0 +1,165 @@
+import contextlib
+import contextvars
+import time
+from typing import Optional
+
+# Per-origin budgets on wall time, streamed nodes and streamed bytes. The
+# budget of the origin being processed is held in a context variable, so it
+# follows each thread and asyncio task. The graph clients shorten their RPC
+# deadlines to the time left and charge every streamed node to it; once a
+# limit is hit, the stream is cancelled and BudgetExceeded stops the traversal,
+# leaving the metrics gathered so far to be recorded with a non-complete status.
+
+# Status of an origin in the metrics output: "partial" when it ran out of nodes
+# or bytes, "timeout" when it ran out of time
+ORIGIN_STATUSES = ["complete", "partial", "timeout"]
+
+# An RPC whose deadline was shortened to the time left fails when that time is
+# up, possibly a moment before the budget itself reads as expired
+DEADLINE_SLACK = 0.05
+
+_current_budget: contextvars.ContextVar = contextvars.ContextVar("current_budget", default=None)
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised from a traversal stream when the budget of the current origin is exhausted.
+
+    Args:
+        status (str): "partial" or "timeout".
+        message (str): What was exceeded.
+    """
+
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Budget:
+    """
+    The limits of one origin and what it consumed so far. None disables a limit.
+
+    Args:
+        seconds (Optional[float]): The wall time allowed, from creation.
+        max_nodes (Optional[int]): The number of nodes the traversals may stream.
+        max_bytes (Optional[int]): The serialized size of the nodes the traversals may stream.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, max_nodes: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self.nodes = 0
+        self.bytes = 0
+        self.status = "complete"
+
+    @property
+    def exhausted(self) -> bool:
+        return self.status != "complete"
+
+    def expired(self) -> bool:
+        """
+        Returns whether the wall time is used up.
+        """
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def timeout(self, default: float) -> float:
+        """
+        Returns the deadline to give an RPC: its usual one, shortened to the time left.
+
+        Args:
+            default (float): The usual deadline of the RPC, in seconds.
+        """
+        if self.deadline is None:
+            return default
+        return max(0.0, min(default, self.deadline - time.monotonic()))
+
+    def exceed(self, status: str, message: str) -> BudgetExceeded:
+        """
+        Marks the budget as exhausted and returns the exception to raise. The first status sticks.
+        """
+        if self.status == "complete":
+            self.status = status
+        return BudgetExceeded(status, message)
+
+    def charge(self, node):
+        """
+        Counts one streamed node.
+
+        Raises:
+            BudgetExceeded: If a limit is now exceeded.
+        """
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise self.exceed("partial", f"Node budget of {self.max_nodes} exceeded")
+        if self.max_bytes is not None:
+            self.bytes += node.ByteSize()
+            if self.bytes > self.max_bytes:
+                raise self.exceed("partial", f"Byte budget of {self.max_bytes} exceeded")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise self.exceed("timeout", "Time budget exceeded")
+
+
+_limits = (None, None, None)
+
+def configure_budget(seconds: Optional[float] = None, max_nodes: Optional[int] = None, max_bytes: Optional[int] = None):
+    """
+    Sets the process-wide limits given to each origin. None disables a limit.
+
+    Args:
+        seconds (Optional[float]): The wall time allowed per origin.
+        max_nodes (Optional[int]): The number of nodes the traversals of an origin may stream.
+        max_bytes (Optional[int]): The serialized size of the nodes the traversals of an origin may stream.
+    """
+    global _limits
+    _limits = (seconds, max_nodes, max_bytes)
+
+def get_budget() -> Optional[Budget]:
+    """
+    Returns the budget of the origin being processed, None outside of origin_budget.
+    """
+    return _current_budget.get()
+
+@contextlib.contextmanager
+def origin_budget():
+    """
+    Gives a fresh budget with the configured limits to the origin processed in the block.
+
+    Yields:
+        Budget: The budget, to read its status once the origin is done.
+    """
+    budget = Budget(*_limits)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+def budget_exhausted() -> bool:
+    """
+    Returns whether the current origin ran out of budget, marking it as timed out once its time is up.
+    """
+    budget = get_budget()
+    if budget is None:
+        return False
+    if not budget.exhausted and budget.expired():
+        budget.exceed("timeout", "Time budget exceeded")
+    return budget.exhausted
+
+def over_budget(error_msg: Optional[str]) -> bool:
+    """
+    Returns whether an error of the current origin comes from its budget running out,
+    such as an RPC cut short by the time left, marking the origin as timed out if so.
+
+    Args:
+        error_msg (Optional[str]): The error message the origin failed with.
+    """
+    if budget_exhausted():
+        return True
+    budget = get_budget()
+    if budget is None or budget.deadline is None or not error_msg or "DEADLINE_EXCEEDED" not in error_msg:
+        return False
+    if budget.timeout(DEADLINE_SLACK) < DEADLINE_SLACK:
+        budget.exceed("timeout", "Time budget exceeded")
+        return True
+    return False
@@ -1,44 +1,464 @@
 import grpc
+import json
+import threading
+from collections import deque
 
-from typing import Optional, Tuple, List
+from typing import Dict, Iterator, Optional, Tuple, List
 
 import swh.graph.grpc.swhgraph_pb2 as swhgraph
 import swh.graph.grpc.swhgraph_pb2_grpc as swhgraph_grpc
+from google.protobuf.field_mask_pb2 import FieldMask
+
+from helpers.budget import BudgetExceeded, get_budget
+from helpers.instrumentation import get_instrumentation
+from helpers.node_cache import NODE_CACHE_FILE, configure_node_cache, get_node_cache
+from helpers.replay import get_recorder, get_replay
 
 import os
 
 GRAPH_GRPC_SERVER = "host.docker.internal:5010"
 
-def get_node(swhid: str) -> Tuple[Optional[swhgraph.GetNodeRequest], Optional[str]]:
+# Number of HTTP/2 connections kept open to the server. Each channel
+# multiplexes concurrent calls, so a handful is enough to spread the load.
+CHANNEL_POOL_SIZE = 4
+
+# Per-call deadlines in seconds. Traversals of large histories stream for a
+# long time, so they get a much larger budget than single node lookups.
+GET_NODE_TIMEOUT = 30
+STATS_TIMEOUT = 30
+TRAVERSE_TIMEOUT = 600
+
+# Maximum number of GetNode calls get_nodes keeps in flight at once
+GET_NODES_IN_FLIGHT = 32
+
+# Retry transient failures (server restarting, connection reset) on the
+# client side so a single hiccup does not fail a whole origin.
+SERVICE_CONFIG = {
+    "methodConfig": [{
+        "name": [{"service": "swh.graph.TraversalService"}],
+        "retryPolicy": {
+            "maxAttempts": 4,
+            "initialBackoff": "0.2s",
+            "maxBackoff": "5s",
+            "backoffMultiplier": 2,
+            "retryableStatusCodes": ["UNAVAILABLE", "RESOURCE_EXHAUSTED"],
+        },
+    }]
+}
+
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.max_receive_message_length", 64 * 1024 * 1024),
+    ("grpc.enable_retries", 1),
+    ("grpc.service_config", json.dumps(SERVICE_CONFIG)),
+]
+
+# Named traversal profiles. Each one restricts the edges the server follows, the
+# node types it returns and, through a protobuf field mask, the fields it fills
+# in, so only what the metrics need goes over the wire.
+TRAVERSAL_PROFILES = {
+    # Commit history: parent edges only, so submodule (dir -> rev) edges never
+    # pull in foreign histories
+    "history": {
+        "edges": "rev:rev",
+        "return_nodes": "rev",
+        "mask": ["swhid", "rev.author", "rev.author_date"],
+    },
+    # Contents of a source tree, without following submodules
+    "tree-size": {
+        "edges": "dir:dir,dir:cnt",
+        "return_nodes": "cnt",
+        "mask": ["swhid", "cnt.length"],
+    },
+    # Snapshots and full commit history of an origin in one stream. Release
+    # branches are followed one hop so snapshots keep their full branch list,
+    # but only snapshots and revisions come back
+    "origin-history": {
+        "edges": "ori:snp,snp:rev,snp:rel,rev:rev",
+        "return_nodes": "snp,rev",
+        "mask": ["swhid", "successor", "rev.author", "rev.author_date"],
+    },
+    # Snapshots of an origin with their branches, for origins whose history is
+    # only walked from one head (see revisions_traversal.walks_single_head).
+    # Branch edges are allowed so snapshots keep them, heads are not returned
+    "origin-snapshots": {
+        "edges": "ori:snp,snp:rev,snp:rel",
+        "return_nodes": "snp",
+        "mask": ["swhid", "successor"],
+    },
+    # Files directly inside a directory, without descending into subdirectories
+    "dir-files": {
+        "edges": "dir:cnt",
+        "return_nodes": "cnt",
+        "mask": ["swhid", "cnt.length"],
+    },
+}
+
+def build_traversal_request(src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> swhgraph.TraversalRequest:
+    """
+    Builds a TraversalRequest from a node filter and/or a named traversal profile.
+
+    Args:
+        src (List[str]): The identifiers of the source nodes to start the traversal from.
+        node_filter (Optional[str]): The type of nodes to return (e.g., "ori"). Overrides the profile's one.
+        profile (Optional[str]): The name of a profile in TRAVERSAL_PROFILES. Defaults to None.
+
+    Returns:
+        swhgraph.TraversalRequest: The request to send.
+
+    Raises:
+        ValueError: If the profile is unknown.
+    """
+    request = swhgraph.TraversalRequest(src=src)
+    if profile:
+        if profile not in TRAVERSAL_PROFILES:
+            raise ValueError(f"Unknown traversal profile: {profile}")
+        settings = TRAVERSAL_PROFILES[profile]
+        request.edges = settings["edges"]
+        request.mask.CopyFrom(FieldMask(paths=settings["mask"]))
+        node_filter = node_filter or settings["return_nodes"]
+    if node_filter:
+        request.return_nodes.CopyFrom(swhgraph.NodeFilter(types=node_filter))
+    return request
+
+def rpc_timeout(default: float) -> float:
+    """
+    Returns the deadline of an RPC, shortened to the time left in the budget of the current origin.
+    """
+    budget = get_budget()
+    return budget.timeout(default) if budget is not None else default
+
+
+class GraphError(Exception):
+    """
+    Raised by the streaming APIs, which cannot return an error message, when a
+    traversal fails. The message is formatted like the ones returned by traverse.
+    """
+
+
+class GraphClient:
+    """
+    Long-lived client for the swh-graph gRPC server.
+
+    Owns a pool of channels that stay open for the lifetime of the client and
+    hands out stubs in round-robin order. gRPC channels and stubs are
+    thread-safe, so one client can be shared by the whole process.
+
+    Args:
+        server (str): The address of the gRPC server.
+        pool_size (int): The number of channels to keep open.
+    """
+
+    def __init__(self, server: str = GRAPH_GRPC_SERVER, pool_size: int = CHANNEL_POOL_SIZE):
+        self.server = server
+        self.pool_size = max(1, pool_size)
+        self._channels: List[grpc.Channel] = []
+        self._stubs: List[swhgraph_grpc.TraversalServiceStub] = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        replay = get_replay()
+        if replay is not None:
+            # Answered from the recording, without the interceptors of a real channel
+            channel = replay.channel()
+            self._channels.append(channel)
+            self._stubs.append(swhgraph_grpc.TraversalServiceStub(channel))
+            return
+        recorder = get_recorder()
+        for _ in range(self.pool_size):
+            channel = grpc.insecure_channel(self.server, options=CHANNEL_OPTIONS)
+            self._channels.append(channel)
+            interceptors = get_instrumentation().interceptors() + (recorder.interceptors() if recorder is not None else [])
+            if interceptors:
+                channel = grpc.intercept_channel(channel, *interceptors)
+            self._stubs.append(swhgraph_grpc.TraversalServiceStub(channel))
+
+    def stub(self) -> swhgraph_grpc.TraversalServiceStub:
+        """
+        Returns a stub bound to one of the pooled channels, opening the pool on first use.
+
+        Returns:
+            swhgraph_grpc.TraversalServiceStub: A thread-safe stub.
+        """
+        with self._lock:
+            if not self._stubs:
+                self._connect()
+            stub = self._stubs[self._next % len(self._stubs)]
+            self._next += 1
+        return stub
+
+    def close(self):
+        """
+        Closes every pooled channel. The client reconnects lazily if used again.
+        """
+        with self._lock:
+            for channel in self._channels:
+                channel.close()
+            self._channels = []
+            self._stubs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_node(self, swhid: str, fresh: bool = False) -> Tuple[Optional[swhgraph.Node], Optional[str]]:
+        """
+        Fetches a node from the gRPC server.
+
+        Args:
+            swhid (str): The identifier of the node to fetch.
+            fresh (bool): Fetch the node even if it is cached, and cache the new one.
+
+        Returns:
+            Tuple[Optional[swhgraph.Node], Optional[str]]:
+            - The node if successful, None otherwise.
+            - An error message if an error occurs, None otherwise.
+        """
+        cache = get_node_cache()
+        if cache is not None and not fresh:
+            node = cache.get(swhid)
+            if node is not None:
+                return node, None
+        try:
+            stub = self.stub()
+        except Exception as e:
+            return None, f"Unexpected error during channel setup: {e}"
+        try:
+            response = stub.GetNode(swhgraph.GetNodeRequest(swhid=swhid), timeout=rpc_timeout(GET_NODE_TIMEOUT))
+            if cache is not None:
+                cache.put(swhid, response)
+            return response, None
+        except grpc.RpcError as e:
+            return None, f"gRPC request failed: {e.details()} (Code: {e.code()})"
+        except Exception as e:
+            return None, f"Unexpected error during stub.GetNode: {e}"
+
+    def get_nodes(self, swhids: List[str], max_in_flight: int = GET_NODES_IN_FLIGHT) -> List[Tuple[Optional[swhgraph.Node], Optional[str]]]:
+        """
+        Fetches several nodes with concurrent GetNode calls on the pooled channels.
+
+        Repeated identifiers are fetched once and cached nodes are not fetched at all.
+
+        Args:
+            swhids (List[str]): The identifiers of the nodes to fetch.
+            max_in_flight (int): The maximum number of calls in flight at once.
+
+        Returns:
+            List[Tuple[Optional[swhgraph.Node], Optional[str]]]: One (node, error message)
+            pair per identifier, in input order, like get_node returns.
+        """
+        results: Dict[str, Tuple[Optional[swhgraph.Node], Optional[str]]] = {}
+        cache = get_node_cache()
+        to_fetch = []
+        for swhid in dict.fromkeys(swhids):
+            node = cache.get(swhid) if cache is not None else None
+            if node is not None:
+                results[swhid] = (node, None)
+            else:
+                to_fetch.append(swhid)
+
+        def collect(swhid, future):
+            try:
+                response = future.result()
+                if cache is not None:
+                    cache.put(swhid, response)
+                results[swhid] = (response, None)
+            except grpc.RpcError as e:
+                results[swhid] = (None, f"gRPC request failed: {e.details()} (Code: {e.code()})")
+            except Exception as e:
+                results[swhid] = (None, f"Unexpected error during stub.GetNode: {e}")
+
+        in_flight = deque()
+        for swhid in to_fetch:
+            if len(in_flight) >= max(1, max_in_flight):
+                collect(*in_flight.popleft())
+            try:
+                future = self.stub().GetNode.future(swhgraph.GetNodeRequest(swhid=swhid), timeout=rpc_timeout(GET_NODE_TIMEOUT))
+            except Exception as e:
+                results[swhid] = (None, f"Unexpected error during channel setup: {e}")
+                continue
+            in_flight.append((swhid, future))
+        while in_flight:
+            collect(*in_flight.popleft())
+
+        return [results[swhid] for swhid in swhids]
+
+    def get_stats(self) -> Tuple[Optional[swhgraph.StatsResponse], Optional[str]]:
+        """
+        Fetches statistics from the gRPC server.
+
+        Returns:
+            Tuple[Optional[swhgraph.StatsResponse], Optional[str]]:
+            - The stats response if successful, None otherwise.
+            - An error message if an error occurs, None otherwise.
+        """
+        try:
+            stub = self.stub()
+        except Exception as e:
+            return None, f"Unexpected error during channel setup: {e}"
+        try:
+            response = stub.Stats(swhgraph.StatsRequest(), timeout=STATS_TIMEOUT)
+            return response, None
+        except grpc.RpcError as e:
+            return None, f"gRPC request failed: {e.details()} (Code: {e.code()})"
+        except Exception as e:
+            return None, f"Unexpected error during stub.Stats: {e}"
+
+    def count_nodes(self, src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Counts the nodes a traversal would return, without streaming them.
+
+        Args:
+            src (List[str]): The identifiers of the source nodes to start the traversal from.
+            node_filter (Optional[str]): The type of nodes to count (e.g., "rev"). Defaults to None.
+            profile (Optional[str]): The name of a traversal profile in TRAVERSAL_PROFILES. Defaults to None.
+
+        Returns:
+            Tuple[Optional[int], Optional[str]]:
+            - The number of nodes if successful, None otherwise.
+            - An error message if an error occurs, None otherwise.
+        """
+        try:
+            stub = self.stub()
+            request = build_traversal_request(src, node_filter, profile)
+        except Exception as e:
+            return None, f"Unexpected error during CountNodes setup: {e}"
+        try:
+            return stub.CountNodes(request, timeout=rpc_timeout(TRAVERSE_TIMEOUT)).count, None
+        except grpc.RpcError as e:
+            return None, f"gRPC request failed: {e.details()} (Code: {e.code()})"
+        except Exception as e:
+            return None, f"Unexpected error during stub.CountNodes: {e}"
+
+    def traverse_iter(self, src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Iterator[swhgraph.Node]:
+        """
+        Traverses the graph like traverse, but yields the nodes as they arrive
+        instead of collecting them. Stopping the iteration early cancels the stream.
+
+        Args:
+            src (List[str]): The identifiers of the source nodes to start the traversal from.
+            node_filter (Optional[str]): The type of nodes to return (e.g., "ori"). Defaults to None.
+            profile (Optional[str]): The name of a traversal profile in TRAVERSAL_PROFILES. Defaults to None.
+
+        Yields:
+            swhgraph.Node: The nodes encountered during traversal.
+
+        Raises:
+            GraphError: If the traversal cannot be started or fails midway.
+            BudgetExceeded: If the budget of the current origin runs out, the stream is then cancelled.
+        """
+        try:
+            stub = self.stub()
+        except Exception as e:
+            raise GraphError(f"Unexpected error during channel setup: {e}") from e
+        try:
+            request = build_traversal_request(src, node_filter, profile)
+        except ValueError as e:
+            raise GraphError(str(e)) from e
+
+        budget = get_budget()
+        response_stream = stub.Traverse(request, timeout=rpc_timeout(TRAVERSE_TIMEOUT))
+        try:
+            for node in response_stream:
+                if budget is not None:
+                    budget.charge(node)
+                yield node
+        except BudgetExceeded:
+            raise
+        except grpc.RpcError as e:
+            if budget is not None and budget.expired():
+                raise budget.exceed("timeout", "Time budget exceeded") from e
+            raise GraphError(f"gRPC request failed: {e.details()} (Code: {e.code()})") from e
+        except Exception as e:
+            raise GraphError(f"Unexpected error during stub.Traverse: {e}") from e
+        finally:
+            # No-op once the stream is exhausted, frees the server otherwise
+            response_stream.cancel()
+
+    def traverse(self, src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Tuple[Optional[List[swhgraph.Node]], Optional[str]]:
+        """
+        Traverses the graph starting from the given source nodes with an optional node filter.
+
+        Args:
+            src (List[str]): The identifiers of the source nodes to start the traversal from.
+            node_filter (Optional[str]): The type of nodes to return (e.g., "ori"). Defaults to None.
+            profile (Optional[str]): The name of a traversal profile in TRAVERSAL_PROFILES. Defaults to None.
+
+        Returns:
+            Tuple[Optional[List[swhgraph.Node]], Optional[str]]:
+            - A list of nodes encountered during traversal if successful, None otherwise.
+            - An error message if an error occurs, None otherwise.
+        """
+        try:
+            nodes = list(self.traverse_iter(src, node_filter, profile))  # Collect all nodes from the stream
+            return nodes, None
+        except GraphError as e:
+            return None, str(e)
+
+_client: Optional[GraphClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> GraphClient:
+    """
+    Returns the process-wide graph client, creating it on first use.
+
+    Returns:
+        GraphClient: The shared client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GraphClient()
+        return _client
+
+def set_client(client):
+    """
+    Replaces the process-wide graph client, e.g. with a local_graph.LocalGraphBackend.
+    The module-level helpers below then go through it instead of the gRPC server.
+
+    Args:
+        client: An object with the GraphClient methods, None to go back to the default client.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None and _client is not client:
+            _client.close()
+        _client = client
+
+def get_node(swhid: str, fresh: bool = False) -> Tuple[Optional[swhgraph.Node], Optional[str]]:
     """
     Fetches a node from the gRPC server.
 
     Args:
         swhid (str): The identifier of the node to fetch.
+        fresh (bool): Fetch the node even if it is cached, and cache the new one.
 
     Returns:
-        Tuple[Optional[swhgraph.GetNodeResponse], Optional[str]]:
+        Tuple[Optional[swhgraph.Node], Optional[str]]:
         - The node response if successful, None otherwise.
         - An error message if an error occurs, None otherwise.
     """
-    try:
-        with grpc.insecure_channel(GRAPH_GRPC_SERVER) as channel:
-            stub = swhgraph_grpc.TraversalServiceStub(channel)
-            try:
-                response = stub.GetNode(swhgraph.GetNodeRequest(swhid=swhid))
-                return response, None
-            except grpc.RpcError as e:
-                error_msg = f"gRPC request failed: {e.details()} (Code: {e.code()})"
-                return None, error_msg
-            except Exception as e:
-                error_msg = f"Unexpected error during stub.GetNode: {e}"
-                return None, error_msg
-    except grpc.RpcError as e:
-        error_msg = f"Failed to connect to gRPC server: {e.details()} (Code: {e.code()})"
-        return None, error_msg
-    except Exception as e:
-        error_msg = f"Unexpected error during channel setup: {e}"
-        return None, error_msg
+    return get_client().get_node(swhid, fresh)
+
+def get_nodes(swhids: List[str], max_in_flight: int = GET_NODES_IN_FLIGHT) -> List[Tuple[Optional[swhgraph.Node], Optional[str]]]:
+    """
+    Fetches several nodes at once from the gRPC server.
+
+    Args:
+        swhids (List[str]): The identifiers of the nodes to fetch.
+        max_in_flight (int): The maximum number of calls in flight at once.
+
+    Returns:
+        List[Tuple[Optional[swhgraph.Node], Optional[str]]]: One (node, error message)
+        pair per identifier, in input order.
+    """
+    return get_client().get_nodes(swhids, max_in_flight)
 
 def get_stats() -> Tuple[Optional[swhgraph.StatsResponse], Optional[str]]:
     """
@@ -49,73 +469,61 @@ def get_stats() -> Tuple[Optional[swhgraph.StatsResponse], Optional[str]]:
         - The stats response if successful, None otherwise.
         - An error message if an error occurs, None otherwise.
     """
-    try:
-        with grpc.insecure_channel(GRAPH_GRPC_SERVER) as channel:
-            stub = swhgraph_grpc.TraversalServiceStub(channel)
-            try:
-                response = stub.Stats(swhgraph.StatsRequest())
-                return response, None
-            except grpc.RpcError as e:
-                error_msg = f"gRPC request failed: {e.details()} (Code: {e.code()})"
-                return None, error_msg
-            except Exception as e:
-                error_msg = f"Unexpected error during stub.Stats: {e}"
-                return None, error_msg
-    except grpc.RpcError as e:
-        error_msg = f"Failed to connect to gRPC server: {e.details()} (Code: {e.code()})"
-        return None, error_msg
-    except Exception as e:
-        error_msg = f"Unexpected error during channel setup: {e}"
-        return None, error_msg
+    return get_client().get_stats()
 
-def traverse(src: List[str], node_filter: Optional[str] = None) -> Tuple[Optional[List[swhgraph.Node]], Optional[str]]:
+def count_nodes(src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Counts the nodes a traversal would return, without streaming them.
+
+    Args:
+        src (List[str]): The identifiers of the source nodes to start the traversal from.
+        node_filter (Optional[str]): The type of nodes to count (e.g., "rev"). Defaults to None.
+        profile (Optional[str]): The name of a traversal profile in TRAVERSAL_PROFILES. Defaults to None.
+
+    Returns:
+        Tuple[Optional[int], Optional[str]]:
+        - The number of nodes if successful, None otherwise.
+        - An error message if an error occurs, None otherwise.
+    """
+    return get_client().count_nodes(src, node_filter, profile)
+
+def traverse(src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Tuple[Optional[List[swhgraph.Node]], Optional[str]]:
     """
     Traverses the graph starting from the given source node with an optional node filter.
 
     Args:
-        src (str): The identifier of the source node to start the traversal from.
+        src (List[str]): The identifiers of the source nodes to start the traversal from.
         node_filter (Optional[str]): The type of nodes to return (e.g., "ori"). Defaults to None.
+        profile (Optional[str]): The name of a traversal profile in TRAVERSAL_PROFILES. Defaults to None.
 
     Returns:
         Tuple[Optional[List[swhgraph.Node]], Optional[str]]:
         - A list of nodes encountered during traversal if successful, None otherwise.
         - An error message if an error occurs, None otherwise.
     """
-    try:
-        with grpc.insecure_channel(GRAPH_GRPC_SERVER) as channel:
-            stub = swhgraph_grpc.TraversalServiceStub(channel)
-            try:
-                # Construct the TraversalRequest with optional node filter
-                if node_filter:
-                  request = swhgraph.TraversalRequest(
-                      src=src,
-                      return_nodes=swhgraph.NodeFilter(types=node_filter)
-                  )
-                else:
-                  request = swhgraph.TraversalRequest(
-                      src=src
-                  )
-                
-                # Call the Traverse method and collect the streamed responses
-                response_stream = stub.Traverse(request)
-                nodes = list(response_stream)  # Collect all nodes from the stream
-                return nodes, None
-            except grpc.RpcError as e:
-                error_msg = f"gRPC request failed: {e.details()} (Code: {e.code()})"
-                return None, error_msg
-            except Exception as e:
-                error_msg = f"Unexpected error during stub.Traverse: {e}"
-                return None, error_msg
-    except grpc.RpcError as e:
-        error_msg = f"Failed to connect to gRPC server: {e.details()} (Code: {e.code()})"
-        return None, error_msg
-    except Exception as e:
-        error_msg = f"Unexpected error during channel setup: {e}"
-        return None, error_msg
+    return get_client().traverse(src, node_filter, profile)
 
+def traverse_iter(src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Iterator[swhgraph.Node]:
+    """
+    Traverses the graph like traverse, yielding the nodes as they arrive.
+
+    Args:
+        src (List[str]): The identifiers of the source nodes to start the traversal from.
+        node_filter (Optional[str]): The type of nodes to return (e.g., "ori"). Defaults to None.
+        profile (Optional[str]): The name of a traversal profile in TRAVERSAL_PROFILES. Defaults to None.
+
+    Yields:
+        swhgraph.Node: The nodes encountered during traversal.
+
+    Raises:
+        GraphError: If the traversal fails.
+    """
+    return get_client().traverse_iter(src, node_filter, profile)
 
 if __name__ == "__main__":
-    
+    # Same variable as server/Dockerfile, nodes are only cached when the export is known
+    configure_node_cache(NODE_CACHE_FILE, os.environ.get("DATASET"))
+
     while True:
         inp = input("Enter swhid: ")
         if inp == "exit":
@@ -130,7 +538,8 @@ if __name__ == "__main__":
         else:
             print(node)
         print("=====================================")
-    
+    configure_node_cache(None)
+
     # node, error = get_node("swh:1:ori:006762b49f6052c9648a93fabcddeb68c90d2382")      # voila repo
     # node, error = get_node("swh:1:snp:b92523aa95ddd89735f4bb0d3017ebc009fc0c68")
     # node, error = traverse(["swh:1:rev:cae2d26cf938e9dfe230a8d3ecd01e5db3f04176"], "rev")
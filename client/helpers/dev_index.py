@@ -0,0 +1,307 @@
+import argparse
+import csv
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# In-process analytics over the metrics output, without loading it into Neo4j.
+# The repository x developer incidence matrix is kept in CSR form: its rows are
+# the contributors of each repository and the rows of its transpose are the
+# repositories of each developer (the inverted index). Repositories sharing
+# contributors come from the sparse product of the matrix with its transpose,
+# computed once and saved along with the index.
+#
+# scipy is only imported when an index is built or loaded.
+
+METRICS_FILE = "data/metrics.csv"
+INDEX_FILE = "data/dev_index.npz"
+TOP_K = 10
+
+
+def read_metrics_csv(path: str) -> Tuple[List[str], List[str], List[str], List[List[str]]]:
+    """
+    Reads the repositories and their developers from a metrics CSV file.
+
+    Args:
+        path (str): The metrics CSV file.
+
+    Returns:
+        Tuple[List[str], List[str], List[str], List[List[str]]]: The swhid, url, source
+        and developers of each repository, in file order.
+    """
+    swhids, urls, sources, devs = [], [], [], []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            swhids.append(row["swhid"])
+            urls.append(row["url"])
+            sources.append(row["source"])
+            devs.append([dev for dev in row["devs"].split(";") if dev])
+    return swhids, urls, sources, devs
+
+def read_metrics_parquet(path: str) -> Tuple[List[str], List[str], List[str], List[List[str]]]:
+    """
+    Reads the repositories and their developers from the Parquet output of parquet_writer.
+
+    Args:
+        path (str): The Parquet output directory.
+
+    Returns:
+        Same as read_metrics_csv.
+    """
+    import pyarrow.parquet as pq
+    from helpers.parquet_writer import DEVS_FILE, EDGES_FILE, REPOS_FILE
+    repos = pq.read_table(os.path.join(path, REPOS_FILE), columns=["repo_id", "swhid", "url", "source"]).to_pydict()
+    edges = pq.read_table(os.path.join(path, EDGES_FILE)).to_pydict()
+    dev_table = pq.read_table(os.path.join(path, DEVS_FILE)).to_pydict()
+    dev_names = dict(zip(dev_table["dev_id"], dev_table["dev"]))
+    rows = {repo_id: index for index, repo_id in enumerate(repos["repo_id"])}
+    devs: List[List[str]] = [[] for _ in rows]
+    for repo_id, dev_id in zip(edges["repo_id"], edges["dev_id"]):
+        devs[rows[repo_id]].append(dev_names[dev_id])
+    return repos["swhid"], repos["url"], [str(source) for source in repos["source"]], devs
+
+
+class DevIndex:
+    """
+    Developer co-contribution index of a set of repositories.
+
+    Args:
+        swhids (List[str]): The repositories.
+        urls (List[str]): Their URLs.
+        sources (List[str]): Their sources (GitHub, PyPI, ...).
+        devs (List[str]): The developers, by id.
+        matrix (scipy.sparse.csr_matrix): The repository x developer incidence matrix.
+        shared (Optional[scipy.sparse.csr_matrix]): The shared contributor counts, if already computed.
+    """
+
+    def __init__(self, swhids: List[str], urls: List[str], sources: List[str], devs: List[str], matrix, shared=None):
+        self.swhids = list(swhids)
+        self.urls = list(urls)
+        self.sources = list(sources)
+        self.devs = list(devs)
+        self.repo_ids = {swhid: index for index, swhid in enumerate(self.swhids)}
+        self.dev_ids = {dev: index for index, dev in enumerate(self.devs)}
+        self.matrix = matrix
+        self.dev_repos = matrix.T.tocsr()  # The inverted index, developer -> repositories
+        self._shared = shared
+
+    @classmethod
+    def from_rows(cls, swhids: List[str], urls: List[str], sources: List[str], devs: List[List[str]]) -> "DevIndex":
+        """
+        Builds the index of repositories given with their developers, as read_metrics_csv returns them.
+        Developer ids follow the order in which developers are first seen.
+        """
+        from scipy import sparse
+        dev_ids: Dict[str, int] = {}
+        indptr = [0]
+        indices = []
+        for repo_devs in devs:
+            indices.extend(sorted({dev_ids.setdefault(dev, len(dev_ids)) for dev in repo_devs}))
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.int32), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+                                   shape=(len(swhids), len(dev_ids)))
+        return cls(swhids, urls, sources, list(dev_ids), matrix)
+
+    @classmethod
+    def from_metrics(cls, path: str = METRICS_FILE) -> "DevIndex":
+        """
+        Builds the index of a metrics CSV file, or of a Parquet output directory.
+        """
+        if os.path.isdir(path):
+            return cls.from_rows(*read_metrics_parquet(path))
+        return cls.from_rows(*read_metrics_csv(path))
+
+    @property
+    def shared(self):
+        """
+        The repository x repository matrix of shared contributor counts, its diagonal
+        holding the number of developers of each repository. Computed on first use.
+        """
+        if self._shared is None:
+            self._shared = (self.matrix @ self.dev_repos).tocsr()
+        return self._shared
+
+    def save(self, path: str = INDEX_FILE):
+        """
+        Saves the index and the shared contributor matrix to a compressed .npz file.
+        """
+        shared = self.shared
+        np.savez_compressed(
+            path,
+            swhids=np.array(self.swhids, dtype=str), urls=np.array(self.urls, dtype=str),
+            sources=np.array(self.sources, dtype=str), devs=np.array(self.devs, dtype=str),
+            indptr=self.matrix.indptr, indices=self.matrix.indices,
+            shared_indptr=shared.indptr, shared_indices=shared.indices, shared_data=shared.data,
+        )
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> "DevIndex":
+        """
+        Loads an index saved by save, with its shared contributor matrix.
+        """
+        from scipy import sparse
+        with np.load(path) as data:
+            swhids, devs = data["swhids"].tolist(), data["devs"].tolist()
+            matrix = sparse.csr_matrix((np.ones(len(data["indices"]), dtype=np.int32), data["indices"], data["indptr"]), shape=(len(swhids), len(devs)))
+            shared = sparse.csr_matrix((data["shared_data"], data["shared_indices"], data["shared_indptr"]), shape=(len(swhids), len(swhids)))
+            return cls(swhids, data["urls"].tolist(), data["sources"].tolist(), devs, matrix, shared)
+
+    def contributors(self, swhid: str) -> List[str]:
+        """
+        Returns the developers of a repository.
+        """
+        row = self.repo_ids[swhid]
+        return [self.devs[dev] for dev in self.matrix.indices[self.matrix.indptr[row]:self.matrix.indptr[row + 1]]]
+
+    def repositories(self, dev: str) -> List[str]:
+        """
+        Returns the repositories a developer contributed to.
+        """
+        dev = self.dev_ids[dev]
+        return [self.swhids[repo] for repo in self.dev_repos.indices[self.dev_repos.indptr[dev]:self.dev_repos.indptr[dev + 1]]]
+
+    def neighbors(self, swhid: str, k: int = TOP_K) -> List[Tuple[str, int]]:
+        """
+        Returns the repositories sharing the most contributors with a repository.
+
+        Args:
+            swhid (str): The repository.
+            k (int): The number of repositories to return.
+
+        Returns:
+            List[Tuple[str, int]]: The swhids and shared contributor counts, largest first.
+        """
+        row = self.repo_ids[swhid]
+        start, end = self.shared.indptr[row], self.shared.indptr[row + 1]
+        repos, counts = self.shared.indices[start:end], self.shared.data[start:end]
+        keep = repos != row
+        return self._top(repos[keep], counts[keep], k, self.swhids)
+
+    def top_developers(self, k: int = TOP_K, source: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        Returns the developers contributing to the most repositories.
+
+        Args:
+            k (int): The number of developers to return.
+            source (Optional[str]): Only count the repositories of this source.
+
+        Returns:
+            List[Tuple[str, int]]: The developers and their repository counts, largest first.
+        """
+        matrix = self.matrix
+        if source is not None:
+            matrix = matrix[np.flatnonzero(np.array(self.sources) == source)]
+        counts = np.asarray(matrix.sum(axis=0)).ravel()
+        return self._top(np.arange(len(counts)), counts, k, self.devs)
+
+    def top_pairs(self, k: int = TOP_K) -> List[Tuple[str, str, int]]:
+        """
+        Returns the pairs of distinct repositories sharing the most contributors.
+
+        Returns:
+            List[Tuple[str, str, int]]: The two swhids and their shared contributor count, largest first.
+        """
+        shared = self.shared.tocoo()
+        upper = shared.row < shared.col
+        rows, cols, counts = shared.row[upper], shared.col[upper], shared.data[upper]
+        if 0 < k < len(counts):
+            # Only sort the pairs at or above the k-th largest count
+            above = counts >= np.partition(counts, len(counts) - k)[len(counts) - k]
+            rows, cols, counts = rows[above], cols[above], counts[above]
+        order = np.lexsort((cols, rows, -counts))[:k]
+        return [(self.swhids[rows[i]], self.swhids[cols[i]], int(counts[i])) for i in order]
+
+    def source_summary(self) -> Dict[str, Dict[str, int]]:
+        """
+        Aggregates the repositories and developers of each source.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Per source, its number of "repos", of distinct
+            "devs", and of developers also contributing to other sources ("shared_devs").
+        """
+        from scipy import sparse
+        names = sorted(set(self.sources))
+        source_ids = {name: index for index, name in enumerate(names)}
+        membership = sparse.csr_matrix((np.ones(len(self.sources), dtype=np.int32), ([source_ids[source] for source in self.sources], np.arange(len(self.sources)))),
+                                       shape=(len(names), len(self.sources)))
+        source_devs = (membership @ self.matrix).tocsc()
+        source_devs.data[:] = 1
+        sources_per_dev = np.asarray(source_devs.sum(axis=0)).ravel()
+        repo_counts = Counter(self.sources)
+        summary = {}
+        for name, row in zip(names, source_devs.tocsr()):
+            summary[name] = {
+                "repos": repo_counts[name],
+                "devs": row.nnz,
+                "shared_devs": int(np.count_nonzero(sources_per_dev[row.indices] > 1)),
+            }
+        return summary
+
+    @staticmethod
+    def _top(ids: np.ndarray, counts: np.ndarray, k: int, names: List[str]) -> List[Tuple[str, int]]:
+        # Ties are broken by id, i.e. by order of appearance in the metrics
+        order = np.lexsort((ids, -counts))[:k]
+        return [(names[ids[i]], int(counts[i])) for i in order if counts[i] > 0]
+
+
+def open_index(metrics: str = METRICS_FILE, index_file: str = INDEX_FILE, rebuild: bool = False) -> DevIndex:
+    """
+    Loads the saved index, or builds it from the metrics and saves it when it is
+    missing, older than the metrics, or a rebuild is requested.
+
+    Args:
+        metrics (str): The metrics CSV file or Parquet output directory.
+        index_file (str): The saved index.
+        rebuild (bool): Build the index even if the saved one is up to date.
+
+    Returns:
+        DevIndex: The index.
+    """
+    if not rebuild and os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(metrics):
+        return DevIndex.load(index_file)
+    index = DevIndex.from_metrics(metrics)
+    index.save(index_file)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the developers shared between repositories of the metrics output.")
+    parser.add_argument("--input", default=METRICS_FILE, help="The metrics CSV file, or the Parquet output directory.")
+    parser.add_argument("--index", default=INDEX_FILE, help="The saved index, rebuilt when older than the input.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the saved index.")
+    parser.add_argument("-k", type=int, default=TOP_K, help="Number of results.")
+    queries = parser.add_subparsers(dest="query", required=True)
+    queries.add_parser("build", help="Only build and save the index.")
+    neighbors = queries.add_parser("neighbors", help="Repositories sharing the most contributors with a repository.")
+    neighbors.add_argument("swhid")
+    repositories = queries.add_parser("repos", help="Repositories of a developer.")
+    repositories.add_argument("dev")
+    contributors = queries.add_parser("devs", help="Developers of a repository.")
+    contributors.add_argument("swhid")
+    top_devs = queries.add_parser("top-devs", help="Developers contributing to the most repositories.")
+    top_devs.add_argument("--source", help="Only count the repositories of this source.")
+    queries.add_parser("top-pairs", help="Pairs of repositories sharing the most contributors.")
+    queries.add_parser("sources", help="Repositories and developers per source.")
+    args = parser.parse_args()
+
+    index = open_index(args.input, args.index, args.rebuild)
+    if args.query == "build":
+        print(f"{len(index.swhids)} repositories, {len(index.devs)} developers, {index.shared.nnz} co-contribution entries in {args.index}")
+    elif args.query == "neighbors":
+        for swhid, shared in index.neighbors(args.swhid, args.k):
+            print(f"{swhid},{shared}")
+    elif args.query == "repos":
+        print("\n".join(index.repositories(args.dev)))
+    elif args.query == "devs":
+        print("\n".join(index.contributors(args.swhid)))
+    elif args.query == "top-devs":
+        for dev, repos in index.top_developers(args.k, args.source):
+            print(f"{dev},{repos}")
+    elif args.query == "top-pairs":
+        for first, second, shared in index.top_pairs(args.k):
+            print(f"{first},{second},{shared}")
+    else:
+        for source, counts in index.source_summary().items():
+            print(f"{source}: {counts['repos']} repos, {counts['devs']} devs, {counts['shared_devs']} also in other sources")
@@ -1,18 +1,44 @@
 from helpers.revisions_traversal import get_revisions_from_latest
 from helpers.get_source import get_source
+import helpers.async_revisions_traversal as async_revisions_traversal
 
-def get_metrics_for_git_repos(swhid: str):
+def budget_metrics(url: str):
+    """
+    Returns the metrics of an origin whose budget ran out before any could be gathered.
+
+    Args:
+        url (str): The URL of the origin, empty if its node could not be fetched in time.
+
+    Returns:
+        Dict[str, Union[str, int]]:
+        - The metrics for the repository, empty but for its URL and source.
+    """
+    return {
+        "url": url,
+        "commits": None,
+        "latest_commit": None,
+        "age": None,
+        "devCount": None,
+        "devs": [],
+        "c-index": None,
+        "size": None,
+        "source": get_source(url),
+        "error_bounds": None
+    }
+
+def get_metrics_for_git_repos(swhid: str, extraction: str = "classic"):
     """
     Fetches metrics for a git repository.
 
     Args:
         swhid (str): The Software Heritage identifier of the repository.
+        extraction (str): How the history is fetched, one of revisions_traversal.EXTRACTION_MODES.
 
     Returns:
         Dict[str, Union[str, int]]:
         - The metrics for the repository.
     """
-    url, commits, latest_commit, age, devCount, devs, gini, size, error = get_revisions_from_latest(swhid)
+    url, commits, latest_commit, age, devCount, devs, gini, size, error_bounds, error = get_revisions_from_latest(swhid, extraction)
     if error:
         return {"error": error}
 
@@ -28,22 +54,24 @@ def get_metrics_for_git_repos(swhid: str):
         "devs": [str(x) for x in devs],  # Convert set to list
         "c-index": gini,
         "size": size,
-        "source": source
+        "source": source,
+        "error_bounds": error_bounds  # None unless the history was sketched
     }
 
 
-def get_metrics_for_pypi_repos(swhid: str):
+def get_metrics_for_pypi_repos(swhid: str, extraction: str = "classic"):
     """
     Fetches metrics for a PyPI repository.
 
     Args:
         swhid (str): The Software Heritage identifier of the repository.
+        extraction (str): How the history is fetched, one of revisions_traversal.EXTRACTION_MODES.
 
     Returns:
         Dict[str, Union[str, int]]:
         - The metrics for the repository.
     """
-    url, commits, latest_commit, age, devCount, devs, gini, size, error = get_revisions_from_latest(swhid)
+    url, commits, latest_commit, age, devCount, devs, gini, size, error_bounds, error = get_revisions_from_latest(swhid, extraction)
     if error:
         return {"error": error}
 
@@ -59,21 +87,57 @@ def get_metrics_for_pypi_repos(swhid: str):
         "devs": [str(x) for x in devs],  # Convert set to list
         "c-index": gini,
         "size": size,
-        "source": source
+        "source": source,
+        "error_bounds": error_bounds  # None unless the history was sketched
     }
 
-def get_general_metrics(swhid: str):
+def get_general_metrics(swhid: str, extraction: str = "classic"):
     """
     Fetches metrics for a repository.
 
     Args:
         swhid (str): The Software Heritage identifier of the repository.
+        extraction (str): How the history is fetched, one of revisions_traversal.EXTRACTION_MODES.
+
+    Returns:
+        Dict[str, Union[str, int]]:
+        - The metrics for the repository.
+    """
+    url, commits, latest_commit, age, devCount, devs, gini, size, error_bounds, error = get_revisions_from_latest(swhid, extraction)
+    if error:
+        return {"error": error}
+
+    # Get source
+    source = get_source(url)
+
+    return {
+        "url": url,
+        "commits": commits,
+        "latest_commit": latest_commit,
+        "age": age,
+        "devCount": devCount,
+        "devs": [str(x) for x in devs],  # Convert set to list
+        "c-index": gini,
+        "size": size,
+        "source": source,
+        "error_bounds": error_bounds  # None unless the history was sketched
+    }
+
+async def get_repo_metrics_async(client, swhid: str, extraction: str = "classic"):
+    """
+    Fetches metrics for a repository through the asyncio client. The returned
+    dictionary is the same for every kind of repository.
+
+    Args:
+        client (AsyncGraphClient): The client to issue the RPCs with.
+        swhid (str): The Software Heritage identifier of the repository.
+        extraction (str): How the history is fetched, one of revisions_traversal.EXTRACTION_MODES.
 
     Returns:
         Dict[str, Union[str, int]]:
         - The metrics for the repository.
     """
-    url, commits, latest_commit, age, devCount, devs, gini, size, error = get_revisions_from_latest(swhid)
+    url, commits, latest_commit, age, devCount, devs, gini, size, error_bounds, error = await async_revisions_traversal.get_revisions_from_latest(client, swhid, extraction)
     if error:
         return {"error": error}
 
@@ -89,5 +153,6 @@ def get_general_metrics(swhid: str):
         "devs": [str(x) for x in devs],  # Convert set to list
         "c-index": gini,
         "size": size,
-        "source": source
+        "source": source,
+        "error_bounds": error_bounds  # None unless the history was sketched
     }
\ No newline at end of file
@@ -0,0 +1,345 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import grpc
+
+# Per-RPC and per-stage timing. Disabled by default: span() then returns a
+# shared no-op context manager and the channels are created without
+# interceptors, so the only cost left is one attribute check per span.
+
+# "origin" spans the whole processing of an origin, the others are its steps
+STAGES = ["origin", "fetch-origin", "snapshot", "history", "size", "metrics"]
+
+_current_origin: contextvars.ContextVar = contextvars.ContextVar("current_origin", default=None)
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Instrumentation:
+    """
+    Collects RPC statistics per method and stage durations per origin.
+
+    Totals are kept in memory for a Prometheus textfile export; with a trace
+    file, every RPC and span is also appended to it as one JSON line.
+
+    Args:
+        enabled (bool): Whether to record anything.
+        trace_file (Optional[str]): The JSON-lines trace to append to, None for none.
+    """
+
+    def __init__(self, enabled: bool = False, trace_file: Optional[str] = None):
+        self.enabled = enabled
+        self.rpcs: Dict[str, Dict[str, float]] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._trace = open(trace_file, "a") if enabled and trace_file else None
+
+    def _emit(self, record: Dict):
+        if self._trace is not None:
+            self._trace.write(json.dumps(record) + "\n")
+
+    def record_rpc(self, method: str, seconds: float, messages: int, size: int, code: str, origin: Optional[str]):
+        """
+        Records one finished RPC.
+
+        Args:
+            method (str): The full method name, e.g. "/swh.graph.TraversalService/GetNode".
+            seconds (float): The time from the call to its last message.
+            messages (int): The number of response messages.
+            size (int): The serialized size of the responses, in bytes.
+            code (str): The final status code name.
+            origin (Optional[str]): The origin being processed when the RPC was issued.
+        """
+        with self._lock:
+            stats = self.rpcs.setdefault(method, {"calls": 0, "errors": 0, "seconds": 0.0, "messages": 0, "bytes": 0})
+            stats["calls"] += 1
+            stats["errors"] += code != "OK"
+            stats["seconds"] += seconds
+            stats["messages"] += messages
+            stats["bytes"] += size
+            self._emit({"type": "rpc", "origin": origin, "method": method, "seconds": round(seconds, 6),
+                        "messages": messages, "bytes": size, "code": code})
+
+    def record_stage(self, stage: str, seconds: float, origin: Optional[str]):
+        """
+        Records one finished stage span.
+        """
+        with self._lock:
+            stats = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            self._emit({"type": "span", "origin": origin, "stage": stage, "seconds": round(seconds, 6)})
+
+    @contextlib.contextmanager
+    def _span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start, _current_origin.get())
+
+    def span(self, stage: str):
+        """
+        Times a block as one of STAGES, attributed to the current origin.
+
+        Args:
+            stage (str): The name of the stage.
+
+        Returns:
+            A context manager, a shared no-op one when disabled.
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(stage)
+
+    @contextlib.contextmanager
+    def origin(self, swhid: str):
+        """
+        Marks the RPCs and spans of a block as belonging to an origin, and times it as the "origin" stage.
+
+        Works per thread and per asyncio task, so concurrent origins do not mix.
+
+        Args:
+            swhid (str): The swhid of the origin.
+        """
+        if not self.enabled:
+            yield
+            return
+        token = _current_origin.set(swhid)
+        try:
+            with self._span("origin"):
+                yield
+        finally:
+            _current_origin.reset(token)
+
+    def interceptors(self) -> List:
+        """
+        Returns the synchronous client interceptors, empty when disabled.
+        """
+        return [RpcInterceptor(self)] if self.enabled else []
+
+    def aio_interceptors(self) -> List:
+        """
+        Returns the grpc.aio client interceptors, empty when disabled.
+        """
+        return [AsyncUnaryUnaryInterceptor(self), AsyncUnaryStreamInterceptor(self)] if self.enabled else []
+
+    def summary(self) -> str:
+        """
+        Returns the stage totals as a log-friendly string.
+        """
+        with self._lock:
+            return ", ".join(f"{stage} {stats['seconds']:.3f}s/{stats['count']}" for stage, stats in self.stages.items())
+
+    def write_prometheus(self, path: str):
+        """
+        Writes the totals in the Prometheus text format, atomically, for the node_exporter textfile collector.
+
+        Args:
+            path (str): The .prom file to write.
+        """
+        lines = []
+        with self._lock:
+            for name, key, help_text in [
+                ("graph_rpc_calls_total", "calls", "RPCs issued to the graph server."),
+                ("graph_rpc_errors_total", "errors", "RPCs that did not end with status OK."),
+                ("graph_rpc_seconds_total", "seconds", "Time spent waiting for RPCs."),
+                ("graph_rpc_messages_total", "messages", "Response messages received."),
+                ("graph_rpc_bytes_total", "bytes", "Serialized response bytes received."),
+            ]:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for method, stats in sorted(self.rpcs.items()):
+                    lines.append(f'{name}{{method="{method}"}} {stats[key]}')
+            for name, key, help_text in [
+                ("graph_stage_count_total", "count", "Stage spans completed."),
+                ("graph_stage_seconds_total", "seconds", "Time spent per stage."),
+            ]:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for stage, stats in sorted(self.stages.items()):
+                    lines.append(f'{name}{{stage="{stage}"}} {stats[key]}')
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def close(self):
+        """
+        Flushes and closes the trace file.
+        """
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+
+class _InstrumentedStream:
+    """
+    Wraps a server-streaming call, counting its messages and recording it once exhausted, failed or cancelled.
+    Other attributes (cancel, code, ...) are those of the wrapped call.
+    """
+
+    def __init__(self, call, instrumentation: Instrumentation, method: str, origin: Optional[str]):
+        self._call = call
+        self._instrumentation = instrumentation
+        self._method = method
+        self._origin = origin
+        self._start = time.perf_counter()
+        self._messages = 0
+        self._bytes = 0
+        self._done = False
+
+    def _finish(self, code: str):
+        if not self._done:
+            self._done = True
+            self._instrumentation.record_rpc(self._method, time.perf_counter() - self._start, self._messages, self._bytes, code, self._origin)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            message = next(self._call)
+        except StopIteration:
+            self._finish("OK")
+            raise
+        except grpc.RpcError as e:
+            self._finish(e.code().name if hasattr(e, "code") else "UNKNOWN")
+            raise
+        self._messages += 1
+        self._bytes += message.ByteSize()
+        return message
+
+    def cancel(self):
+        self._finish("CANCELLED")
+        return self._call.cancel()
+
+    def __getattr__(self, name):
+        return getattr(self._call, name)
+
+
+class RpcInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor):
+    """
+    Synchronous client interceptor recording every RPC in an Instrumentation.
+    """
+
+    def __init__(self, instrumentation: Instrumentation):
+        self.instrumentation = instrumentation
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        start = time.perf_counter()
+        origin = _current_origin.get()
+        outcome = continuation(client_call_details, request)
+
+        def done(future):
+            # Also runs for .future() calls, possibly on a gRPC thread
+            code = future.code().name if future.code() is not None else "UNKNOWN"
+            size = future.result().ByteSize() if code == "OK" else 0
+            self.instrumentation.record_rpc(client_call_details.method, time.perf_counter() - start, int(code == "OK"), size, code, origin)
+
+        outcome.add_done_callback(done)
+        return outcome
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        call = continuation(client_call_details, request)
+        return _InstrumentedStream(call, self.instrumentation, client_call_details.method, _current_origin.get())
+
+
+class AsyncUnaryUnaryInterceptor(grpc.aio.UnaryUnaryClientInterceptor):
+    """
+    grpc.aio counterpart of RpcInterceptor for unary calls.
+    """
+
+    def __init__(self, instrumentation: Instrumentation):
+        self.instrumentation = instrumentation
+
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        start = time.perf_counter()
+        call = await continuation(client_call_details, request)
+        code = "OK"
+        size = 0
+        try:
+            response = await call
+            size = response.ByteSize()
+        except grpc.RpcError as e:
+            code = e.code().name if hasattr(e, "code") else "UNKNOWN"
+            raise
+        finally:
+            method = client_call_details.method
+            method = method.decode() if isinstance(method, bytes) else method
+            self.instrumentation.record_rpc(method, time.perf_counter() - start, int(code == "OK"), size, code, _current_origin.get())
+        return call
+
+
+class AsyncUnaryStreamInterceptor(grpc.aio.UnaryStreamClientInterceptor):
+    """
+    grpc.aio counterpart of RpcInterceptor for server-streaming calls.
+    """
+
+    def __init__(self, instrumentation: Instrumentation):
+        self.instrumentation = instrumentation
+
+    async def intercept_unary_stream(self, continuation, client_call_details, request):
+        start = time.perf_counter()
+        call = await continuation(client_call_details, request)
+        method = client_call_details.method
+        method = method.decode() if isinstance(method, bytes) else method
+        origin = _current_origin.get()
+
+        async def responses():
+            messages = 0
+            size = 0
+            code = "CANCELLED"
+            try:
+                async for message in call:
+                    messages += 1
+                    size += message.ByteSize()
+                    yield message
+                code = "OK"
+            except grpc.RpcError as e:
+                code = e.code().name if hasattr(e, "code") else "UNKNOWN"
+                raise
+            finally:
+                self.instrumentation.record_rpc(method, time.perf_counter() - start, messages, size, code, origin)
+
+        return responses()
+
+
+_instrumentation = Instrumentation()
+
+def get_instrumentation() -> Instrumentation:
+    """
+    Returns the process-wide instrumentation, disabled unless configured.
+
+    Returns:
+        Instrumentation: The shared instance.
+    """
+    return _instrumentation
+
+def configure_instrumentation(enabled: bool, trace_file: Optional[str] = None) -> Instrumentation:
+    """
+    Replaces the process-wide instrumentation. Must be called before the graph clients open their channels.
+
+    Args:
+        enabled (bool): Whether to record anything.
+        trace_file (Optional[str]): The JSON-lines trace to append to, None for none.
+
+    Returns:
+        Instrumentation: The new instance.
+    """
+    global _instrumentation
+    _instrumentation.close()
+    _instrumentation = Instrumentation(enabled, trace_file)
+    return _instrumentation
+
+def span(stage: str):
+    """
+    Shortcut for get_instrumentation().span(stage).
+    """
+    return _instrumentation.span(stage)
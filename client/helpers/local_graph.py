@@ -0,0 +1,404 @@
+import argparse
+import base64
+import csv
+import json
+import os
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+import swh.graph.grpc.swhgraph_pb2 as swhgraph
+
+from helpers.budget import get_budget
+from helpers.controllers import GraphError, build_traversal_request, get_client
+
+# On-disk layout of an exported subgraph. Nodes are identified by their index in
+# the sorted `keys` array; a key is one byte of node type followed by the 20-byte
+# digest of the swhid. Edges are stored in CSR form: the successors of node i are
+# targets[offsets[i]:offsets[i + 1]].
+LOCAL_GRAPH_DIR = "data/local_graph"
+NODE_TYPES = ["cnt", "dir", "ori", "rel", "rev", "snp"]
+TYPE_CODES = {node_type: code for code, node_type in enumerate(NODE_TYPES)}
+NO_LABEL = -1
+KEY_SIZE = 21
+
+
+def swhid_key(swhid: str) -> bytes:
+    """
+    Encodes a swhid as the 21-byte key used to index the arrays.
+
+    Args:
+        swhid (str): The swhid, e.g. "swh:1:rev:<40 hex digits>".
+
+    Returns:
+        bytes: The node type code followed by the binary digest.
+
+    Raises:
+        ValueError: If the swhid is malformed.
+    """
+    parts = swhid.split(":")
+    if len(parts) != 4 or parts[0] != "swh" or parts[2] not in TYPE_CODES:
+        raise ValueError(f"Invalid swhid: {swhid}")
+    return bytes([TYPE_CODES[parts[2]]]) + bytes.fromhex(parts[3])
+
+def key_swhid(key: bytes) -> str:
+    """
+    Decodes a 21-byte key back to its swhid. NumPy strips the trailing NUL bytes of
+    fixed-width bytes items, so shorter keys are padded back first.
+    """
+    key = key.ljust(KEY_SIZE, b"\x00")
+    return f"swh:1:{NODE_TYPES[key[0]]}:{key[1:].hex()}"
+
+def parse_edges(edges: str) -> Optional[Set[Tuple[int, int]]]:
+    """
+    Parses a TraversalRequest edge restriction ("rev:rev,dir:cnt", "*:cnt", "*").
+
+    Args:
+        edges (str): The edge restriction, empty for all edges.
+
+    Returns:
+        Optional[Set[Tuple[int, int]]]: The allowed (source type, target type) code pairs, None for all edges.
+    """
+    if not edges or edges == "*":
+        return None
+    allowed = set()
+    for edge in edges.split(","):
+        src_type, dst_type = edge.split(":")
+        src_codes = range(len(NODE_TYPES)) if src_type == "*" else [TYPE_CODES[src_type]]
+        dst_codes = range(len(NODE_TYPES)) if dst_type == "*" else [TYPE_CODES[dst_type]]
+        allowed.update((src, dst) for src in src_codes for dst in dst_codes)
+    return allowed
+
+
+class LocalGraphBackend:
+    """
+    In-process graph backend over arrays exported by export_local_graph.
+
+    Implements the same get_node / get_nodes / get_stats / traverse / traverse_iter
+    contract as controllers.GraphClient, so it can replace the gRPC client through
+    controllers.set_client. Arrays are memory-mapped, only the pages touched by a
+    run are read from disk.
+
+    Args:
+        path (str): The directory holding the exported arrays.
+    """
+
+    def __init__(self, path: str = LOCAL_GRAPH_DIR):
+        self.path = path
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.keys = load("keys")
+        self.types = load("types")
+        self.offsets = load("offsets")
+        self.targets = load("targets")
+        self.edge_labels = load("edge_labels")
+        self.rev_author = load("rev_author")
+        self.rev_author_date = load("rev_author_date")
+        self.cnt_length = load("cnt_length")
+        with open(os.path.join(path, "labels.json")) as f:
+            self.labels = [[base64.b64decode(name) for name in names] for names in json.load(f)]
+        with open(os.path.join(path, "urls.json")) as f:
+            self.urls = {int(index): url for index, url in json.load(f).items()}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], labels: List[List[bytes]], urls: Dict[int, str]) -> "LocalGraphBackend":
+        """
+        Builds a backend from in-memory arrays with the on-disk layout, e.g. a synthetic graph.
+
+        Args:
+            arrays (Dict[str, np.ndarray]): The arrays, keyed by file name without extension.
+            labels (List[List[bytes]]): The edge label table.
+            urls (Dict[int, str]): The origin URLs, keyed by node index.
+
+        Returns:
+            LocalGraphBackend: The backend.
+        """
+        backend = cls.__new__(cls)
+        backend.path = None
+        for name, array in arrays.items():
+            setattr(backend, name, array)
+        backend.labels = labels
+        backend.urls = urls
+        return backend
+
+    def close(self):
+        pass
+
+    def index(self, swhid: str) -> Optional[int]:
+        """
+        Returns the index of a node, None if it is not in the graph.
+        """
+        try:
+            key = swhid_key(swhid)
+        except ValueError:
+            return None
+        position = int(np.searchsorted(self.keys, key))
+        if position < len(self.keys) and self.keys[position] == key.rstrip(b"\x00"):
+            return position
+        return None
+
+    def build_node(self, index: int, allowed: Optional[Set[Tuple[int, int]]] = None, mask: Optional[List[str]] = None) -> swhgraph.Node:
+        """
+        Builds the Node message of an index, as the server would return it.
+
+        Args:
+            index (int): The node index.
+            allowed (Optional[Set[Tuple[int, int]]]): The edges to list as successors, see parse_edges.
+            mask (Optional[List[str]]): The FieldMask paths to fill, None for every field.
+
+        Returns:
+            swhgraph.Node: The node.
+        """
+        wants = lambda field: not mask or any(path == field or path.startswith(f"{field}.") for path in mask)
+        node_type = int(self.types[index])
+        node = swhgraph.Node(swhid=key_swhid(bytes(self.keys[index])))
+
+        if wants("successor") or wants("num_successors"):
+            successors = []
+            for edge in range(int(self.offsets[index]), int(self.offsets[index + 1])):
+                target = int(self.targets[edge])
+                if allowed is not None and (node_type, int(self.types[target])) not in allowed:
+                    continue
+                successor = swhgraph.Successor(swhid=key_swhid(bytes(self.keys[target])))
+                label = int(self.edge_labels[edge])
+                if label != NO_LABEL:
+                    successor.label.extend(swhgraph.EdgeLabel(name=name) for name in self.labels[label])
+                successors.append(successor)
+            if wants("successor"):
+                node.successor.extend(successors)
+            if wants("num_successors"):
+                node.num_successors = len(successors)
+
+        if node_type == TYPE_CODES["rev"] and wants("rev"):
+            node.rev.author = int(self.rev_author[index])
+            node.rev.author_date = int(self.rev_author_date[index])
+        elif node_type == TYPE_CODES["cnt"] and wants("cnt") and self.cnt_length[index] >= 0:
+            node.cnt.length = int(self.cnt_length[index])
+        elif node_type == TYPE_CODES["ori"] and wants("ori"):
+            node.ori.url = self.urls.get(index, "")
+        return node
+
+    def get_node(self, swhid: str, fresh: bool = False) -> Tuple[Optional[swhgraph.Node], Optional[str]]:
+        """
+        Fetches a node, see GraphClient.get_node.
+        """
+        index = self.index(swhid)
+        if index is None:
+            return None, f"Unknown SWHID: {swhid}"
+        return self.build_node(index), None
+
+    def get_nodes(self, swhids: List[str], max_in_flight: int = 0) -> List[Tuple[Optional[swhgraph.Node], Optional[str]]]:
+        """
+        Fetches several nodes, see GraphClient.get_nodes.
+        """
+        return [self.get_node(swhid) for swhid in swhids]
+
+    def get_stats(self) -> Tuple[Optional[swhgraph.StatsResponse], Optional[str]]:
+        """
+        Returns the node and edge counts of the local graph.
+        """
+        return swhgraph.StatsResponse(num_nodes=len(self.keys), num_edges=len(self.targets)), None
+
+    def count_nodes(self, src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Counts the nodes a traversal would return, see GraphClient.count_nodes.
+        """
+        try:
+            return sum(1 for _ in self.walk(build_traversal_request(src, node_filter, profile))), None
+        except (GraphError, ValueError) as e:
+            return None, str(e)
+
+    def walk(self, request: swhgraph.TraversalRequest) -> Iterator[int]:
+        """
+        Breadth-first traversal following a TraversalRequest's edges and return_nodes.
+
+        Args:
+            request (swhgraph.TraversalRequest): The request.
+
+        Yields:
+            int: The indices of the returned nodes, in visit order.
+
+        Raises:
+            GraphError: If a source node is unknown.
+        """
+        allowed = parse_edges(request.edges)
+        return_types = request.return_nodes.types
+        returned = None
+        if return_types and return_types != "*":
+            returned = {TYPE_CODES[node_type] for node_type in return_types.split(",")}
+
+        seen = set()
+        queue = deque()
+        for swhid in request.src:
+            index = self.index(swhid)
+            if index is None:
+                raise GraphError(f"Unknown SWHID: {swhid}")
+            if index not in seen:
+                seen.add(index)
+                queue.append(index)
+
+        while queue:
+            index = queue.popleft()
+            node_type = int(self.types[index])
+            for edge in range(int(self.offsets[index]), int(self.offsets[index + 1])):
+                target = int(self.targets[edge])
+                if target in seen:
+                    continue
+                if allowed is not None and (node_type, int(self.types[target])) not in allowed:
+                    continue
+                seen.add(target)
+                queue.append(target)
+            if returned is None or node_type in returned:
+                yield index
+
+    def traverse_iter(self, src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Iterator[swhgraph.Node]:
+        """
+        Traverses the graph, see GraphClient.traverse_iter.
+        """
+        try:
+            request = build_traversal_request(src, node_filter, profile)
+        except ValueError as e:
+            raise GraphError(str(e)) from e
+        allowed = parse_edges(request.edges)
+        mask = list(request.mask.paths) if request.HasField("mask") else None
+        budget = get_budget()
+        for index in self.walk(request):
+            node = self.build_node(index, allowed, mask)
+            if budget is not None:
+                budget.charge(node)
+            yield node
+
+    def traverse(self, src: List[str], node_filter: Optional[str] = None, profile: Optional[str] = None) -> Tuple[Optional[List[swhgraph.Node]], Optional[str]]:
+        """
+        Traverses the graph, see GraphClient.traverse.
+        """
+        try:
+            return list(self.traverse_iter(src, node_filter, profile)), None
+        except GraphError as e:
+            return None, str(e)
+
+
+def save_arrays(path: str, arrays: Dict[str, np.ndarray], labels: List[List[bytes]], urls: Dict[int, str]):
+    """
+    Writes a local graph in the layout LocalGraphBackend reads.
+
+    Args:
+        path (str): The output directory.
+        arrays (Dict[str, np.ndarray]): The arrays, keyed by file name without extension.
+        labels (List[List[bytes]]): The edge label table.
+        urls (Dict[int, str]): The origin URLs, keyed by node index.
+    """
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+    with open(os.path.join(path, "labels.json"), "w") as f:
+        json.dump([[base64.b64encode(name).decode() for name in names] for names in labels], f)
+    with open(os.path.join(path, "urls.json"), "w") as f:
+        json.dump({str(index): url for index, url in urls.items()}, f)
+
+def build_arrays(nodes: Dict[str, Tuple[List[Tuple[str, Tuple[bytes, ...]]], int, int, int, Optional[str]]]) -> Tuple[Dict[str, np.ndarray], List[List[bytes]], Dict[int, str]]:
+    """
+    Converts collected nodes to the CSR layout.
+
+    Args:
+        nodes (Dict[str, Tuple]): For each swhid: its successors as (swhid, label names) pairs,
+            the revision author and author date, the content length (-1 if unknown) and the origin URL.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], List[List[bytes]], Dict[int, str]]: The arrays, the label table
+        and the origin URLs, ready for save_arrays or LocalGraphBackend.from_arrays.
+    """
+    swhids = sorted(nodes, key=swhid_key)
+    position = {swhid: index for index, swhid in enumerate(swhids)}
+    count = len(swhids)
+
+    keys = np.array([swhid_key(swhid) for swhid in swhids], dtype=f"S{KEY_SIZE}")
+    types = np.array([TYPE_CODES[swhid[6:9]] for swhid in swhids], dtype=np.uint8)
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    rev_author = np.zeros(count, dtype=np.int64)
+    rev_author_date = np.zeros(count, dtype=np.int64)
+    cnt_length = np.full(count, -1, dtype=np.int64)
+    targets: List[int] = []
+    edge_labels: List[int] = []
+    labels: List[List[bytes]] = []
+    label_ids: Dict[Tuple[bytes, ...], int] = {}
+    urls: Dict[int, str] = {}
+
+    for index, swhid in enumerate(swhids):
+        successors, author, author_date, length, url = nodes[swhid]
+        for target, names in successors:
+            if target not in position:
+                continue  # Outside of the exported slice
+            targets.append(position[target])
+            if names:
+                if names not in label_ids:
+                    label_ids[names] = len(labels)
+                    labels.append(list(names))
+                edge_labels.append(label_ids[names])
+            else:
+                edge_labels.append(NO_LABEL)
+        offsets[index + 1] = len(targets)
+        rev_author[index] = author
+        rev_author_date[index] = author_date
+        cnt_length[index] = length
+        if url is not None:
+            urls[index] = url
+
+    arrays = {
+        "keys": keys,
+        "types": types,
+        "offsets": offsets,
+        "targets": np.array(targets, dtype=np.int64),
+        "edge_labels": np.array(edge_labels, dtype=np.int32),
+        "rev_author": rev_author,
+        "rev_author_date": rev_author_date,
+        "cnt_length": cnt_length,
+    }
+    return arrays, labels, urls
+
+def export_local_graph(origins: List[str], path: str = LOCAL_GRAPH_DIR):
+    """
+    One-time export of the subgraph reachable from the given origins, fetched from the
+    gRPC server with one full traversal per origin. Edge labels are only kept for
+    snapshot branches, directory entry names are not needed by the metrics.
+
+    Args:
+        origins (List[str]): The origin swhids.
+        path (str): The output directory.
+    """
+    client = get_client()
+    nodes = {}
+    for number, origin in enumerate(origins, 1):
+        try:
+            for node in client.traverse_iter([origin]):
+                if node.swhid in nodes:
+                    continue
+                keep_labels = node.swhid.startswith("swh:1:snp")
+                successors = [
+                    (successor.swhid, tuple(label.name for label in successor.label) if keep_labels else ())
+                    for successor in node.successor
+                ]
+                nodes[node.swhid] = (
+                    successors,
+                    node.rev.author if node.HasField("rev") else 0,
+                    node.rev.author_date if node.HasField("rev") else 0,
+                    node.cnt.length if node.HasField("cnt") else -1,
+                    node.ori.url if node.HasField("ori") else None,
+                )
+        except GraphError as e:
+            print(f"Error: {e} with repo: {origin}")
+        print(f"Exported {number}/{len(origins)} origins, {len(nodes)} nodes")
+
+    arrays, labels, urls = build_arrays(nodes)
+    save_arrays(path, arrays, labels, urls)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the subgraph reachable from the origins to local arrays.")
+    parser.add_argument("--input", default="data/full_origins.csv", help="CSV file with one origin swhid per row.")
+    parser.add_argument("--output", default=LOCAL_GRAPH_DIR, help="Output directory.")
+    args = parser.parse_args()
+
+    with open(args.input) as f:
+        origins = [row[0] for row in csv.reader(f) if row and row[0].startswith("swh:1:ori:")]
+    export_local_graph(origins, args.output)
@@ -0,0 +1,193 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+import csv
+import os
+
+AGE_FACTOR = 86400
+METRICS_HEADER = ["swhid", "url", "commits", "latest_commit", "age", "devCount", "devs", "c-index", "size", "source", "status",
+                  "commits_error", "devCount_error", "devCommits_error"]
+FSYNC_EVERY = 50
+
+# The checkpoint is an append-only text file. Each batch of rows durably written
+# to the metrics file is recorded as one line per completed swhid followed by a
+# "@<offset>" line holding the size of the metrics file after that batch. Lines
+# after the last offset marker belong to a batch that was never committed.
+OFFSET_MARKER = "@"
+
+# Error bound columns, empty for exact rows (see sketches.SketchFrame.error_bounds)
+ERROR_BOUNDS = ["commits", "devCount", "devCommits"]
+
+def error_bound_fields(metric: Dict) -> List:
+    """
+    Returns the error bounds of an approximate row in the order of ERROR_BOUNDS, None for exact rows.
+    """
+    error_bounds = metric.get("error_bounds") or {}
+    return [error_bounds.get(name) for name in ERROR_BOUNDS]
+
+def format_row(swhid: str, metric: Dict) -> List:
+    """
+    Formats the metrics of one origin as a row of the metrics CSV file.
+
+    Args:
+        swhid (str): The swhid of the origin.
+        metric (Dict): The metrics of the origin.
+
+    Returns:
+        List: The CSV row, in the order of METRICS_HEADER.
+    """
+    return [
+        swhid,
+        metric["url"],
+        metric["commits"],
+        datetime.utcfromtimestamp(metric["latest_commit"]).strftime('%Y-%m-%d %H:%M:%S') if metric["latest_commit"] is not None else "",
+        metric["age"] // AGE_FACTOR if metric["age"] is not None else "",  # No commits, e.g. out of budget
+        metric["devCount"],
+        ";".join(metric["devs"]),
+        metric["c-index"] if "c-index" in metric else "",  # Include C-index if available
+        metric["size"],
+        metric["source"],
+        metric.get("status", "complete"),
+        *error_bound_fields(metric)
+    ]
+
+def load_checkpoint(checkpoint_file: str) -> Tuple[Set[str], Optional[int]]:
+    """
+    Reads a checkpoint file.
+
+    Args:
+        checkpoint_file (str): The path of the checkpoint file.
+
+    Returns:
+        Tuple[Set[str], Optional[int]]:
+        - The swhids of the committed origins.
+        - The size of the metrics file at the last commit, None if nothing was committed.
+    """
+    completed: Set[str] = set()
+    offset = None
+    if not os.path.exists(checkpoint_file):
+        return completed, offset
+
+    batch: List[str] = []
+    with open(checkpoint_file, "r") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # Torn last line, e.g. "@12" of "@1234", its batch was never committed
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(OFFSET_MARKER):
+                try:
+                    offset = int(line[len(OFFSET_MARKER):])
+                except ValueError:
+                    break  # Torn write, everything before is still valid
+                completed.update(batch)
+                batch = []
+            else:
+                batch.append(line)
+    return completed, offset
+
+
+class MetricsWriter:
+    """
+    Appends metrics rows to the output CSV as soon as they are computed.
+
+    Rows are flushed and fsynced every `fsync_every` rows, after which the
+    checkpoint file records the committed swhids. When resuming, the metrics
+    file is truncated back to the last committed batch so that rows written
+    after it are not duplicated, and `completed` holds the origins to skip.
+
+    Args:
+        output_file (str): The path of the metrics CSV file.
+        checkpoint_file (Optional[str]): The path of the checkpoint file. Defaults to `<output_file>.checkpoint`.
+        resume (bool): Continue a previous run instead of starting from scratch.
+        fsync_every (int): The number of rows per durable batch.
+    """
+
+    def __init__(self, output_file: str, checkpoint_file: Optional[str] = None, resume: bool = False, fsync_every: int = FSYNC_EVERY):
+        self.output_file = output_file
+        self.checkpoint_file = checkpoint_file or f"{output_file}.checkpoint"
+        self.fsync_every = max(1, fsync_every)
+        self.completed: Set[str] = set()
+        self._batch: List[str] = []
+
+        offset = None
+        if resume:
+            self.completed, offset = load_checkpoint(self.checkpoint_file)
+
+        if offset is not None and os.path.exists(output_file):
+            self._file = open(output_file, "r+", newline="")
+            self._file.truncate(offset)
+            self._file.seek(offset)
+            self._rewrite_checkpoint(offset)
+        else:
+            # Nothing usable to resume from, start a fresh run
+            self.completed = set()
+            self._file = open(output_file, "w", newline="")
+            csv.writer(self._file).writerow(METRICS_HEADER)
+            with open(self.checkpoint_file, "w"):
+                pass
+        self._writer = csv.writer(self._file)
+        self._checkpoint = open(self.checkpoint_file, "a")
+        if offset is None:
+            # Commit the header so a crash before the first batch still resumes cleanly
+            self.commit()
+
+    def _rewrite_checkpoint(self, offset: int):
+        """
+        Replaces the checkpoint with the committed origins alone, dropping the torn or
+        uncommitted lines a crash may have left that new batches would be appended to.
+        """
+        temporary = f"{self.checkpoint_file}.tmp"
+        with open(temporary, "w") as f:
+            for swhid in self.completed:
+                f.write(f"{swhid}\n")
+            f.write(f"{OFFSET_MARKER}{offset}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.checkpoint_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, swhid: str, metric: Dict):
+        """
+        Appends the metrics of one origin and commits the batch when it is full.
+
+        Args:
+            swhid (str): The swhid of the origin.
+            metric (Dict): The metrics of the origin.
+        """
+        self._writer.writerow(format_row(swhid, metric))
+        self._batch.append(swhid)
+        self.completed.add(swhid)
+        if len(self._batch) >= self.fsync_every:
+            self.commit()
+
+    def commit(self):
+        """
+        Makes every row written so far durable and records them in the checkpoint.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        offset = os.fstat(self._file.fileno()).st_size
+
+        for swhid in self._batch:
+            self._checkpoint.write(f"{swhid}\n")
+        self._checkpoint.write(f"{OFFSET_MARKER}{offset}\n")
+        self._checkpoint.flush()
+        os.fsync(self._checkpoint.fileno())
+        self._batch = []
+
+    def close(self):
+        """
+        Commits the pending rows and closes both files.
+        """
+        if self._file.closed:
+            return
+        if self._batch:
+            self.commit()
+        self._file.close()
+        self._checkpoint.close()
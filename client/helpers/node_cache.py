@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from typing import Optional
+import sqlite3
+import threading
+
+import swh.graph.grpc.swhgraph_pb2 as swhgraph
+
+NODE_CACHE_FILE = "data/nodes.sqlite"
+LRU_SIZE = 50_000
+COMMIT_EVERY = 500
+
+
+class NodeCache:
+    """
+    Persistent cache of GetNode responses.
+
+    Nodes are immutable for a given swhid within a graph export, so they are
+    stored once in SQLite, keyed by dataset and swhid, as serialized protobufs.
+    An in-memory LRU of decoded nodes sits in front of the database.
+
+    The dataset must name the export the server actually serves (the DATASET of
+    server/Dockerfile): nodes cached under the same name for another export,
+    such as the origins of an older one, would be returned as they were.
+
+    Args:
+        path (str): The path of the SQLite database.
+        dataset (str): The name of the graph export the nodes come from.
+        lru_size (int): The number of decoded nodes kept in memory.
+    """
+
+    def __init__(self, path: str, dataset: str, lru_size: int = LRU_SIZE):
+        self.path = path
+        self.dataset = dataset
+        self.lru_size = lru_size
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[str, swhgraph.Node]" = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            "dataset TEXT NOT NULL, swhid TEXT NOT NULL, data BLOB NOT NULL, "
+            "PRIMARY KEY (dataset, swhid)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def _remember(self, swhid: str, node: swhgraph.Node):
+        self._lru[swhid] = node
+        self._lru.move_to_end(swhid)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, swhid: str) -> Optional[swhgraph.Node]:
+        """
+        Looks up a node, in memory first and then on disk.
+
+        Args:
+            swhid (str): The identifier of the node.
+
+        Returns:
+            Optional[swhgraph.Node]: The cached node, None if it was never stored.
+        """
+        with self._lock:
+            node = self._lru.get(swhid)
+            if node is not None:
+                self._lru.move_to_end(swhid)
+                self.memory_hits += 1
+                return node
+
+            row = self._db.execute(
+                "SELECT data FROM nodes WHERE dataset = ? AND swhid = ?", (self.dataset, swhid)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            node = swhgraph.Node.FromString(row[0])
+            self._remember(swhid, node)
+            self.disk_hits += 1
+            return node
+
+    def put(self, swhid: str, node: swhgraph.Node):
+        """
+        Stores a node. Writes are committed in batches and on close.
+
+        Args:
+            swhid (str): The identifier of the node.
+            node (swhgraph.Node): The full node, as returned by GetNode without a mask.
+        """
+        with self._lock:
+            self._remember(swhid, node)
+            self._db.execute(
+                "INSERT OR REPLACE INTO nodes (dataset, swhid, data) VALUES (?, ?, ?)",
+                (self.dataset, swhid, node.SerializeToString()),
+            )
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+
+    def stats(self) -> str:
+        """
+        Returns the hit/miss counters as a log-friendly string.
+        """
+        return f"{self.memory_hits} memory hits, {self.disk_hits} disk hits, {self.misses} misses"
+
+    def close(self):
+        """
+        Commits the pending writes and closes the database.
+        """
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+_cache: Optional[NodeCache] = None
+
+def get_node_cache() -> Optional[NodeCache]:
+    """
+    Returns the process-wide node cache, None if caching is disabled.
+
+    Returns:
+        Optional[NodeCache]: The shared cache.
+    """
+    return _cache
+
+def configure_node_cache(path: Optional[str], dataset: Optional[str] = None, lru_size: int = LRU_SIZE) -> Optional[NodeCache]:
+    """
+    Opens the process-wide node cache, closing the previous one. Passing no path or
+    no dataset disables caching, the nodes of an unknown export cannot be reused safely.
+
+    Args:
+        path (Optional[str]): The path of the SQLite database.
+        dataset (Optional[str]): The name of the graph export the nodes come from.
+        lru_size (int): The number of decoded nodes kept in memory.
+
+    Returns:
+        Optional[NodeCache]: The new cache.
+    """
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = NodeCache(path, dataset, lru_size) if path and dataset else None
+    return _cache
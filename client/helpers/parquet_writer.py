@@ -0,0 +1,143 @@
+import os
+from typing import Dict, List, Set
+
+from helpers.metrics_writer import AGE_FACTOR, ERROR_BOUNDS, error_bound_fields
+
+# Columnar alternative to the metrics CSV. The output directory holds three
+# Parquet files: one typed row per repository, one row per repository-developer
+# edge with integer ids, and the developer id -> hash dictionary. Rows are
+# buffered and written as row groups, so readers can load single columns and
+# skip groups without parsing the `;`-joined developer strings of the CSV.
+#
+# pyarrow is only imported when this writer is used.
+
+ROW_GROUP_SIZE = 10_000
+REPOS_FILE = "repos.parquet"
+EDGES_FILE = "repo_devs.parquet"
+DEVS_FILE = "devs.parquet"
+
+
+def schemas():
+    """
+    Returns the Arrow schemas of the repository, edge and developer tables.
+    """
+    import pyarrow as pa
+    repos = pa.schema([
+        ("repo_id", pa.int64()),
+        ("swhid", pa.string()),
+        ("url", pa.string()),
+        ("commits", pa.int64()),
+        ("latest_commit", pa.timestamp("s", tz="UTC")),
+        ("age", pa.int64()),  # In days, as in the CSV
+        ("devCount", pa.int64()),
+        ("c-index", pa.float64()),
+        ("size", pa.int64()),
+        ("source", pa.dictionary(pa.int32(), pa.string())),
+        ("status", pa.dictionary(pa.int8(), pa.string())),
+        *[(f"{name}_error", pa.int64()) for name in ERROR_BOUNDS],
+    ])
+    edges = pa.schema([("repo_id", pa.int64()), ("dev_id", pa.int64())])
+    devs = pa.schema([("dev_id", pa.int64()), ("dev", pa.string())])
+    return repos, edges, devs
+
+
+class ParquetMetricsWriter:
+    """
+    Writes the metrics to Parquet files, with the same interface as MetricsWriter.
+
+    Repository ids follow the write order and developer ids the order in which
+    developers are first seen. Every `row_group_size` repositories, the pending
+    rows of both tables are written out as one row group; the developer
+    dictionary is written on close.
+
+    Resuming is not supported: a Parquet file cannot be reopened for appending,
+    and `completed` only holds the origins written by this writer.
+
+    Args:
+        output_dir (str): The directory receiving the Parquet files.
+        row_group_size (int): The number of repositories per row group.
+    """
+
+    def __init__(self, output_dir: str, row_group_size: int = ROW_GROUP_SIZE):
+        import pyarrow.parquet as pq
+        self.output_dir = output_dir
+        self.row_group_size = max(1, row_group_size)
+        self.completed: Set[str] = set()
+        self.dev_ids: Dict[str, int] = {}
+        self._repos_schema, self._edges_schema, self._devs_schema = schemas()
+        self._repos: Dict[str, List] = {name: [] for name in self._repos_schema.names}
+        self._edges: Dict[str, List] = {name: [] for name in self._edges_schema.names}
+        self._next_repo_id = 0
+        self._closed = False
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._repos_writer = pq.ParquetWriter(os.path.join(output_dir, REPOS_FILE), self._repos_schema)
+        self._edges_writer = pq.ParquetWriter(os.path.join(output_dir, EDGES_FILE), self._edges_schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, swhid: str, metric: Dict):
+        """
+        Buffers the metrics of one origin and writes a row group when the buffer is full.
+
+        Args:
+            swhid (str): The swhid of the origin.
+            metric (Dict): The metrics of the origin.
+        """
+        repo_id = self._next_repo_id
+        self._next_repo_id += 1
+        for name, value in [
+            ("repo_id", repo_id),
+            ("swhid", swhid),
+            ("url", metric["url"]),
+            ("commits", metric["commits"]),
+            ("latest_commit", metric["latest_commit"]),
+            ("age", metric["age"] // AGE_FACTOR if metric["age"] is not None else None),
+            ("devCount", metric["devCount"]),
+            ("c-index", metric.get("c-index")),
+            ("size", metric["size"]),
+            ("source", metric["source"]),
+            ("status", metric.get("status", "complete")),
+            *zip([f"{name}_error" for name in ERROR_BOUNDS], error_bound_fields(metric)),
+        ]:
+            self._repos[name].append(value)
+
+        for dev in dict.fromkeys(metric["devs"]):
+            dev_id = self.dev_ids.setdefault(dev, len(self.dev_ids))
+            self._edges["repo_id"].append(repo_id)
+            self._edges["dev_id"].append(dev_id)
+
+        self.completed.add(swhid)
+        if len(self._repos["repo_id"]) >= self.row_group_size:
+            self.commit()
+
+    def commit(self):
+        """
+        Writes the buffered repositories and their edges as one row group of each file.
+        """
+        import pyarrow as pa
+        if not self._repos["repo_id"]:
+            return
+        self._repos_writer.write_table(pa.Table.from_pydict(self._repos, schema=self._repos_schema))
+        self._edges_writer.write_table(pa.Table.from_pydict(self._edges, schema=self._edges_schema))
+        for column in (*self._repos.values(), *self._edges.values()):
+            column.clear()
+
+    def close(self):
+        """
+        Writes the pending rows and the developer dictionary, and closes the files.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self._closed:
+            return
+        self._closed = True
+        self.commit()
+        self._repos_writer.close()
+        self._edges_writer.close()
+        devs = pa.Table.from_pydict({"dev_id": list(self.dev_ids.values()), "dev": list(self.dev_ids)}, schema=self._devs_schema)
+        pq.write_table(devs, os.path.join(self.output_dir, DEVS_FILE), row_group_size=max(1, len(self.dev_ids)))
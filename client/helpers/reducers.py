@@ -0,0 +1,44 @@
+from typing import Callable, Dict, Iterable, List
+
+# Single-pass aggregations over a stream of traversal nodes. Each reducer keeps
+# only what its result needs, so feeding it from controllers.traverse_iter keeps
+# memory proportional to the result instead of to the number of nodes streamed.
+# The revision history is reduced by revision_frame.RevisionFrame and
+# sketches.SketchFrame, which follow the same update protocol.
+
+class ContentLengthSum:
+    """
+    Sums the length of distinct contents. A content reached through several
+    paths, or from several traversals fed to the same reducer, counts once.
+    The length of each content is kept for the subtree cache.
+    """
+
+    def __init__(self):
+        self.lengths: Dict[str, int] = {}
+        self.total: int = 0
+
+    def update(self, node):
+        if node.swhid.startswith("swh:1:cnt") and node.swhid not in self.lengths:
+            self.lengths[node.swhid] = node.cnt.length
+            self.total += node.cnt.length
+
+    def result(self) -> int:
+        return self.total
+
+
+def reduce_stream(nodes: Iterable, reducers: List) -> List:
+    """
+    Feeds every node of a stream to every reducer, in a single pass.
+
+    Args:
+        nodes (Iterable[Node]): The nodes, typically from controllers.traverse_iter.
+        reducers (List): The reducers to update.
+
+    Returns:
+        List: The results of the reducers, in the same order.
+    """
+    updates: List[Callable] = [reducer.update for reducer in reducers]
+    for node in nodes:
+        for update in updates:
+            update(node)
+    return [reducer.result() for reducer in reducers]
@@ -0,0 +1,183 @@
+import json
+import sqlite3
+from typing import Dict, List, Optional
+
+REFRESH_STATE_FILE = "data/refresh_state.sqlite"
+COMMIT_EVERY = 500
+
+# Errors that only depend on the snapshot of an origin: retrying them against
+# the same snapshot gives the same error
+DETERMINISTIC_ERRORS = ("No successors found", "No snapshot found", "No distinct revisions found")
+
+# Outcomes of RefreshState.check and check_heads
+REUSE = "reuse"
+SKIP = "skip"
+RESOLVE = "resolve"
+COMPUTE = "compute"
+
+
+def snapshot_ids(origin_node) -> List[str]:
+    """
+    Returns the snapshots of an origin, in the order branch resolution examines them.
+    """
+    return [successor.swhid for successor in origin_node.successor if successor.swhid.startswith("swh:1:snp")]
+
+
+class RefreshState:
+    """
+    What the previous runs resolved and computed for each origin, so a refresh
+    only recomputes the origins whose history may have changed.
+
+    Snapshots and revisions are immutable, so an origin listing the same
+    snapshots resolves to the same heads, and the same heads give the same
+    metrics. Each origin is stored with its snapshots, its head revisions and
+    either its metrics or the error it failed with.
+
+    Args:
+        path (str): The path of the SQLite database.
+    """
+
+    def __init__(self, path: str = REFRESH_STATE_FILE):
+        self.path = path
+        self.counts = {REUSE: 0, SKIP: 0, COMPUTE: 0}
+        self._pending = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS origins ("
+            "swhid TEXT PRIMARY KEY, snapshots TEXT NOT NULL, heads TEXT NOT NULL, "
+            "metric TEXT, error TEXT) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def get(self, swhid: str) -> Optional[Dict]:
+        """
+        Returns what was stored for an origin, None if it was never processed.
+        """
+        row = self._db.execute("SELECT snapshots, heads, metric, error FROM origins WHERE swhid = ?", (swhid,)).fetchone()
+        if row is None:
+            return None
+        snapshots, heads, metric, error = row
+        return {"snapshots": json.loads(snapshots), "heads": json.loads(heads),
+                "metric": json.loads(metric) if metric is not None else None, "error": error}
+
+    def _outcome(self, entry: Dict) -> str:
+        metric = entry["metric"]
+        if metric is not None and metric.get("status", "complete") == "complete":
+            return REUSE
+        if entry["error"] is not None and entry["error"].startswith(DETERMINISTIC_ERRORS):
+            return SKIP
+        return COMPUTE  # Transient error or budget exceeded, try again
+
+    def check(self, origin_node) -> str:
+        """
+        Decides what to do with an origin from its node alone.
+
+        Args:
+            origin_node (Node): The origin node of the current graph.
+
+        Returns:
+            str: REUSE the previous metrics or SKIP a deterministic failure when the
+            snapshots are unchanged, RESOLVE the heads and call check_heads otherwise.
+        """
+        entry = self.get(origin_node.swhid)
+        if entry is None or entry["snapshots"] != snapshot_ids(origin_node):
+            return RESOLVE
+        outcome = self._outcome(entry)
+        if outcome != COMPUTE:
+            self.counts[outcome] += 1
+            return outcome
+        return RESOLVE
+
+    def check_heads(self, origin_node, heads: List[str], error_msg: Optional[str] = None) -> str:
+        """
+        Decides what to do with an origin whose snapshots changed, from its resolved heads.
+
+        Args:
+            origin_node (Node): The origin node of the current graph.
+            heads (List[str]): The head revisions resolved from its snapshots.
+            error_msg (Optional[str]): The error message if the heads could not be resolved.
+
+        Returns:
+            str: SKIP when the new snapshots have no head either, which is recorded,
+            REUSE when the heads are those of the previous metrics, which are then
+            recorded with the new snapshots, COMPUTE otherwise.
+        """
+        if error_msg is not None and error_msg.startswith(DETERMINISTIC_ERRORS):
+            self.record(origin_node, [], error=error_msg)
+            self.counts[SKIP] += 1
+            return SKIP
+        entry = self.get(origin_node.swhid)
+        if not error_msg and entry is not None and entry["heads"] == heads and self._outcome(entry) == REUSE:
+            self.record(origin_node, heads, metric=entry["metric"])
+            self.counts[REUSE] += 1
+            return REUSE
+        self.counts[COMPUTE] += 1
+        return COMPUTE
+
+    def metric(self, swhid: str) -> Dict:
+        """
+        Returns the stored metrics of an origin.
+        """
+        return self.get(swhid)["metric"]
+
+    def record(self, origin_node, heads: List[str], metric: Optional[Dict] = None, error: Optional[str] = None):
+        """
+        Stores the outcome of an origin. Writes are committed in batches and on close.
+
+        Args:
+            origin_node (Node): The origin node.
+            heads (List[str]): The head revisions resolved from its snapshots.
+            metric (Optional[Dict]): The metrics, as written to the output.
+            error (Optional[str]): The error message if the origin failed.
+        """
+        self._db.execute(
+            "INSERT OR REPLACE INTO origins (swhid, snapshots, heads, metric, error) VALUES (?, ?, ?, ?, ?)",
+            (origin_node.swhid, json.dumps(snapshot_ids(origin_node)), json.dumps(heads),
+             json.dumps(metric) if metric is not None else None, error),
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def stats(self) -> str:
+        """
+        Returns the outcome counters as a log-friendly string.
+        """
+        return f"{self.counts[REUSE]} reused, {self.counts[SKIP]} skipped, {self.counts[COMPUTE]} recomputed"
+
+    def close(self):
+        """
+        Commits the pending writes and closes the database.
+        """
+        self._db.commit()
+        self._db.close()
+
+
+_state: Optional[RefreshState] = None
+
+def get_refresh_state() -> Optional[RefreshState]:
+    """
+    Returns the process-wide refresh state, None if every origin is recomputed.
+
+    Returns:
+        Optional[RefreshState]: The shared state.
+    """
+    return _state
+
+def configure_refresh(path: Optional[str]) -> Optional[RefreshState]:
+    """
+    Opens the process-wide refresh state, closing the previous one. Passing no path disables refreshing.
+
+    Args:
+        path (Optional[str]): The path of the SQLite database.
+
+    Returns:
+        Optional[RefreshState]: The new state.
+    """
+    global _state
+    if _state is not None:
+        _state.close()
+    _state = RefreshState(path) if path else None
+    return _state
@@ -0,0 +1,417 @@
+import gzip
+import struct
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import grpc
+
+# Record-and-replay of the gRPC traffic of the synchronous client, to profile
+# the client side of the pipeline without a server and without its variance.
+#
+# While recording, an interceptor writes every call to a gzipped file: the
+# method, the serialized request, the serialized responses with their arrival
+# times, and the final status. Replaying swaps the channels of GraphClient for a
+# ReplayChannel answering each request with its recorded responses. The real
+# stub and its deserializers are used, so protobuf decoding is still measured.
+#
+# A call is looked up by method and request bytes. Identical requests are
+# answered in the order they were recorded, the last answer being repeated.
+
+MAGIC = b"SWHGRAPH-REPLAY-1\n"
+
+# Per call: method length, request length, status code, details length, response count
+_CALL = struct.Struct("<HIHII")
+# Per response: seconds since the previous one (since the call started for the first), length
+_MESSAGE = struct.Struct("<fI")
+# Seconds between the last response, or the start of a failed unary call, and the status
+_TAIL = struct.Struct("<f")
+
+_STATUS_CODES = {code.value[0]: code for code in grpc.StatusCode}
+
+
+class RecordedCall(NamedTuple):
+    code: grpc.StatusCode
+    details: str
+    messages: List[Tuple[float, bytes]]
+    tail: float
+
+
+class ReplayError(grpc.RpcError):
+    """
+    A recorded error status, or a call missing from the recording, raised like a gRPC error.
+    """
+
+    def __init__(self, code: grpc.StatusCode, details: str):
+        super().__init__(details)
+        self._code = code
+        self._details = details
+
+    def code(self) -> grpc.StatusCode:
+        return self._code
+
+    def details(self) -> str:
+        return self._details
+
+
+class Recorder:
+    """
+    Appends the calls of the graph clients to a recording.
+
+    Args:
+        path (str): The recording to create.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "wb")
+        self._file.write(MAGIC)
+
+    def write(self, method: str, request: bytes, code: grpc.StatusCode, details: str, messages: List[Tuple[float, bytes]], tail: float):
+        """
+        Writes one finished call. Calls may finish on gRPC threads, writes are serialized.
+
+        Args:
+            method (str): The full method name.
+            request (bytes): The serialized request.
+            code (grpc.StatusCode): The final status of the call.
+            details (str): The status details.
+            messages (List[Tuple[float, bytes]]): The serialized responses and their delays.
+            tail (float): The delay between the last response and the status.
+        """
+        method_bytes = method.encode()
+        details_bytes = (details or "").encode()
+        chunks = [_CALL.pack(len(method_bytes), len(request), code.value[0], len(details_bytes), len(messages)),
+                  method_bytes, request, details_bytes]
+        for delay, message in messages:
+            chunks.append(_MESSAGE.pack(delay, len(message)))
+            chunks.append(message)
+        chunks.append(_TAIL.pack(tail))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(b"".join(chunks))
+                self.calls += 1
+
+    def interceptors(self) -> List:
+        """
+        Returns the synchronous client interceptors feeding this recorder.
+        """
+        return [RecordingInterceptor(self)]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class _RecordedStream:
+    """
+    Wraps a server-streaming call, keeping its responses until it is exhausted, failed or cancelled.
+    Other attributes (code, details, ...) are those of the wrapped call.
+    """
+
+    def __init__(self, call, recorder: Recorder, method: str, request: bytes):
+        self._call = call
+        self._recorder = recorder
+        self._method = method
+        self._request = request
+        self._last = time.perf_counter()
+        self._messages: List[Tuple[float, bytes]] = []
+        self._done = False
+
+    def _finish(self, code: grpc.StatusCode, details: str):
+        if not self._done:
+            self._done = True
+            self._recorder.write(self._method, self._request, code, details, self._messages, time.perf_counter() - self._last)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            message = next(self._call)
+        except StopIteration:
+            self._finish(grpc.StatusCode.OK, "")
+            raise
+        except grpc.RpcError as e:
+            self._finish(e.code() if hasattr(e, "code") else grpc.StatusCode.UNKNOWN, e.details() if hasattr(e, "details") else str(e))
+            raise
+        now = time.perf_counter()
+        self._messages.append((now - self._last, message.SerializeToString()))
+        self._last = now
+        return message
+
+    def cancel(self):
+        self._finish(grpc.StatusCode.CANCELLED, "Cancelled by the client")
+        return self._call.cancel()
+
+    def __getattr__(self, name):
+        return getattr(self._call, name)
+
+
+class RecordingInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor):
+    """
+    Synchronous client interceptor writing every call to a Recorder.
+    """
+
+    def __init__(self, recorder: Recorder):
+        self.recorder = recorder
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        start = time.perf_counter()
+        outcome = continuation(client_call_details, request)
+
+        def done(future):
+            # Also runs for .future() calls, possibly on a gRPC thread
+            elapsed = time.perf_counter() - start
+            code = future.code() if future.code() is not None else grpc.StatusCode.UNKNOWN
+            if code == grpc.StatusCode.OK:
+                messages, tail = [(elapsed, future.result().SerializeToString())], 0.0
+            else:
+                messages, tail = [], elapsed
+            self.recorder.write(client_call_details.method, request.SerializeToString(), code, future.details() or "", messages, tail)
+
+        outcome.add_done_callback(done)
+        return outcome
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        call = continuation(client_call_details, request)
+        return _RecordedStream(call, self.recorder, client_call_details.method, request.SerializeToString())
+
+
+def read_recording(path: str) -> Dict[Tuple[str, bytes], List[RecordedCall]]:
+    """
+    Loads a recording, keeping the responses serialized.
+
+    Args:
+        path (str): The recording written by a Recorder.
+
+    Returns:
+        Dict[Tuple[str, bytes], List[RecordedCall]]: The calls of each (method, request), in recording order.
+
+    Raises:
+        ValueError: If the file is not a recording.
+    """
+    calls = defaultdict(list)
+    with gzip.open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a graph recording: {path}")
+        while True:
+            header = f.read(_CALL.size)
+            if not header:
+                break
+            if len(header) < _CALL.size:
+                break  # Recording interrupted mid-call
+            method_length, request_length, code, details_length, count = _CALL.unpack(header)
+            method = f.read(method_length).decode()
+            request = f.read(request_length)
+            details = f.read(details_length).decode()
+            messages = []
+            for _ in range(count):
+                delay, length = _MESSAGE.unpack(f.read(_MESSAGE.size))
+                messages.append((delay, f.read(length)))
+            tail, = _TAIL.unpack(f.read(_TAIL.size))
+            calls[(method, request)].append(RecordedCall(_STATUS_CODES.get(code, grpc.StatusCode.UNKNOWN), details, messages, tail))
+    return dict(calls)
+
+
+class Replay:
+    """
+    Serves the calls of a recording.
+
+    Args:
+        path (str): The recording written by a Recorder.
+        speed (float): How much of the recorded latency is reproduced: 0 answers
+            at full speed, 1 at the recorded pace.
+    """
+
+    def __init__(self, path: str, speed: float = 0.0):
+        self.path = path
+        self.speed = max(0.0, speed)
+        self.served = 0
+        self.missing = 0
+        self._calls = read_recording(path)
+        self._lock = threading.Lock()
+
+    def take(self, method: str, request: bytes) -> RecordedCall:
+        """
+        Returns the next recorded answer to a request.
+
+        Raises:
+            ReplayError: NOT_FOUND if the request was never recorded.
+        """
+        with self._lock:
+            answers = self._calls.get((method, request))
+            if not answers:
+                self.missing += 1
+                raise ReplayError(grpc.StatusCode.NOT_FOUND, f"Call not in the recording: {method}")
+            self.served += 1
+            return answers.pop(0) if len(answers) > 1 else answers[0]
+
+    def wait(self, start: float, offset: float):
+        """
+        Sleeps until `offset` recorded seconds after `start`, scaled by the speed.
+        """
+        if self.speed:
+            delay = start + offset * self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def channel(self) -> "ReplayChannel":
+        return ReplayChannel(self)
+
+    def stats(self) -> str:
+        """
+        Returns the counters as a log-friendly string.
+        """
+        return f"{self.served} calls served, {self.missing} missing from {self.path}"
+
+
+class _ReplayFuture:
+    """
+    Result of a replayed unary call started with .future(). The recorded latency
+    runs from the creation of the future, so concurrent calls overlap as they did.
+    """
+
+    def __init__(self, unary: "_ReplayUnary", request):
+        self._unary = unary
+        self._request = request
+        self._start = time.perf_counter()
+
+    def result(self, timeout: Optional[float] = None):
+        return self._unary.answer(self._request, self._start)
+
+
+class _ReplayUnary:
+    def __init__(self, replay: Replay, method: str, request_serializer, response_deserializer):
+        self._replay = replay
+        self._method = method
+        self._serialize = request_serializer
+        self._deserialize = response_deserializer
+
+    def answer(self, request, start: float):
+        call = self._replay.take(self._method, self._serialize(request))
+        self._replay.wait(start, sum(delay for delay, _ in call.messages) + call.tail)
+        if call.code != grpc.StatusCode.OK:
+            raise ReplayError(call.code, call.details)
+        return self._deserialize(call.messages[0][1])
+
+    def __call__(self, request, timeout: Optional[float] = None, **kwargs):
+        return self.answer(request, time.perf_counter())
+
+    def future(self, request, timeout: Optional[float] = None, **kwargs) -> _ReplayFuture:
+        return _ReplayFuture(self, request)
+
+
+class _ReplayStreamCall:
+    def __init__(self, replay: Replay, call: RecordedCall, response_deserializer):
+        self._replay = replay
+        self._call = call
+        self._deserialize = response_deserializer
+        self._index = 0
+        self._start = time.perf_counter()
+        self._offset = 0.0
+        self._cancelled = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._cancelled:
+            raise ReplayError(grpc.StatusCode.CANCELLED, "Locally cancelled")
+        if self._index < len(self._call.messages):
+            delay, message = self._call.messages[self._index]
+            self._index += 1
+            self._offset += delay
+            self._replay.wait(self._start, self._offset)
+            return self._deserialize(message)
+        if self._call.code == grpc.StatusCode.OK:
+            raise StopIteration
+        self._replay.wait(self._start, self._offset + self._call.tail)
+        raise ReplayError(self._call.code, self._call.details)
+
+    def cancel(self) -> bool:
+        self._cancelled = True
+        return True
+
+
+class _ReplayStream:
+    def __init__(self, replay: Replay, method: str, request_serializer, response_deserializer):
+        self._replay = replay
+        self._method = method
+        self._serialize = request_serializer
+        self._deserialize = response_deserializer
+
+    def __call__(self, request, timeout: Optional[float] = None, **kwargs) -> _ReplayStreamCall:
+        return _ReplayStreamCall(self._replay, self._replay.take(self._method, self._serialize(request)), self._deserialize)
+
+
+class ReplayChannel:
+    """
+    Stands in for a grpc.Channel when building a TraversalServiceStub.
+    """
+
+    def __init__(self, replay: Replay):
+        self.replay = replay
+
+    def unary_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs) -> _ReplayUnary:
+        return _ReplayUnary(self.replay, method, request_serializer, response_deserializer)
+
+    def unary_stream(self, method, request_serializer=None, response_deserializer=None, **kwargs) -> _ReplayStream:
+        return _ReplayStream(self.replay, method, request_serializer, response_deserializer)
+
+    def close(self):
+        pass
+
+
+_recorder: Optional[Recorder] = None
+_replay: Optional[Replay] = None
+
+def get_recorder() -> Optional[Recorder]:
+    """
+    Returns the process-wide recorder, None when not recording.
+    """
+    return _recorder
+
+def get_replay() -> Optional[Replay]:
+    """
+    Returns the process-wide replay, None when talking to the server.
+    """
+    return _replay
+
+def configure_recording(path: Optional[str]) -> Optional[Recorder]:
+    """
+    Starts recording the calls of the graph clients to `path`, closing the previous
+    recording. Must be called before the clients open their channels.
+
+    Args:
+        path (Optional[str]): The recording to create, None to stop recording.
+
+    Returns:
+        Optional[Recorder]: The new recorder.
+    """
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+    _recorder = Recorder(path) if path else None
+    return _recorder
+
+def configure_replay(path: Optional[str], speed: float = 0.0) -> Optional[Replay]:
+    """
+    Makes the graph clients answer from a recording instead of the server. Must be
+    called before the clients open their channels.
+
+    Args:
+        path (Optional[str]): The recording to serve, None to go back to the server.
+        speed (float): The fraction of the recorded latency to reproduce.
+
+    Returns:
+        Optional[Replay]: The new replay.
+    """
+    global _replay
+    _replay = Replay(path, speed) if path else None
+    return _replay
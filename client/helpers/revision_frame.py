@@ -0,0 +1,153 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Columnar storage of the revisions of one origin. Instead of one Python
+# object per commit in sets and dicts, the traversal stream is buffered in
+# small lists and flushed in chunks to NumPy arrays: 20-byte digests, int64
+# author dates and uint32 author ids interned per frame. The metrics are then
+# vectorized reductions over the concatenated columns.
+
+CHUNK_SIZE = 8192
+REV_PREFIX = "swh:1:rev:"
+
+
+class RevisionFrame:
+    """
+    Per-origin frame of revisions, fed like a reducer (see reducers.reduce_stream).
+
+    Every revision node is kept, including revisions reached again from
+    another head: the commit count deduplicates them, the per-developer
+    counts do not, as with the reducers it replaces.
+
+    Args:
+        chunk_size (int): The number of rows buffered before being flushed to arrays.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.authors: List[int] = []  # Interned id -> graph author id, in order of first appearance
+        self._author_ids: Dict[int, int] = {}
+        self._digests: List[bytes] = []
+        self._dates: List[int] = []
+        self._raw_authors: List[int] = []
+        self._chunks: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._columns: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def update(self, node):
+        if not node.HasField("rev") or not node.swhid.startswith(REV_PREFIX):
+            return
+        self._digests.append(bytes.fromhex(node.swhid[len(REV_PREFIX):]))
+        self._dates.append(node.rev.author_date)
+        self._raw_authors.append(node.rev.author)
+        if len(self._digests) >= self.chunk_size:
+            self._flush()
+
+    def result(self) -> "RevisionFrame":
+        return self
+
+    def _flush(self):
+        if not self._digests:
+            return
+        raw = np.array(self._raw_authors, dtype=np.int64)
+        unique, first, inverse = np.unique(raw, return_index=True, return_inverse=True)
+        # Intern in order of first appearance, so author ids follow the stream
+        local = np.empty(len(unique), dtype=np.uint32)
+        for position in np.argsort(first, kind="stable"):
+            author = int(unique[position])
+            if author not in self._author_ids:
+                self._author_ids[author] = len(self.authors)
+                self.authors.append(author)
+            local[position] = self._author_ids[author]
+        self._chunks.append((
+            np.array(self._digests, dtype="S20"),
+            np.array(self._dates, dtype=np.int64),
+            local[inverse.reshape(-1)],
+        ))
+        self._digests, self._dates, self._raw_authors = [], [], []
+        self._columns = None
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the digests, author dates and interned author ids of every row.
+        """
+        self._flush()
+        if self._columns is None:
+            if self._chunks:
+                self._columns = tuple(np.concatenate(column) for column in zip(*self._chunks))
+                self._chunks = [self._columns]
+            else:
+                self._columns = (np.empty(0, dtype="S20"), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint32))
+        return self._columns
+
+    def __len__(self):
+        return len(self.columns()[0])
+
+    def commit_count(self) -> int:
+        """
+        Returns the number of distinct revisions.
+        """
+        return len(np.unique(self.columns()[0]))
+
+    def timestamp_range(self) -> Optional[Tuple[int, int]]:
+        """
+        Returns the oldest and latest author dates, None if the frame is empty.
+        """
+        dates = self.columns()[1]
+        if len(dates) == 0:
+            return None
+        return int(dates.min()), int(dates.max())
+
+    def developer_count(self) -> int:
+        """
+        Returns the number of distinct authors.
+        """
+        self._flush()
+        return len(self.authors)
+
+    def developer_counts(self) -> np.ndarray:
+        """
+        Returns the number of revisions of each interned author.
+        """
+        return np.bincount(self.columns()[2], minlength=len(self.authors))
+
+    def commits_per_developer(self) -> Dict[int, int]:
+        """
+        Returns the number of revisions of each graph author, in order of first appearance.
+        """
+        return dict(zip(self.authors, self.developer_counts().tolist()))
+
+    def gini(self) -> Optional[float]:
+        """
+        Returns the Gini index of the developer counts, None if there are no developers.
+        """
+        if not self.authors:
+            return None
+        return gini_from_counts(self.developer_counts())
+
+    def error_bounds(self) -> None:
+        """
+        Returns None, the metrics of a RevisionFrame are exact (see sketches.SketchFrame).
+        """
+        return None
+
+
+def gini_from_counts(counts: np.ndarray) -> float:
+    """
+    Vectorized Gini index of commit counts (0 = perfect equality, 1 = maximal inequality).
+
+    Args:
+        counts (np.ndarray): The number of commits of each developer.
+
+    Returns:
+        float: The Gini index, 0 if there are no developers or no commits.
+    """
+    n = len(counts)
+    if n == 0:
+        return 0
+    commits = np.sort(np.asarray(counts, dtype=np.int64))
+    total_commits = int(commits.sum())
+    if total_commits == 0:
+        return 0
+    cumulative_sum = int(np.dot(np.arange(1, n + 1, dtype=np.int64), commits))
+    return (2 * cumulative_sum) / (n * total_commits) - (n + 1) / n
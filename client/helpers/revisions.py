@@ -1,4 +1,4 @@
-from helpers.controllers import get_node
+from helpers.controllers import get_node, get_nodes
 from collections import deque
 
 from typing import Optional, Tuple
@@ -52,26 +52,27 @@ def get_commits(swhid: str) -> Tuple[Optional[str], Optional[str]]:
     last = None
 
     while queue:
-        commit_id = queue.popleft()
-        commit, error_msg = get_node(commit_id)
+        # Fetch the whole frontier in one batch, then process it in queue order
+        frontier = list(queue)
+        queue.clear()
+        for commit_id, (commit, error_msg) in zip(frontier, get_nodes(frontier)):
+            if error_msg:
+                return None, error_msg
+            if not commit:
+                return None, f"Commit {commit_id} not found"
 
-        if error_msg:
-            return None, error_msg
-        if not commit:
-            return None, f"Commit {commit_id} not found"
-        
-        if not commit.successor:
-            continue
-        
-        for successor in commit.successor:
-            if successor.swhid not in commits and successor.swhid.startswith("swh:1:rev"):
-                queue.append(successor.swhid)
-        
-        if not first:
-            first = commit
-        last = commit
-        commits.add(commit_id)
-        commits_list.append(commit)
+            if not commit.successor:
+                continue
+
+            for successor in commit.successor:
+                if successor.swhid not in commits and successor.swhid.startswith("swh:1:rev"):
+                    queue.append(successor.swhid)
+
+            if not first:
+                first = commit
+            last = commit
+            commits.add(commit_id)
+            commits_list.append(commit)
     
     first_commit, err_one = get_node(first.swhid)
     last_commit, err_two = get_node(last.swhid)
@@ -1,6 +1,27 @@
-from helpers.controllers import get_node, traverse
-from typing import Optional, Tuple, List, Set, Dict
+from helpers.budget import BudgetExceeded, budget_exhausted
+from helpers.controllers import GraphError, count_nodes, get_node, get_nodes, traverse_iter
+from helpers.instrumentation import span
+from helpers.reducers import ContentLengthSum, reduce_stream
+from helpers.revision_frame import REV_PREFIX, RevisionFrame, gini_from_counts
+from helpers.sketches import needs_sketch, new_sketch_frame, sketch_mode
+from helpers.subtree_cache import ContentSet, get_subtree_cache
+from typing import Iterable, Iterator, Optional, Tuple, List, Set, Dict
+from collections import deque
 from datetime import datetime
+import logging
+
+import numpy as np
+
+# How the history of an origin is fetched:
+# - "classic": GetNode on the snapshots, then one Traverse per head revision
+# - "single": one Traverse from the origin streams every snapshot and revision,
+#   branches are then resolved and walked on the client. GitHub origins, where
+#   only main/master is walked, stream their snapshots alone instead and their
+#   head is traversed as in "classic": the history of every other branch would
+#   otherwise be streamed for nothing
+# - "multi-source": like "classic", but one Traverse from all the heads at once,
+#   so history shared between branches is visited and streamed once
+EXTRACTION_MODES = ["classic", "single", "multi-source"]
 
 def get_main_or_master_revision(successors):
     """
@@ -19,101 +40,326 @@ def get_main_or_master_revision(successors):
                 return successor.swhid
     return None
 
-def collect_revisions_timestamps_and_devs_and_size(revision_ids: List[str]) -> Tuple[Set[str], List[int], int, Set[str], int, Dict[str, int], Optional[str]]:
+def walks_single_head(origin_node) -> bool:
+    """
+    Returns whether only the main or master branch of an origin is walked, see select_revision_ids.
+    """
+    return origin_node.ori.url.startswith("https://github.com")
+
+def select_revision_ids(origin_node, snapshot_node) -> List[str]:
+    """
+    Selects the head revisions to walk from a snapshot: the main or master branch for
+    GitHub origins, every revision branch otherwise.
+
+    Args:
+        origin_node (Node): The origin node.
+        snapshot_node (Node): The snapshot node of the origin.
+
+    Returns:
+        List[str]: The swhids of the head revisions.
+    """
+    revision_ids = []
+    if walks_single_head(origin_node):
+        main_or_master_revision_id = get_main_or_master_revision(snapshot_node.successor)
+        if main_or_master_revision_id:
+            logging.debug(f"Main or master revision found: {main_or_master_revision_id}")
+            revision_ids = [main_or_master_revision_id]
+    else:
+        revision_ids = [successor.swhid for successor in snapshot_node.successor if successor.swhid.startswith("swh:1:rev")]
+    return revision_ids
+
+def resolve_branches(origin_node, snapshot_candidates: Iterable) -> Tuple[Optional[object], List[str], Optional[str]]:
+    """
+    Branch resolution step: picks the snapshot of the origin and the head revisions to walk.
+
+    The first snapshot with branches wins, in the order the origin lists them. Candidates
+    are examined lazily so that an error on a snapshot after the chosen one is ignored.
+
+    Args:
+        origin_node (Node): The origin node.
+        snapshot_candidates (Iterable[Tuple[Optional[Node], Optional[str]]]): The (node, error message)
+            pairs of the snapshots of the origin, in the order of origin_node.successor.
+
+    Returns:
+        Tuple[Optional[Node], List[str], Optional[str]]:
+        - The chosen snapshot node, None on error.
+        - The swhids of the head revisions.
+        - An error message if an error occurs, None otherwise.
+    """
+    snapshot_node = None
+    for snapshot_node, error_msg in snapshot_candidates:
+        if error_msg:
+            return None, [], error_msg
+        if snapshot_node and snapshot_node.successor:
+            break
+
+    if not snapshot_node:
+        return None, [], "No snapshot found"
+
+    revision_ids = select_revision_ids(origin_node, snapshot_node)
+    if not revision_ids:
+        return None, [], "No distinct revisions found"
+    return snapshot_node, revision_ids, None
+
+def extract_origin_history(origin_node) -> Tuple[Optional[Dict[str, object]], Optional[str]]:
+    """
+    Streams the snapshots and the whole commit history of an origin in a single traversal.
+    Only the snapshots are streamed for the origins that walk a single head.
+
+    Args:
+        origin_node (Node): The origin node.
+
+    Returns:
+        Tuple[Optional[Dict[str, Node]], Optional[str]]:
+        - The snapshot and revision nodes, keyed by swhid. Only those streamed before
+          the budget of the origin ran out, if it did.
+        - An error message if an error occurs, None otherwise.
+    """
+    profile = "origin-snapshots" if walks_single_head(origin_node) else "origin-history"
+    nodes = {}
+    try:
+        for node in traverse_iter([origin_node.swhid], profile=profile):
+            nodes[node.swhid] = node
+    except BudgetExceeded:
+        pass  # Keep what was streamed, the traversal reaches the snapshots first
+    except GraphError as e:
+        return None, str(e)
+    return nodes, None
+
+def walk_history(history: Dict[str, object], heads: List[str]) -> Iterator:
+    """
+    Walks the revisions reachable from heads through parent edges, within nodes already
+    fetched by extract_origin_history. Yields what a "history" traversal from the heads would.
+
+    Args:
+        history (Dict[str, Node]): The revision nodes, keyed by swhid.
+        heads (List[str]): The swhids of the head revisions.
+
+    Yields:
+        Node: The revisions reachable from the heads, the heads included, each once.
+    """
+    seen = set(heads)
+    queue = deque(dict.fromkeys(heads))
+    while queue:
+        node = history.get(queue.popleft())
+        if node is None:
+            continue
+        yield node
+        for successor in node.successor:
+            if successor.swhid.startswith("swh:1:rev") and successor.swhid not in seen:
+                seen.add(successor.swhid)
+                queue.append(successor.swhid)
+
+def subtree_contents(dir_id: str) -> Tuple[Optional[ContentSet], Optional[str]]:
+    """
+    Gathers the distinct contents of a directory tree in a single traversal, going
+    through the subtree cache.
+
+    Args:
+        dir_id (str): The swhid of the directory.
+
+    Returns:
+        Tuple[Optional[ContentSet], Optional[str]]:
+        - The distinct contents of the tree, None on error.
+        - An error message if an error occurs, None otherwise.
+    """
+    cache = get_subtree_cache()
+    cached = cache.get(dir_id)
+    if cached is not None:
+        return cached, None
+
+    contents = ContentLengthSum()
+    try:
+        reduce_stream(traverse_iter([dir_id], profile="tree-size"), [contents])
+    except GraphError as e:
+        return None, str(e)
+    entry = ContentSet.from_lengths(contents.lengths)
+    cache.put(dir_id, entry)
+    return entry, None
+
+def tree_size(dir_id: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Computes the deduplicated size of a source tree, reusing the cached contents of
+    its top-level subdirectories and only traversing the ones never seen before.
+
+    The cache keeps the contents of each subdirectory rather than its size, so a
+    file present in several of them still counts once. With the cache disabled the
+    whole tree is traversed at once.
+
+    Args:
+        dir_id (str): The swhid of the root directory.
+
+    Returns:
+        Tuple[Optional[int], Optional[str]]:
+        - The size in bytes, None on error.
+        - An error message if an error occurs, None otherwise.
+    """
+    cache = get_subtree_cache()
+    if not cache.enabled:
+        contents = ContentLengthSum()
+        try:
+            reduce_stream(traverse_iter([dir_id], profile="tree-size"), [contents])
+        except GraphError as e:
+            return None, str(e)
+        return contents.total, None
+
+    cached = cache.get(dir_id)
+    if cached is not None:
+        return cached.size, None
+
+    dir_node, error_msg = get_node(dir_id)
+    if error_msg:
+        return None, error_msg
+
+    # Files directly in the root, then each subdirectory as a cacheable unit
+    files = ContentLengthSum()
+    try:
+        reduce_stream(traverse_iter([dir_id], profile="dir-files"), [files])
+    except GraphError as e:
+        return None, str(e)
+    parts = [ContentSet.from_lengths(files.lengths)]
+
+    for successor in dir_node.successor:
+        if successor.swhid.startswith("swh:1:dir"):
+            entry, error_msg = subtree_contents(successor.swhid)
+            if error_msg:
+                return None, error_msg
+            parts.append(entry)
+
+    contents = ContentSet.union(parts)
+    cache.put(dir_id, contents)
+    return contents.size, None
+
+def history_sources(revision_ids: List[str], multi_source: bool = False) -> List[List[str]]:
+    """
+    Groups the head revisions into the sources of the history traversals.
+
+    Args:
+        revision_ids (List[str]): The head revisions.
+        multi_source (bool): Traverse from every head at once, so each shared ancestor is
+            streamed and counted once, instead of once per head reaching it.
+
+    Returns:
+        List[List[str]]: The src list of each traversal.
+    """
+    if multi_source:
+        return [list(dict.fromkeys(revision_ids))]
+    return [[rev_id] for rev_id in revision_ids]
+
+def history_frame(revision_ids: List[str], history: Optional[Dict[str, object]] = None):
+    """
+    Picks what the history is streamed into: a RevisionFrame, or a SketchFrame for
+    the histories the configured sketch mode approximates. In "auto" mode, the
+    revisions are counted first, by CountNodes or in the already fetched history.
+
+    Args:
+        revision_ids (List[str]): The head revisions.
+        history (Optional[Dict[str, Node]]): Revisions already fetched by extract_origin_history.
+
+    Returns:
+        RevisionFrame or SketchFrame: An empty frame.
+    """
+    revision_count = None
+    if sketch_mode() == "auto":
+        if history is not None:
+            revision_count = sum(1 for swhid in history if swhid.startswith(REV_PREFIX))
+        else:
+            revision_count, _ = count_nodes(revision_ids, profile="history")  # Counted exactly on error
+    return new_sketch_frame() if needs_sketch(revision_count) else RevisionFrame()
+
+def collect_revisions_timestamps_and_devs_and_size(revision_ids: List[str], history: Optional[Dict[str, object]] = None, multi_source: bool = False) -> Tuple[int, Optional[Tuple[int, int]], int, List[int], Optional[int], np.ndarray, Optional[Dict[str, int]], Optional[str]]:
     """ 
     Collects distinct 'rev' nodes, their timestamps, and counts the number of distinct developers by 
     traversing from the given revision IDs, and calculates the size of the repository.
 
+    The traversals are streamed into a columnar RevisionFrame, a few bytes per revision
+    instead of one Python object, and the metrics are vectorized reductions over it.
+    Histories picked by the sketch mode go to a constant-memory SketchFrame instead.
+
     Args:
         revision_ids (List[str]): The list of revision IDs to traverse from.
+        history (Optional[Dict[str, Node]]): Revisions already fetched by extract_origin_history.
+            When given, they are walked locally instead of traversing on the server.
+        multi_source (bool): Walk the history from every head at once, see history_sources.
 
     Returns:
-        Tuple[Set[str], List[int], int, Set[str], int, Dict[str, int], Optional[str]]:
-        - A set of distinct 'rev' nodes.
-        - A list of commit timestamps.
+        Tuple[int, Optional[Tuple[int, int]], int, List[int], Optional[int], np.ndarray, Optional[Dict[str, int]], Optional[str]]:
+        - The number of distinct 'rev' nodes.
+        - The oldest and latest commit timestamps, None if there are none.
         - The number of distinct developers.
-        - The size of the repository in bytes.
-        - A dictionary with the number of commits per developer.
+        - The distinct developers, only the heaviest ones when sketched.
+        - The size of the repository in bytes, None if it could not be computed.
+        - The number of commits of each developer.
+        - The error bounds of the estimates when sketched (see SketchFrame.error_bounds), None otherwise.
         - An error message if an error occurs, None otherwise.
     """
-    distinct_revs: Set[str] = set()
-    timestamps: List[int] = []
-    devs: Set[str] = set()
-    total_size: int = 0
-    visited_files: Dict[str, int] = {}
-    commits_per_developer: Dict[str, int] = {}
+    with span("history"):
+        frame = history_frame(revision_ids, history)
+        for src in history_sources(revision_ids, multi_source):
+            try:
+                if history is not None:
+                    nodes = walk_history(history, src)
+                else:
+                    nodes = traverse_iter(src, profile="history")
+                reduce_stream(nodes, [frame])
+            except BudgetExceeded:
+                break  # Keep the revisions gathered so far
+            except GraphError as e:
+                return 0, None, 0, [], 0, [], None, str(e)
 
-    def traverse_dir(dir_id: str):
-        nonlocal total_size
-        cnt_nodes, error_msg = traverse([dir_id], "cnt")
-        if error_msg:
-            total_size = None  # Mark size calculation as failed
-            return
-        for cnt_node in cnt_nodes:
-            if total_size is not None and cnt_node.swhid not in visited_files:
-                visited_files[cnt_node.swhid] = cnt_node.cnt.length
-                total_size += cnt_node.cnt.length
-
-    for rev_id in revision_ids:
-        rev_nodes, error_msg = traverse([rev_id], "rev")
-        if error_msg:
-            return set(), [], 0, set(), 0, {}, error_msg
-        if rev_nodes:
-            for node in rev_nodes:
-                if node.swhid.startswith("swh:1:rev"):
-                    distinct_revs.add(node.swhid)
-                    if node.HasField("rev"):
-                        timestamps.append(node.rev.author_date)
-                        devs.add(node.rev.author)  # Add the author to the set of developers
-                        if node.rev.author in commits_per_developer:
-                            commits_per_developer[node.rev.author] += 1
-                        else:
-                            commits_per_developer[node.rev.author] = 1
-    revnode, error_msg = get_node(revision_ids[0])
-    if error_msg:
-        return None, None, None, None, None, None, error_msg
-    if revnode and revnode.successor:
-        for successor in revnode.successor:
-            if successor.swhid.startswith("swh:1:dir"):
-                traverse_dir(successor.swhid)
-            if successor.swhid.startswith("swh:1:cnt"):
-                if total_size is not None and successor.swhid not in visited_files:
-                    visited_files[successor.swhid] = successor.cnt.length
-                    total_size += successor.cnt.length
+    with span("size"):
+        total_size = None  # Left unknown once the budget of the origin is exhausted
+        if not budget_exhausted():
+            revnode, error_msg = get_node(revision_ids[0])
+            if error_msg and not budget_exhausted():
+                return None, None, None, None, None, None, None, error_msg
 
-    return len(distinct_revs), timestamps, len(devs), devs, total_size, commits_per_developer, None
+            if not error_msg:
+                total_size = 0
+                try:
+                    if revnode and revnode.successor:
+                        for successor in revnode.successor:
+                            if successor.swhid.startswith("swh:1:dir"):
+                                dir_size, error_msg = tree_size(successor.swhid)
+                                if error_msg:
+                                    total_size = None  # Mark size calculation as failed
+                                    break
+                                total_size += dir_size
+                except BudgetExceeded:
+                    total_size = None
 
-def gini_index(commits_per_developer: Dict[str, int]) -> float:
+    return frame.commit_count(), frame.timestamp_range(), frame.developer_count(), list(frame.commits_per_developer()), total_size, frame.developer_counts(), frame.error_bounds(), None
+
+def summarize_history(timestamp_range: Optional[Tuple[int, int]], developer_counts: np.ndarray) -> Tuple[Optional[int], Optional[int], Optional[float]]:
     """
-    Calculates the Gini index based on the number of commits per developer.
+    Derives the latest commit, the age and the Gini index of a repository from its history.
 
     Args:
-        commits_per_developer (Dict[str, int]): A dictionary with the number of commits per developer.
+        timestamp_range (Optional[Tuple[int, int]]): The oldest and latest commit timestamps.
+        developer_counts (np.ndarray): The number of commits of each developer.
 
     Returns:
-        float: The Gini index (0 = perfect equality, 1 = maximal inequality).
+        Tuple[Optional[int], Optional[int], Optional[float]]:
+        - The latest commit timestamp, or None if there are no commits.
+        - The age of the repository in seconds, or None if there are no commits.
+        - The Gini index, or None if there are no developers.
     """
-    n = len(commits_per_developer)
-    
-    if n == 0:
-        return 0  # Avoid division by zero
-    
-    # Sort commit counts
-    commits = sorted(commits_per_developer.values())
-    
-    # Total number of commits
-    total_commits = sum(commits)
-    
-    if total_commits == 0:
-        return 0  # Avoid division by zero
-    
-    # Compute Gini index using proper formula
-    cumulative_sum = sum((i + 1) * commit for i, commit in enumerate(commits))
-    
-    gini = (2 * cumulative_sum) / (n * total_commits) - (n + 1) / n
-    return gini
+    # Calculate the age of the repository
+    if timestamp_range:
+        oldest_commit, latest_commit = timestamp_range
+        age = latest_commit - oldest_commit
+    else:
+        latest_commit = None
+        age = None
+
+    if len(developer_counts):
+        gini = gini_from_counts(developer_counts)
+    else:
+        gini = None
 
-def get_revisions_from_latest(swhid: str) -> Tuple[Optional[int], Optional[str], Optional[int], Optional[int], Optional[int]]:
+    return latest_commit, age, gini
+
+def get_revisions_from_latest(swhid: str, extraction: str = "classic") -> Tuple[Optional[int], Optional[str], Optional[int], Optional[int], Optional[int]]:
     """ 
     Fetches the latest revisions from the repository, counts the number of distinct 'rev' nodes, 
     calculates the age of the repository (difference between latest and oldest commit), 
@@ -121,6 +367,7 @@ def get_revisions_from_latest(swhid: str) -> Tuple[Optional[int], Optional[str],
     
     Args:
         swhid (str): The identifier of the repository to fetch revisions from.
+        extraction (str): How the history is fetched, one of EXTRACTION_MODES.
 
     Returns:
         Tuple[Optional[int], Optional[str], Optional[int], Optional[int], Optional[int]]:
@@ -132,72 +379,61 @@ def get_revisions_from_latest(swhid: str) -> Tuple[Optional[int], Optional[str],
         - The size of the repository in bytes.
     """
     if not swhid:
-        return None, None, None, None, None, None, None, None, "No swhid provided"
+        return None, None, None, None, None, None, None, None, None, "No swhid provided"
     if not swhid.startswith("swh:1:ori:"):
-        return None, None, None, None, None, None, None, None, "Invalid swhid format"
+        return None, None, None, None, None, None, None, None, None, "Invalid swhid format"
 
     # Step 1: Get the origin node
-    url = None
-    origin_node, error_msg = get_node(swhid)
-    url = origin_node.ori.url
+    with span("fetch-origin"):
+        origin_node, error_msg = get_node(swhid)
     if error_msg:
-        return None, None, None, None, None, None, None, None, error_msg
+        return None, None, None, None, None, None, None, None, None, error_msg
     if not origin_node:
-        return None, None, None, None, None, None, None, None, "No origin node found"
+        return None, None, None, None, None, None, None, None, None, "No origin node found"
+    url = origin_node.ori.url
 
     # Step 2: Get the latest snapshot node
     if not origin_node.successor:
-        return None, None, None, None, None, None, None, None, "No successors found"
-
-    snapshot_node = None
-    for successor in origin_node.successor:
-        if successor.swhid.startswith("swh:1:snp"):
-            snapshot_id = successor.swhid
-            snapshot_node, error_msg = get_node(snapshot_id)
-            if error_msg:
-                return None, None, None, None, None, None, None, None, error_msg
-            if snapshot_node and snapshot_node.successor:
-                break
+        return None, None, None, None, None, None, None, None, None, "No successors found"
 
-    if not snapshot_node:
-        return None, None, None, None, None, None, None, None, "No snapshot found"
+    snapshot_ids = [successor.swhid for successor in origin_node.successor if successor.swhid.startswith("swh:1:snp")]
+    history = None
+    if extraction == "single":
+        # One traversal brings every snapshot and revision of the origin
+        with span("history"):
+            history, error_msg = extract_origin_history(origin_node)
+        if error_msg:
+            return None, None, None, None, None, None, None, None, None, error_msg
+        snapshot_candidates = ((history.get(snapshot_id), None) for snapshot_id in snapshot_ids)
+    else:
+        # Fetch every snapshot candidate in one batch
+        with span("snapshot"):
+            snapshot_candidates = get_nodes(snapshot_ids)
 
     # Step 3: Extract the main or master revision from the snapshot
-    revision_ids = []
-    if origin_node.ori.url.startswith("https://github.com"):
-        main_or_master_revision_id = get_main_or_master_revision(snapshot_node.successor)
-        if main_or_master_revision_id:
-            print(f"Main or master revision found: {main_or_master_revision_id}")
-            revision_ids = [main_or_master_revision_id]
-    else:
-        revision_ids = [successor.swhid for successor in snapshot_node.successor if successor.swhid.startswith("swh:1:rev")]
+    with span("snapshot"):
+        snapshot_node, revision_ids, error_msg = resolve_branches(origin_node, snapshot_candidates)
+    if error_msg:
+        return None, None, None, None, None, None, None, None, None, error_msg
+    if history is not None and walks_single_head(origin_node):
+        history = None  # Only the snapshots were streamed, the head is traversed on the server
 
     # Step 4: Collect distinct 'rev' nodes, timestamps, devs, and calculate repo size
-    distinct_revs, timestamps, num_devs, devs, repo_size, commits_per_developer, error_msg = collect_revisions_timestamps_and_devs_and_size(revision_ids)
+    distinct_revs, timestamp_range, num_devs, devs, repo_size, developer_counts, error_bounds, error_msg = collect_revisions_timestamps_and_devs_and_size(revision_ids, history, extraction == "multi-source")
     if error_msg:
-        return None, None, None, None, None, None, None, None, error_msg
+        return None, None, None, None, None, None, None, None, None, error_msg
 
-    # Calculate the age of the repository
-    if timestamps:
-        latest_commit = max(timestamps)
-        age = max(timestamps) - min(timestamps)
-    else:
-        latest_commit = None
-        age = None
-    
-    if commits_per_developer:
-        gini = gini_index(commits_per_developer)
-    else:
-        gini = None
+    with span("metrics"):
+        latest_commit, age, gini = summarize_history(timestamp_range, developer_counts)
 
-    return url, distinct_revs, latest_commit, age, num_devs, devs, gini, repo_size, None
+    return url, distinct_revs, latest_commit, age, num_devs, devs, gini, repo_size, error_bounds, None
 
 
 # Example usage
 if __name__ == "__main__":
     # count, error, age = get_revisions_from_latest("swh:1:ori:0259ab09d7832d244383f26fab074d04bfba11cd")
     # count, error, age, devs = get_revisions_from_latest("swh:1:ori:006762b49f6052c9648a93fabcddeb68c90d2382")     # voila dashboards
-    url, count, maxtime, age, devs, devset, gini, size, error = get_revisions_from_latest("swh:1:ori:018438a0237516842ca1d683f6566e66dabe0722")       # crashing repo
+    url, count, maxtime, age, devs, devset, gini, size, error_bounds, error = get_revisions_from_latest("swh:1:ori:018438a0237516842ca1d683f6566e66dabe0722")       # crashing repo
     if error:
         print(f"Error: {error}")
     else:
@@ -216,4 +452,6 @@ if __name__ == "__main__":
       if gini is not None:
           print(f"Developer Contribution Index: {gini}")
       if size is not None:
-          print(f"Repository size: {size} bytes")
\ No newline at end of file
+          print(f"Repository size: {size} bytes")
+      if error_bounds is not None:
+          print(f"Approximate, error bounds: {error_bounds}")
@@ -0,0 +1,232 @@
+import csv
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Cost-based dispatch of the origins in async mode. The cost of an origin, in
+# seconds, is predicted from its row of the previous metrics file with a linear
+# model of its commits, size and developers. Origins are dispatched longest
+# expected first, and the few whose cost alone would stretch the makespan are
+# only started on dedicated slots so that the other slots keep working through
+# the small ones.
+#
+# Every scheduled run writes a report of the predicted and actual cost of each
+# origin. The next run fits the model to that report, so predictions follow
+# the server and dataset actually used.
+
+SCHEDULES = ["input", "cost"]
+COST_REPORT_FILE = "data/cost_report.csv"
+COST_REPORT_HEADER = ["swhid", "commits", "size", "devCount", "large", "predicted", "actual"]
+FEATURES = ["commits", "size", "devCount"]
+
+# Seconds per origin, per commit, per byte and per developer until a report is available
+DEFAULT_COEFFICIENTS = [0.05, 1e-3, 1e-9, 1e-3]
+
+# The report must have more origins than this to be fitted
+MIN_FIT_ROWS = 20
+
+# An origin is large when its predicted cost exceeds this share of what every slot would run with a perfect split
+LARGE_SHARE = 0.25
+
+
+def optional_int(value: str) -> Optional[int]:
+    return int(value) if value not in ("", "None") else None
+
+def read_features(metrics_file: str) -> Dict[str, List[int]]:
+    """
+    Reads the cost features of the origins of a metrics CSV file, 0 for missing values.
+
+    Args:
+        metrics_file (str): The metrics CSV file of a previous run.
+
+    Returns:
+        Dict[str, List[int]]: The values of FEATURES of each origin, empty if the file does not exist.
+    """
+    features = {}
+    if not os.path.exists(metrics_file):
+        return features
+    with open(metrics_file, newline="") as f:
+        for row in csv.DictReader(f):
+            features[row["swhid"]] = [optional_int(row[name]) or 0 for name in FEATURES]
+    return features
+
+def read_failures(report_file: str) -> Dict[str, float]:
+    """
+    Reads the seconds spent on the origins that failed in a previous scheduled run.
+
+    Args:
+        report_file (str): The report of a previous scheduled run.
+
+    Returns:
+        Dict[str, float]: The actual cost of each origin reported without metrics.
+    """
+    failures = {}
+    if not os.path.exists(report_file):
+        return failures
+    with open(report_file, newline="") as f:
+        for row in csv.DictReader(f):
+            if not row["commits"] and row["actual"]:
+                failures[row["swhid"]] = float(row["actual"])
+    return failures
+
+
+class CostModel:
+    """
+    Linear model of the seconds spent on an origin.
+
+    Args:
+        coefficients (List[float]): The intercept then one coefficient per feature of FEATURES.
+    """
+
+    def __init__(self, coefficients: List[float] = DEFAULT_COEFFICIENTS):
+        self.coefficients = np.array(coefficients, dtype=np.float64)
+
+    @classmethod
+    def fit(cls, report_file: str = COST_REPORT_FILE) -> "CostModel":
+        """
+        Fits the model to the actual costs of a previous report, by least squares with
+        non-negative coefficients. Falls back to DEFAULT_COEFFICIENTS without a usable report.
+
+        Args:
+            report_file (str): The report of a previous scheduled run.
+
+        Returns:
+            CostModel: The model.
+        """
+        rows = []
+        if os.path.exists(report_file):
+            with open(report_file, newline="") as f:
+                for row in csv.DictReader(f):
+                    values = [optional_int(row[name]) for name in FEATURES]
+                    if None not in values and row["actual"]:
+                        rows.append([1, *values, float(row["actual"])])
+        if len(rows) <= MIN_FIT_ROWS:
+            return cls()
+
+        data = np.array(rows, dtype=np.float64)
+        features, actual = data[:, :-1], data[:, -1]
+        # Sizes are in bytes and commits in units, scale the columns before solving
+        scale = np.maximum(np.abs(features).max(axis=0), 1.0)
+        coefficients, *_ = np.linalg.lstsq(features / scale, actual, rcond=None)
+        return cls(np.clip(coefficients / scale, 0.0, None).tolist())
+
+    def predict(self, features: List[int]) -> float:
+        """
+        Returns the predicted seconds of an origin from the values of FEATURES.
+        """
+        return float(self.coefficients[0] + np.dot(self.coefficients[1:], features))
+
+
+class CostScheduler:
+    """
+    Dispatches the origins of one run by expected cost and reports the actual cost.
+
+    The largest origins, one per dedicated slot, are queued apart and only started
+    on the dedicated slots as long as small origins remain.
+
+    Args:
+        model (CostModel): The cost model.
+        features (Dict[str, List[int]]): The features of the origins known from the previous run.
+        slots (int): The number of origins processed at the same time.
+        large_slots (int): The number of those slots dedicated to the large origins.
+        failures (Optional[Dict[str, float]]): The seconds spent on the origins that failed in the previous
+            run, which usually fail again as fast.
+    """
+
+    def __init__(self, model: CostModel, features: Dict[str, List[int]], slots: int, large_slots: int, failures: Optional[Dict[str, float]] = None):
+        self.model = model
+        self.features = features
+        self.failures = failures or {}
+        self.slots = max(1, slots)
+        self.large_slots = min(max(0, large_slots), self.slots - 1)
+        self.predicted: Dict[str, float] = {}
+        self.order: List[str] = []
+        self.large = set()
+        self.actual: Dict[str, float] = {}
+        self.observed: Dict[str, List[int]] = {}
+        self._large: Deque[Tuple[int, str]] = deque()
+        self._small: Deque[Tuple[int, str]] = deque()
+
+    def plan(self, origins: List[str]) -> List[str]:
+        """
+        Orders the origins longest expected first, ties in input order, and splits off the large ones.
+
+        Args:
+            origins (List[str]): The origins to process, in input order.
+
+        Returns:
+            List[str]: The origins in dispatch order.
+        """
+        known = {swhid: self.model.predict(self.features[swhid]) for swhid in origins if swhid in self.features}
+        # Origins never seen before are expected to cost as much as a typical one
+        default = float(np.median(list(known.values()))) if known else self.model.predict([0] * len(FEATURES))
+        known.update((swhid, self.failures[swhid]) for swhid in origins if swhid in self.failures and swhid not in known)
+        self.predicted = {swhid: known.get(swhid, default) for swhid in origins}
+        self.order = sorted(origins, key=lambda swhid: -self.predicted[swhid])
+
+        # One large origin per dedicated slot, the next ones still start early from the head of the small queue
+        threshold = LARGE_SHARE * sum(self.predicted.values()) / self.slots
+        self.large = {swhid for swhid in self.order[:self.large_slots] if self.predicted[swhid] > threshold}
+        self._large = deque((index, swhid) for index, swhid in enumerate(self.order) if swhid in self.large)
+        self._small = deque((index, swhid) for index, swhid in enumerate(self.order) if swhid not in self.large)
+        return self.order
+
+    def take(self, dedicated: bool) -> Optional[Tuple[int, str]]:
+        """
+        Returns the next origin for a slot, with its position in the dispatch order.
+
+        Args:
+            dedicated (bool): Whether the slot is one of the large_slots.
+
+        Returns:
+            Optional[Tuple[int, str]]: The position and swhid, None when every origin was taken.
+            Dedicated slots take the large origins first, the others the small ones,
+            and either falls back to the other queue once its own is empty.
+        """
+        first, second = (self._large, self._small) if dedicated else (self._small, self._large)
+        if first:
+            return first.popleft()
+        if second:
+            return second.popleft()
+        return None
+
+    def record(self, swhid: str, seconds: float, metric: Optional[Dict]):
+        """
+        Records the time spent on an origin, and its features when its metrics were computed.
+        """
+        self.actual[swhid] = seconds
+        if metric is not None:
+            self.observed[swhid] = [metric.get(name) or 0 for name in FEATURES]
+
+    def write_report(self, path: str = COST_REPORT_FILE):
+        """
+        Writes the predicted and actual cost of each origin, in dispatch order, for the next run to fit its model to.
+        """
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COST_REPORT_HEADER)
+            for swhid in self.order:
+                if swhid in self.actual:
+                    writer.writerow([swhid, *self.observed.get(swhid, [""] * len(FEATURES)), int(swhid in self.large),
+                                     f"{self.predicted[swhid]:.6f}", f"{self.actual[swhid]:.6f}"])
+
+    def summary(self) -> str:
+        """
+        Compares the predicted and actual costs, as a log-friendly string.
+        """
+        if not self.actual:
+            return "no origin processed"
+        predicted = np.array([self.predicted[swhid] for swhid in self.actual])
+        actual = np.array(list(self.actual.values()))
+        correlation = np.corrcoef(predicted, actual)[0, 1] if predicted.std() and actual.std() else float("nan")
+        return (f"{len(actual)} origins ({len(self.large)} large), predicted {predicted.sum():.1f}s, actual {actual.sum():.1f}s, "
+                f"mean absolute error {np.abs(predicted - actual).mean():.3f}s, correlation {correlation:.2f}")
+
+    def worst(self, k: int = 5) -> List[Tuple[str, float, float]]:
+        """
+        Returns the k origins with the largest prediction errors, with their predicted and actual seconds.
+        """
+        swhids = sorted(self.actual, key=lambda swhid: -abs(self.actual[swhid] - self.predicted[swhid]))[:k]
+        return [(swhid, self.predicted[swhid], self.actual[swhid]) for swhid in swhids]
@@ -0,0 +1,94 @@
+import csv
+import hashlib
+import heapq
+import os
+from typing import Dict, List
+
+from helpers.metrics_writer import METRICS_HEADER
+
+# Deterministic partitioning of the origins for sharded runs. An origin always
+# lands in the same shard for a given shard count, whatever the input order or
+# the machine, so one shard can be re-run on its own. The hash is the one used
+# by server/extract_origins.py for its origins-<k>.csv index.
+
+
+def shard_of(swhid: str, shards: int) -> int:
+    """
+    Returns the shard of an origin.
+
+    Args:
+        swhid (str): The swhid of the origin.
+        shards (int): The number of shards.
+
+    Returns:
+        int: The shard index, in [0, shards).
+    """
+    return int.from_bytes(hashlib.blake2b(swhid.encode(), digest_size=8).digest(), "big") % shards
+
+def shard_path(path: str, shard: int, shards: int) -> str:
+    """
+    Returns the per-shard variant of a file path, e.g. data/metrics.shard-002-of-008.csv.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard:03d}-of-{shards:03d}{ext}"
+
+def merge_metrics(shard_files: List[str], output_file: str, order: List[str]) -> int:
+    """
+    Combines the metrics CSV files of the shards into one file.
+
+    Rows are sorted by the position of their origin in `order`, so the result
+    matches an unsharded run; origins missing from it come last, by swhid. When
+    an origin appears more than once, e.g. after a shard was re-run, its last
+    row wins. Missing shard files are skipped.
+
+    Args:
+        shard_files (List[str]): The metrics CSV file of each shard.
+        output_file (str): The merged metrics CSV file.
+        order (List[str]): The origin swhids in input order.
+
+    Returns:
+        int: The number of rows written.
+    """
+    rows: Dict[str, List[str]] = {}
+    for shard_file in shard_files:
+        if not os.path.exists(shard_file):
+            continue
+        with open(shard_file, newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Header
+            for row in reader:
+                if row:
+                    rows[row[0]] = row
+
+    position = {swhid: index for index, swhid in enumerate(order)}
+    missing = len(position)
+    ordered = sorted(rows.values(), key=lambda row: (position.get(row[0], missing), row[0]))
+
+    tmp_file = f"{output_file}.tmp"
+    with open(tmp_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(METRICS_HEADER)
+        writer.writerows(ordered)
+    os.replace(tmp_file, output_file)
+    return len(ordered)
+
+def merge_logs(log_files: List[str], output_file: str):
+    """
+    Interleaves the log files of the shards by timestamp into one log.
+
+    Each log is already in time order and its lines start with the asctime of
+    the logging format, so a k-way merge of the lines keeps the whole log in
+    time order. The output is truncated rather than replaced, so a handler
+    appending to it keeps working.
+
+    Args:
+        log_files (List[str]): The log file of each shard.
+        output_file (str): The merged log file.
+    """
+    inputs = [open(log_file) for log_file in log_files if os.path.exists(log_file)]
+    try:
+        with open(output_file, "w") as output:
+            output.writelines(heapq.merge(*inputs))
+    finally:
+        for f in inputs:
+            f.close()
@@ -0,0 +1,260 @@
+import hashlib
+import heapq
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from helpers.revision_frame import REV_PREFIX, gini_from_counts
+
+# Approximate history metrics in constant memory, for histories too large to
+# keep one row per revision. Distinct commits and developers are HyperLogLog
+# estimates, per-developer commit counts come from a space-saving heavy hitters
+# summary, and the oldest and latest commit dates stay exact.
+#
+# Like the other process-wide settings, the mode is configured once by main.py:
+# "exact" never uses sketches, "sketch" always does, and "auto" first asks the
+# server how many revisions the heads reach (CountNodes) and only sketches the
+# histories above the threshold.
+
+SKETCH_MODES = ["exact", "auto", "sketch"]
+SKETCH_THRESHOLD = 1_000_000
+HLL_PRECISION = 14
+HEAVY_HITTERS = 1024
+
+# Error bounds are reported at two standard errors, about 95% of the estimates
+CONFIDENCE = 2
+
+
+def hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """
+    Distinct count estimate in 2^precision one-byte registers.
+
+    Args:
+        precision (int): The number of hash bits selecting a register.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+
+    def add(self, data: bytes):
+        value = hash64(data)
+        index = value >> self._shift
+        rank = self._shift - (value & self._mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> int:
+        """
+        Returns the estimated number of distinct items, with the small range correction.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            raw = m * math.log(m / zeros)
+        return int(round(raw))
+
+    def relative_error(self) -> float:
+        """
+        Returns the standard error of the estimate, relative to it.
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class SpaceSaving:
+    """
+    Space-saving heavy hitters: counts of at most `capacity` items.
+
+    A new item evicts the smallest counter and inherits its count, so a count
+    overestimates the true one by at most the count it inherited, itself at most
+    total / capacity. The smallest counter is found through a heap whose stale
+    entries are skipped lazily.
+
+    Args:
+        capacity (int): The number of counters.
+    """
+
+    def __init__(self, capacity: int = HEAVY_HITTERS):
+        self.capacity = max(1, capacity)
+        self.counts: Dict[int, int] = {}
+        self.errors: Dict[int, int] = {}
+        self.total = 0
+        self._heap: List[Tuple[int, int]] = []
+
+    def add(self, item: int):
+        self.total += 1
+        if item in self.counts:
+            self.counts[item] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = 1
+            self.errors[item] = 0
+        else:
+            while True:
+                count, evicted = heapq.heappop(self._heap)
+                if self.counts.get(evicted) == count:
+                    break
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[item] = count + 1
+            self.errors[item] = count
+        heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def top(self) -> Dict[int, int]:
+        """
+        Returns the estimated count of each tracked item, largest first.
+        """
+        return dict(sorted(self.counts.items(), key=lambda entry: -entry[1]))
+
+    def max_error(self) -> int:
+        """
+        Returns the largest overestimate of a tracked count.
+        """
+        return max(self.errors.values(), default=0)
+
+
+class SketchFrame:
+    """
+    Constant-memory counterpart of RevisionFrame, fed like a reducer (see reducers.reduce_stream).
+
+    As with RevisionFrame, revisions reached again from another head count
+    once towards the commits and again towards their author.
+
+    Args:
+        precision (int): The HyperLogLog precision.
+        capacity (int): The number of developers whose commits are counted.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION, capacity: int = HEAVY_HITTERS):
+        self.commits = HyperLogLog(precision)
+        self.developers = HyperLogLog(precision)
+        self.heavy_hitters = SpaceSaving(capacity)
+        self.oldest: Optional[int] = None
+        self.latest: Optional[int] = None
+
+    def update(self, node):
+        if not node.HasField("rev") or not node.swhid.startswith(REV_PREFIX):
+            return
+        self.commits.add(bytes.fromhex(node.swhid[len(REV_PREFIX):]))
+        author = node.rev.author
+        self.developers.add(author.to_bytes(8, "big", signed=True))
+        self.heavy_hitters.add(author)
+        timestamp = node.rev.author_date
+        if self.oldest is None or timestamp < self.oldest:
+            self.oldest = timestamp
+        if self.latest is None or timestamp > self.latest:
+            self.latest = timestamp
+
+    def result(self) -> "SketchFrame":
+        return self
+
+    def commit_count(self) -> int:
+        return self.commits.estimate() if self.heavy_hitters.total else 0
+
+    def timestamp_range(self) -> Optional[Tuple[int, int]]:
+        if self.oldest is None:
+            return None
+        return self.oldest, self.latest
+
+    def developer_count(self) -> int:
+        """
+        Returns the estimated number of distinct developers, at least the number of tracked ones.
+        """
+        if not self.heavy_hitters.total:
+            return 0
+        return max(self.developers.estimate(), len(self.heavy_hitters.counts))
+
+    def commits_per_developer(self) -> Dict[int, int]:
+        """
+        Returns the estimated commits of the heaviest developers, largest first.
+        """
+        return self.heavy_hitters.top()
+
+    def developer_counts(self) -> np.ndarray:
+        """
+        Returns an estimated number of commits for every developer: the tracked
+        counts, then the remaining commits spread evenly over the untracked developers.
+        """
+        top = np.fromiter(self.heavy_hitters.counts.values(), dtype=np.int64)
+        untracked = self.developer_count() - len(top)
+        remaining = max(0, self.heavy_hitters.total - int(top.sum()))
+        if untracked <= 0:
+            return top
+        tail = np.full(untracked, remaining // untracked, dtype=np.int64)
+        tail[:remaining % untracked] += 1
+        return np.concatenate([top, tail])
+
+    def gini(self) -> Optional[float]:
+        if not self.heavy_hitters.total:
+            return None
+        return gini_from_counts(self.developer_counts())
+
+    def error_bounds(self) -> Dict[str, int]:
+        """
+        Returns the error bounds of the estimates, as absolute values.
+
+        Returns:
+            Dict[str, int]:
+            - "commits": The error bound of the commit count.
+            - "devCount": The error bound of the developer count.
+            - "devCommits": The largest overestimate of the commits of a listed developer.
+        """
+        return {
+            "commits": math.ceil(CONFIDENCE * self.commits.relative_error() * self.commit_count()),
+            "devCount": math.ceil(CONFIDENCE * self.developers.relative_error() * self.developer_count()),
+            "devCommits": self.heavy_hitters.max_error(),
+        }
+
+
+_settings = {"mode": "exact", "threshold": SKETCH_THRESHOLD, "precision": HLL_PRECISION, "capacity": HEAVY_HITTERS}
+
+def configure_sketches(mode: str = "exact", threshold: int = SKETCH_THRESHOLD, precision: int = HLL_PRECISION, capacity: int = HEAVY_HITTERS):
+    """
+    Sets how the histories of the origins are summarized.
+
+    Args:
+        mode (str): One of SKETCH_MODES.
+        threshold (int): In "auto" mode, the number of revisions above which a history is sketched.
+        precision (int): The HyperLogLog precision.
+        capacity (int): The number of developers whose commits are counted.
+    """
+    if mode not in SKETCH_MODES:
+        raise ValueError(f"Unknown sketch mode: {mode}")
+    _settings.update(mode=mode, threshold=threshold, precision=precision, capacity=capacity)
+
+def sketch_mode() -> str:
+    """
+    Returns the configured mode, one of SKETCH_MODES.
+    """
+    return _settings["mode"]
+
+def needs_sketch(revision_count: Optional[int]) -> bool:
+    """
+    Decides whether a history is sketched, from the number of revisions it reaches.
+
+    Args:
+        revision_count (Optional[int]): The number of revisions, None if it could not be counted.
+
+    Returns:
+        bool: True in "sketch" mode, and in "auto" mode above the threshold.
+    """
+    if _settings["mode"] == "auto":
+        return revision_count is not None and revision_count > _settings["threshold"]
+    return _settings["mode"] == "sketch"
+
+def new_sketch_frame() -> SketchFrame:
+    """
+    Returns an empty SketchFrame with the configured precision and capacity.
+    """
+    return SketchFrame(_settings["precision"], _settings["capacity"])
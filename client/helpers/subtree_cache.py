@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Number of distinct contents the cache holds, over all its directories
+SUBTREE_CACHE_SIZE = 2_000_000
+
+CNT_PREFIX = "swh:1:cnt:"
+
+
+class ContentSet:
+    """
+    The distinct contents of a directory tree, as sorted 20-byte content hashes
+    and their lengths. Sets of several trees combine exactly: a content present
+    in more than one of them counts once in their union.
+
+    Args:
+        ids (np.ndarray): The sorted, distinct content hashes, of dtype S20.
+        lengths (np.ndarray): The length of each content, in the order of ids.
+    """
+
+    def __init__(self, ids: np.ndarray, lengths: np.ndarray):
+        self.ids = ids
+        self.lengths = lengths
+
+    @classmethod
+    def from_lengths(cls, lengths: Dict[str, int]) -> "ContentSet":
+        """
+        Builds the set from the length of each content swhid, as gathered by reducers.ContentLengthSum.
+        """
+        ids = np.array([bytes.fromhex(swhid[len(CNT_PREFIX):]) for swhid in lengths], dtype="S20")
+        values = np.fromiter(lengths.values(), dtype=np.int64, count=len(lengths))
+        order = np.argsort(ids, kind="stable")
+        return cls(ids[order], values[order])
+
+    @classmethod
+    def union(cls, parts: List["ContentSet"]) -> "ContentSet":
+        """
+        Returns the distinct contents of several trees.
+        """
+        ids = np.concatenate([part.ids for part in parts]) if parts else np.array([], dtype="S20")
+        lengths = np.concatenate([part.lengths for part in parts]) if parts else np.array([], dtype=np.int64)
+        ids, first = np.unique(ids, return_index=True)
+        return cls(ids, lengths[first])
+
+    @property
+    def size(self) -> int:
+        return int(self.lengths.sum())
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class SubtreeSizeCache:
+    """
+    Bounded LRU cache mapping a directory swhid to the distinct contents of the
+    tree below it.
+
+    A directory swhid is a Merkle hash of its whole subtree, so an entry never
+    goes stale and can be shared by every origin of a run: forks and mirrors of
+    the same project reuse the subdirectories they have in common. Entries keep
+    the contents themselves rather than a size, so the sizes of several
+    subdirectories add up to the deduplicated size of their parent.
+
+    Args:
+        max_contents (int): The number of contents to remember, over all directories. 0 disables the cache.
+    """
+
+    def __init__(self, max_contents: int = SUBTREE_CACHE_SIZE):
+        self.max_contents = max(0, max_contents)
+        self._entries: "OrderedDict[str, ContentSet]" = OrderedDict()
+        self.contents = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_contents > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, dir_swhid: str) -> Optional[ContentSet]:
+        """
+        Looks up a directory.
+
+        Args:
+            dir_swhid (str): The swhid of the directory.
+
+        Returns:
+            Optional[ContentSet]: The distinct contents of its tree, None if unknown.
+        """
+        entry = self._entries.get(dir_swhid)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(dir_swhid)
+        self.hits += 1
+        return entry
+
+    def put(self, dir_swhid: str, contents: ContentSet):
+        """
+        Stores a directory, evicting the least recently used ones beyond max_contents.
+        Trees larger than the whole cache are not stored.
+
+        Args:
+            dir_swhid (str): The swhid of the directory.
+            contents (ContentSet): The distinct contents of its tree.
+        """
+        if not self.enabled or len(contents) > self.max_contents:
+            return
+        previous = self._entries.pop(dir_swhid, None)
+        if previous is not None:
+            self.contents -= len(previous)
+        self._entries[dir_swhid] = contents
+        self.contents += len(contents)
+        while self.contents > self.max_contents:
+            _, evicted = self._entries.popitem(last=False)
+            self.contents -= len(evicted)
+
+
+_cache = SubtreeSizeCache()
+
+def get_subtree_cache() -> SubtreeSizeCache:
+    """
+    Returns the process-wide subtree cache.
+
+    Returns:
+        SubtreeSizeCache: The shared cache.
+    """
+    return _cache
+
+def configure_subtree_cache(max_contents: int):
+    """
+    Replaces the process-wide cache with an empty one of the given capacity.
+
+    Args:
+        max_contents (int): The number of contents to remember. 0 disables the cache.
+    """
+    global _cache
+    _cache = SubtreeSizeCache(max_contents)
@@ -1,7 +1,25 @@
-from helpers.get_metrics import get_metrics_for_git_repos, get_metrics_for_pypi_repos, get_general_metrics
-from helpers.controllers import get_node
-from datetime import datetime
+from helpers.get_metrics import budget_metrics, get_metrics_for_git_repos, get_metrics_for_pypi_repos, get_general_metrics, get_repo_metrics_async
+from helpers.controllers import get_node, get_nodes, set_client
+from helpers.async_controllers import AsyncGraphClient
+from helpers.budget import Budget, configure_budget, origin_budget, over_budget
+from helpers.local_graph import LocalGraphBackend
+from helpers.metrics_writer import MetricsWriter, FSYNC_EVERY
+from helpers.parquet_writer import ParquetMetricsWriter, ROW_GROUP_SIZE
+from helpers.instrumentation import configure_instrumentation, get_instrumentation
+from helpers.node_cache import NODE_CACHE_FILE, configure_node_cache
+from helpers.replay import configure_recording, configure_replay
+from helpers.refresh import REFRESH_STATE_FILE, RESOLVE, REUSE, SKIP, RefreshState, configure_refresh, get_refresh_state, snapshot_ids
+from helpers.revisions_traversal import EXTRACTION_MODES, resolve_branches
+from helpers.scheduler import COST_REPORT_FILE, SCHEDULES, CostModel, CostScheduler, read_failures, read_features
+from helpers.sketches import SKETCH_MODES, SKETCH_THRESHOLD, configure_sketches
+from helpers.sharding import merge_logs, merge_metrics, shard_of, shard_path
+from helpers.subtree_cache import SUBTREE_CACHE_SIZE, configure_subtree_cache, get_subtree_cache
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
 import csv
+import subprocess
+import sys
 import time
 import logging
 
@@ -9,20 +27,33 @@ INPUT_FILE = "data/full_origins.csv"
 INPUT_FILE_TEST = "data/origins.csv"
 OUTPUT_FILE = "data/metrics.csv"
 OUTPUT_FILE_TEST = "data/partial_metrics.csv"
+PARQUET_OUTPUT_DIR = "data/metrics_parquet"
+PARQUET_OUTPUT_DIR_TEST = "data/partial_metrics_parquet"
+OUTPUT_FORMATS = ["csv", "parquet"]
 LOG_FILE = "data/output_log.txt"
-AGE_FACTOR = 86400
+DEFAULT_CONCURRENCY = 16
 
-with open(LOG_FILE, "w") as f:
-    f.write("")
+def configure_logging(log_file: str):
+    """
+    Sends the logs to the console and to log_file, replacing any previous configuration.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[
+        logging.FileHandler(log_file),
+        logging.StreamHandler()
+    ], force=True)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[
-    logging.FileHandler(LOG_FILE),
-    logging.StreamHandler()
-])
+def read_origins(input_file: str, shard: Optional[Tuple[int, int]] = None) -> List[str]:
+    """
+    Reads the origin swhids from the input file, skipping and logging malformed ones.
 
-def get_metrics(input_file, output_file):
-    metrics = {}
+    Args:
+        input_file (str): The CSV file with one origin swhid per row.
+        shard (Optional[Tuple[int, int]]): Only keep the origins of this (shard, shards) partition.
+
+    Returns:
+        List[str]: The origin swhids in file order.
+    """
+    origins = []
     with open(input_file, "r") as f:
         reader = csv.reader(f)
         for row in reader:
@@ -32,72 +63,486 @@ def get_metrics(input_file, output_file):
                 logging.error(f"Invalid swhid format: {origin_swhid}")
                 continue
 
-            node, err = get_node(origin_swhid)
-            if err:
-                logging.error(f"Error: {err} with repo: {origin_swhid}")
+            if shard is not None and shard_of(origin_swhid, shard[1]) != shard[0]:
                 continue
+            origins.append(origin_swhid)
+    return origins
 
-            url = node.ori.url
+def repository_kind(url: str) -> str:
+    """
+    Classifies an origin URL the way the ingestion logs it.
 
-            if 'github' in url or 'gitlab' in url or 'bitbucket' in url:
-                logging.info(f"Processing Git repository: {origin_swhid}")
-                try:
-                    git_metrics = get_metrics_for_git_repos(origin_swhid)
-                except Exception as e:
-                    logging.error(f"Error: {e} with repo: {origin_swhid}")
-                    continue
-                finally:
-                    if 'error' in git_metrics:
-                        logging.error(f"Error: {git_metrics['error']} with repo: {origin_swhid}")
-                        continue
-                    metrics[origin_swhid] = git_metrics
-            elif 'pypi' in url:
-                logging.info(f"Processing PyPI repository: {origin_swhid}")
-                try:
-                    pypi_metrics = get_metrics_for_pypi_repos(origin_swhid)
-                except Exception as e:
-                    logging.error(f"Error: {e} with repo: {origin_swhid}")
-                    continue
-                finally:
-                    if 'error' in pypi_metrics:
-                        logging.error(f"Error: {pypi_metrics['error']} with repo: {origin_swhid}")
-                        continue
-                    metrics[origin_swhid] = pypi_metrics
+    Args:
+        url (str): The origin URL.
+
+    Returns:
+        str: "Git", "PyPI" or "general".
+    """
+    if 'github' in url or 'gitlab' in url or 'bitbucket' in url:
+        return "Git"
+    elif 'pypi' in url:
+        return "PyPI"
+    return "general"
+
+def with_status(metric: Dict, budget: Budget, origin_swhid: str) -> Dict:
+    """
+    Records in the metrics whether the origin was processed within its budget.
+
+    Args:
+        metric (Dict): The metrics of the origin.
+        budget (Budget): The budget the origin was processed with.
+        origin_swhid (str): The swhid of the origin.
+
+    Returns:
+        Dict: The metrics, with their "status", one of ORIGIN_STATUSES.
+    """
+    if budget.exhausted:
+        logging.warning(f"Budget exceeded ({budget.status}, {budget.nodes} nodes streamed), partial metrics for repo: {origin_swhid}")
+    metric["status"] = budget.status
+    return metric
+
+def timeout_metric(node, budget: Budget, origin_swhid: str) -> Dict:
+    """
+    Returns the metrics of an origin whose budget ran out before they could be gathered,
+    to be recorded with its status like the partial ones.
+
+    Args:
+        node (Optional[Node]): The origin node, None if it could not be fetched in time.
+        budget (Budget): The budget the origin was processed with.
+        origin_swhid (str): The swhid of the origin.
+
+    Returns:
+        Dict: The metrics, empty but for the URL, source and status.
+    """
+    return with_status(budget_metrics(node.ori.url if node is not None else ""), budget, origin_swhid)
+
+def refresh_outcome(refresh: RefreshState, node, outcome: str) -> Optional[Dict]:
+    """
+    Logs the outcome of a refresh check and returns the metrics it reuses.
+
+    Args:
+        refresh (RefreshState): The refresh state.
+        node (Node): The origin node.
+        outcome (str): The outcome of RefreshState.check or check_heads.
+
+    Returns:
+        Optional[Dict]: The previous metrics of the origin when they are reused, None otherwise.
+    """
+    if outcome == SKIP:
+        logging.info(f"Skipping repo with unchanged failure: {node.swhid}")
+    elif outcome == REUSE:
+        logging.info(f"Reusing metrics of unchanged repo: {node.swhid}")
+        return refresh.metric(node.swhid)
+    return None
+
+def process_origin(origin_swhid: str, extraction: str = "classic") -> Optional[Dict]:
+    """
+    Computes the metrics of one origin, logging any error.
+
+    Args:
+        origin_swhid (str): The swhid of the origin.
+        extraction (str): How the history is fetched, one of EXTRACTION_MODES.
+
+    Returns:
+        Optional[Dict]: The metrics of the origin, None if they could not be computed. When
+        its budget ran out, the metrics gathered until then, with a "partial" or "timeout" status.
+    """
+    with get_instrumentation().origin(origin_swhid), origin_budget() as budget:
+        # An origin swhid names a URL, not its content: under refresh the node must list the snapshots
+        # of the export being served, not those of the export it was cached from
+        refresh = get_refresh_state()
+        node, err = get_node(origin_swhid, fresh=refresh is not None)
+        if err:
+            if over_budget(err):
+                return timeout_metric(None, budget, origin_swhid)
+            logging.error(f"Error: {err} with repo: {origin_swhid}")
+            return None
+
+        # Only the origin node is fetched for unchanged origins, the snapshots when they changed
+        heads = []
+        if refresh is not None:
+            outcome = refresh.check(node)
+            if outcome == RESOLVE:
+                _, heads, err = resolve_branches(node, get_nodes(snapshot_ids(node)))
+                if err and over_budget(err):
+                    return timeout_metric(node, budget, origin_swhid)
+                outcome = refresh.check_heads(node, heads, err)
+                if outcome == SKIP:
+                    logging.error(f"Error: {err} with repo: {origin_swhid}")
+                    return None
+            if outcome in (REUSE, SKIP):
+                return refresh_outcome(refresh, node, outcome)
+
+        kind = repository_kind(node.ori.url)
+        logging.info(f"Processing {kind} repository: {origin_swhid}")
+        try:
+            if kind == "Git":
+                metric = get_metrics_for_git_repos(origin_swhid, extraction)
+            elif kind == "PyPI":
+                metric = get_metrics_for_pypi_repos(origin_swhid, extraction)
             else:
-                logging.info(f"Processing general repository: {origin_swhid}")
-                try:
-                    other_metrics = get_general_metrics(origin_swhid)
-                except Exception as e:
-                    logging.error(f"Error: {e} with repo: {origin_swhid}")
+                metric = get_general_metrics(origin_swhid, extraction)
+        except Exception as e:
+            metric = {"error": str(e)}
+
+        if 'error' in metric and over_budget(metric['error']):
+            # Ran out of budget before the history, e.g. while resolving the branches
+            metric = budget_metrics(node.ori.url)
+        if 'error' in metric:
+            logging.error(f"Error: {metric['error']} with repo: {origin_swhid}")
+            if refresh is not None:
+                refresh.record(node, heads, error=metric['error'])
+            return None
+        metric = with_status(metric, budget, origin_swhid)
+        if refresh is not None:
+            refresh.record(node, heads, metric=metric)
+        return metric
+
+async def process_origin_async(client: AsyncGraphClient, origin_swhid: str, extraction: str = "classic") -> Optional[Dict]:
+    """
+    asyncio version of process_origin.
+
+    Args:
+        client (AsyncGraphClient): The client to issue the RPCs with.
+        origin_swhid (str): The swhid of the origin.
+        extraction (str): How the history is fetched, one of EXTRACTION_MODES.
+
+    Returns:
+        Optional[Dict]: The metrics of the origin, None if they could not be computed.
+    """
+    with get_instrumentation().origin(origin_swhid), origin_budget() as budget:
+        refresh = get_refresh_state()
+        node, err = await client.get_node(origin_swhid, fresh=refresh is not None)
+        if err:
+            if over_budget(err):
+                return timeout_metric(None, budget, origin_swhid)
+            logging.error(f"Error: {err} with repo: {origin_swhid}")
+            return None
+
+        heads = []
+        if refresh is not None:
+            outcome = refresh.check(node)
+            if outcome == RESOLVE:
+                _, heads, err = resolve_branches(node, await client.get_nodes(snapshot_ids(node)))
+                if err and over_budget(err):
+                    return timeout_metric(node, budget, origin_swhid)
+                outcome = refresh.check_heads(node, heads, err)
+                if outcome == SKIP:
+                    logging.error(f"Error: {err} with repo: {origin_swhid}")
+                    return None
+            if outcome in (REUSE, SKIP):
+                return refresh_outcome(refresh, node, outcome)
+
+        kind = repository_kind(node.ori.url)
+        logging.info(f"Processing {kind} repository: {origin_swhid}")
+        try:
+            metric = await get_repo_metrics_async(client, origin_swhid, extraction)
+        except Exception as e:
+            metric = {"error": str(e)}
+
+        if 'error' in metric and over_budget(metric['error']):
+            # Ran out of budget before the history, e.g. while resolving the branches
+            metric = budget_metrics(node.ori.url)
+        if 'error' in metric:
+            logging.error(f"Error: {metric['error']} with repo: {origin_swhid}")
+            if refresh is not None:
+                refresh.record(node, heads, error=metric['error'])
+            return None
+        metric = with_status(metric, budget, origin_swhid)
+        if refresh is not None:
+            refresh.record(node, heads, metric=metric)
+        return metric
+
+def open_writer(output_file: str, output_format: str = "csv", resume: bool = False, fsync_every: int = FSYNC_EVERY):
+    """
+    Opens the writer of the chosen output format.
+
+    Args:
+        output_file (str): The metrics CSV file, or the Parquet output directory.
+        output_format (str): One of OUTPUT_FORMATS.
+        resume (bool): Skip the origins recorded in the checkpoint of a previous run (CSV only).
+        fsync_every (int): The number of rows per durable batch for CSV, per row group for Parquet.
+
+    Returns:
+        The MetricsWriter or ParquetMetricsWriter.
+    """
+    if output_format == "parquet":
+        return ParquetMetricsWriter(output_file, row_group_size=fsync_every)
+    return MetricsWriter(output_file, resume=resume, fsync_every=fsync_every)
+
+def get_metrics(input_file, output_file, resume=False, fsync_every=FSYNC_EVERY, extraction="classic", output_format="csv", shard=None):
+    with open_writer(output_file, output_format, resume, fsync_every) as writer:
+        for origin_swhid in read_origins(input_file, shard):
+            if origin_swhid in writer.completed:
+                continue
+            metric = process_origin(origin_swhid, extraction)
+            if metric is not None:
+                writer.write(origin_swhid, metric)
+
+async def get_metrics_async(input_file: str, output_file: str, concurrency: int = DEFAULT_CONCURRENCY, resume: bool = False, fsync_every: int = FSYNC_EVERY, extraction: str = "classic", output_format: str = "csv", shard: Optional[Tuple[int, int]] = None, scheduler: Optional[CostScheduler] = None):
+    """
+    Same as get_metrics, but keeps up to `concurrency` origins in flight on a
+    grpc.aio client. Finished origins are held back until every origin before
+    them is done, so rows are written in input order and the output matches the
+    sequential run.
+
+    With a scheduler, origins are dispatched longest expected first instead, and
+    rows are written as soon as they are computed, in no particular order: the
+    largest origins come first and holding every row behind them would keep the
+    whole run in memory and out of the checkpoint. The checkpoint is keyed by
+    swhid, so resuming is unaffected, and merging shards sorts the rows anyway.
+
+    Args:
+        input_file (str): The CSV file with the origin swhids.
+        output_file (str): The metrics CSV file, or the Parquet output directory.
+        concurrency (int): The maximum number of origins processed at the same time.
+        resume (bool): Skip the origins recorded in the checkpoint of a previous run.
+        fsync_every (int): The number of rows per durable batch.
+        extraction (str): How the history is fetched, one of EXTRACTION_MODES.
+        output_format (str): One of OUTPUT_FORMATS.
+        shard (Optional[Tuple[int, int]]): Only process the origins of this (shard, shards) partition.
+        scheduler (Optional[CostScheduler]): Dispatch the origins by expected cost, recording the actual cost.
+    """
+    with open_writer(output_file, output_format, resume, fsync_every) as writer:
+        origins = list(dict.fromkeys(o for o in read_origins(input_file, shard) if o not in writer.completed))
+        if scheduler is not None:
+            origins = scheduler.plan(origins)
+        pending = iter(enumerate(origins))
+        finished: Dict[int, Optional[Dict]] = {}
+        next_index = 0
+
+        def take(slot: int) -> Optional[Tuple[int, str]]:
+            if scheduler is not None:
+                return scheduler.take(slot < scheduler.large_slots)
+            return next(pending, None)
+
+        async def worker(client, slot):
+            nonlocal next_index
+            # Origins are shared between workers, each one is taken exactly once
+            while True:
+                taken = take(slot)
+                if taken is None:
+                    return
+                index, origin_swhid = taken
+                start = time.perf_counter()
+                metric = await process_origin_async(client, origin_swhid, extraction)
+                if scheduler is not None:
+                    scheduler.record(origin_swhid, time.perf_counter() - start, metric)
+                    if metric is not None:
+                        writer.write(origin_swhid, metric)
                     continue
-                finally:
-                    if 'error' in other_metrics:
-                        logging.error(f"Error: {other_metrics['error']} with repo: {origin_swhid}")
-                        continue
-                    metrics[origin_swhid] = other_metrics
-
-            # time.sleep(0.1)
-
-    # Write metrics to output file
-    with open(output_file, "w") as f:
-        writer = csv.writer(f)
-        writer.writerow(["swhid", "url", "commits", "latest_commit", "age", "devCount", "devs", "c-index", "size", "source"])
-        for swhid, metric in metrics.items():
-            writer.writerow([
-                swhid,
-                metric["url"],
-                metric["commits"],
-                datetime.utcfromtimestamp(metric["latest_commit"]).strftime('%Y-%m-%d %H:%M:%S'),
-                metric["age"] // AGE_FACTOR,
-                metric["devCount"],
-                ";".join(metric["devs"]),
-                metric["c-index"] if "c-index" in metric else "",  # Include C-index if available
-                metric["size"],
-                metric["source"]
-            ])       
+                finished[index] = metric
+                while next_index in finished:
+                    metric = finished.pop(next_index)
+                    if metric is not None:
+                        writer.write(origins[next_index], metric)
+                    next_index += 1
+
+        async with AsyncGraphClient() as client:
+            await asyncio.gather(*(worker(client, slot) for slot in range(max(1, concurrency))))
+
+def run_shards(shards: int, argv: List[str]) -> List[int]:
+    """
+    Runs every shard in its own worker process, with the same arguments plus --shard.
+
+    Args:
+        shards (int): The number of shards.
+        argv (List[str]): The command line arguments of the sharded run.
+
+    Returns:
+        List[int]: The shards whose worker failed.
+    """
+    workers = [subprocess.Popen([sys.executable, sys.argv[0], *argv, "--shard", str(shard)]) for shard in range(shards)]
+    return [shard for shard, worker in enumerate(workers) if worker.wait() != 0]
+
+def merge_shards(input_file: str, output_file: str, shards: int) -> int:
+    """
+    Merges the metrics of every shard into output_file, in input order, and their logs into LOG_FILE.
+
+    Args:
+        input_file (str): The CSV file with the origin swhids.
+        output_file (str): The merged metrics CSV file.
+        shards (int): The number of shards.
+
+    Returns:
+        int: The number of rows written.
+    """
+    rows = merge_metrics([shard_path(output_file, shard, shards) for shard in range(shards)], output_file, read_origins(input_file))
+    merge_logs([shard_path(LOG_FILE, shard, shards) for shard in range(shards)], LOG_FILE)
+    return rows
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Collect repository metrics from the swh-graph server.")
+    parser.add_argument("--mode", choices=["sequential", "async"], default="sequential",
+                        help="Process origins one at a time, or several at once with asyncio.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Number of origins in flight in async mode.")
+    parser.add_argument("--schedule", choices=SCHEDULES, default="input",
+                        help="Dispatch origins in input order, or longest expected first from the previous metrics, writing rows as they complete (async mode only).")
+    parser.add_argument("--large-slots", type=int,
+                        help="Slots reserved to the origins expected to stretch the run with --schedule cost (default: a quarter of --concurrency).")
+    parser.add_argument("--cost-report", default=COST_REPORT_FILE,
+                        help="CSV of the predicted and actual cost of each origin with --schedule cost; the next run fits its cost model to it.")
+    parser.add_argument("--extraction", choices=EXTRACTION_MODES, default="classic",
+                        help="Fetch each history with one RPC per snapshot and head, with a single traversal from the origin, "
+                             "or with one traversal from all the heads, counting shared commits once per developer.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run, skipping the origins in its checkpoint.")
+    parser.add_argument("--fsync-every", type=int, default=FSYNC_EVERY,
+                        help="Number of rows written between two fsyncs of the output and checkpoint.")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="csv",
+                        help=f"Write {OUTPUT_FILE}, or typed repository and developer edge tables to {PARQUET_OUTPUT_DIR}.")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE,
+                        help="Number of repositories per Parquet row group.")
+    parser.add_argument("--sketch", choices=SKETCH_MODES, default="exact",
+                        help="Count commits and developers exactly, with sketches for the histories above --sketch-threshold revisions, or always with sketches.")
+    parser.add_argument("--sketch-threshold", type=int, default=SKETCH_THRESHOLD,
+                        help="Revisions, counted on the server, above which --sketch auto approximates a history.")
+    parser.add_argument("--origin-timeout", type=float,
+                        help="Seconds allowed per origin; past them its streams are cancelled and it is recorded with a timeout status.")
+    parser.add_argument("--max-nodes", type=int,
+                        help="Nodes the traversals of one origin may stream before it is recorded with a partial status.")
+    parser.add_argument("--max-bytes", type=int,
+                        help="Serialized bytes the traversals of one origin may stream before it is recorded with a partial status.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Reuse the metrics of the origins whose snapshots or heads are unchanged since the previous refresh, "
+                             "and skip those that failed on the same snapshots.")
+    parser.add_argument("--refresh-state", default=REFRESH_STATE_FILE,
+                        help="SQLite file keeping the snapshots, heads and metrics of each origin for --refresh.")
+    parser.add_argument("--subtree-cache-size", type=int, default=SUBTREE_CACHE_SIZE,
+                        help="Number of distinct contents kept to share directory sizes across origins, 0 to traverse every tree whole.")
+    parser.add_argument("--node-cache", default=NODE_CACHE_FILE,
+                        help="SQLite file caching GetNode responses across runs, used with --graph-dataset.")
+    parser.add_argument("--graph-dataset", metavar="NAME",
+                        help="Name of the graph export served by the server (the DATASET of server/Dockerfile). "
+                             "Cached nodes are keyed by it, the node cache is disabled without it.")
+    parser.add_argument("--no-node-cache", action="store_true",
+                        help="Always fetch nodes from the server.")
+    parser.add_argument("--local-graph", metavar="DIR",
+                        help="Read the graph from arrays exported by helpers/local_graph.py instead of the server (sequential mode only).")
+    parser.add_argument("--record", metavar="FILE",
+                        help="Record every gRPC call and its responses to this file (e.g. data/run.replay), to replay them with --replay (sequential mode only).")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="Answer the gRPC calls from a recording instead of the server, to profile the client alone (sequential mode only).")
+    parser.add_argument("--replay-speed", type=float, default=0.0,
+                        help="Fraction of the recorded latency reproduced by --replay: 0 for full speed, 1 for the recorded pace.")
+    parser.add_argument("--metrics-file",
+                        help="Write RPC and stage timings to this Prometheus textfile at the end of the run.")
+    parser.add_argument("--trace-file",
+                        help="Append every RPC and stage span to this JSON-lines trace.")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Split the origins into this many shards by swhid hash, each processed by its own worker process.")
+    parser.add_argument("--shard", type=int,
+                        help="Only process this shard, writing per-shard output, log and caches; e.g. to re-run one shard.")
+    parser.add_argument("--merge", action="store_true",
+                        help="Only merge the outputs and logs of the shards of a previous sharded run.")
+    parser.add_argument("--test", action="store_true",
+                        help=f"Use {INPUT_FILE_TEST} and {OUTPUT_FILE_TEST} instead of the full dataset.")
+    args = parser.parse_args()
+    if args.local_graph and args.mode == "async":
+        parser.error("--local-graph is only supported in sequential mode")
+    if (args.record or args.replay) and (args.mode == "async" or args.local_graph):
+        parser.error("--record and --replay are only supported in sequential mode, against the server")
+    if args.record and args.replay:
+        parser.error("--record and --replay are exclusive")
+    if args.schedule == "cost" and args.mode != "async":
+        parser.error("--schedule cost is only supported in async mode")
+    if args.resume and args.output_format == "parquet":
+        parser.error("--resume is only supported with the csv output format")
+    if args.shards < 1 or (args.shard is not None and not 0 <= args.shard < args.shards):
+        parser.error("--shard must be in [0, --shards)")
+    if args.shards > 1 and args.output_format == "parquet":
+        parser.error("--shards is only supported with the csv output format")
+    if args.merge and (args.shards == 1 or args.shard is not None):
+        parser.error("--merge needs --shards and no --shard")
+    return args
 
 if __name__ == "__main__":
+    args = parse_args()
+    # Configured here only, modules importing main (e.g. the benchmarks) keep their own logging
+    configure_logging(shard_path(LOG_FILE, args.shard, args.shards) if args.shard is not None else LOG_FILE)
+
+    input_file, output_file = (INPUT_FILE_TEST, OUTPUT_FILE_TEST) if args.test else (INPUT_FILE, OUTPUT_FILE)
+    if args.shards > 1 and args.shard is None:
+        start_time = time.time()
+        failed = [] if args.merge else run_shards(args.shards, [arg for arg in sys.argv[1:] if arg != "--merge"])
+        rows = merge_shards(input_file, output_file, args.shards)
+        logging.info(f"Merged {rows} rows from {args.shards} shards into {output_file}")
+        if failed:
+            logging.error(f"Shards {failed} failed, re-run each with --shard K --resume, then merge with --merge")
+        logging.info(f"Time taken: {time.time() - start_time} seconds")
+        exit(1 if failed else 0)
+
+    log_file = LOG_FILE
+    shard = None
+    if args.shard is not None:
+        # Every file a worker writes to is its own, so shards never contend
+        shard = (args.shard, args.shards)
+        output_file = shard_path(output_file, *shard)
+        log_file = shard_path(LOG_FILE, *shard)
+        args.node_cache = shard_path(args.node_cache, *shard)
+        args.record = args.record and shard_path(args.record, *shard)
+        args.replay = args.replay and shard_path(args.replay, *shard)
+        args.refresh_state = shard_path(args.refresh_state, *shard)
+        args.cost_report = shard_path(args.cost_report, *shard)
+        args.metrics_file = args.metrics_file and shard_path(args.metrics_file, *shard)
+        args.trace_file = args.trace_file and shard_path(args.trace_file, *shard)
+    if not args.resume:
+        with open(log_file, "w") as f:
+            f.write("")
+    batch_size = args.fsync_every
+    if args.output_format == "parquet":
+        output_file = PARQUET_OUTPUT_DIR_TEST if args.test else PARQUET_OUTPUT_DIR
+        batch_size = args.row_group_size
+    configure_subtree_cache(args.subtree_cache_size)
+    configure_budget(args.origin_timeout, args.max_nodes, args.max_bytes)
+    configure_sketches(args.sketch, args.sketch_threshold)
+    refresh = configure_refresh(args.refresh_state if args.refresh else None)
+    instrumentation = configure_instrumentation(bool(args.metrics_file or args.trace_file), args.trace_file)
+    if args.local_graph:
+        # Nodes are already local, caching them in SQLite would only add work
+        set_client(LocalGraphBackend(args.local_graph))
+        node_cache = configure_node_cache(None)
+    else:
+        # Cached nodes are never requested, they would be missing from a recording
+        node_cache = configure_node_cache(None if args.no_node_cache or args.record or args.replay else args.node_cache,
+                                          args.graph_dataset)
+    recorder = configure_recording(args.record)
+    replay = configure_replay(args.replay, args.replay_speed)
+
+    scheduler = None
+    if args.schedule == "cost":
+        # Read before the run truncates the output, Parquet runs leave no CSV to learn from
+        previous = read_features(output_file) if args.output_format == "csv" else {}
+        large_slots = args.large_slots if args.large_slots is not None else args.concurrency // 4
+        scheduler = CostScheduler(CostModel.fit(args.cost_report), previous, args.concurrency, large_slots, read_failures(args.cost_report))
+
     start_time = time.time()
-    get_metrics(INPUT_FILE, OUTPUT_FILE)
-    # get_metrics(INPUT_FILE_TEST, OUTPUT_FILE_TEST)
-    logging.info(f"Time taken: {time.time() - start_time} seconds")
\ No newline at end of file
+    if args.mode == "async":
+        asyncio.run(get_metrics_async(input_file, output_file, args.concurrency, args.resume, batch_size, args.extraction, args.output_format, shard, scheduler))
+    else:
+        get_metrics(input_file, output_file, args.resume, batch_size, args.extraction, args.output_format, shard)
+    cache = get_subtree_cache()
+    logging.info(f"Subtree cache: {cache.hits} hits, {cache.misses} misses, {len(cache)} entries, {cache.contents} contents")
+    if node_cache is not None:
+        logging.info(f"Node cache: {node_cache.stats()}")
+        node_cache.close()
+    if recorder is not None:
+        logging.info(f"Recorded {recorder.calls} calls to {recorder.path}")
+        recorder.close()
+    if replay is not None:
+        logging.info(f"Replay: {replay.stats()}")
+    if refresh is not None:
+        logging.info(f"Refresh: {refresh.stats()}")
+        refresh.close()
+    if scheduler is not None:
+        logging.info(f"Cost model: {scheduler.summary()}")
+        for swhid, predicted, actual in scheduler.worst():
+            logging.info(f"Cost model: {swhid} predicted {predicted:.3f}s, took {actual:.3f}s")
+        scheduler.write_report(args.cost_report)
+    if instrumentation.enabled:
+        logging.info(f"Stages: {instrumentation.summary()}")
+        if args.metrics_file:
+            instrumentation.write_prometheus(args.metrics_file)
+        instrumentation.close()
+    logging.info(f"Time taken: {time.time() - start_time} seconds")
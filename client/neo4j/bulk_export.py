@@ -0,0 +1,183 @@
+import argparse
+import csv
+import os
+import shlex
+from datetime import datetime
+
+# Exports metrics.csv as node and relationship CSV files for an offline
+# `neo4j-admin database import full`, instead of adding triples one by one
+# through rdflib (see load_csv.py). The labels, property keys and relationship
+# types are the local names of schema.ttl, and nodes keep the `uri` key that
+# rdflib-neo4j gives them, so both loaders produce the same graph.
+
+EX = "http://example.org/schema#"
+METRICS_FILE = "data/metrics.csv"
+IMPORT_DIR = "data/neo4j-import"
+DATABASE = "neo4j"
+
+REPOSITORY_HEADER = ["uri:ID", "swhid", "url", "commits:long", "age:long", "devCount:long",
+                     "size:long", "cIndex:float", "lastUpdated:date", ":LABEL"]
+SOURCE_HEADER = ["uri:ID", "label", ":LABEL"]
+DEV_HEADER = ["uri:ID", "hash", ":LABEL"]
+RELATIONSHIP_HEADER = [":START_ID", ":END_ID", ":TYPE"]
+
+# Every node also gets the Resource label, which load_csv.py's unique uri constraint is declared on
+REPOSITORY_LABELS = "Resource;Repository"
+SOURCE_LABELS = "Resource;Source"
+DEV_LABELS = "Resource;Dev"
+
+
+def uri(local_name: str) -> str:
+    return f"{EX}{local_name}"
+
+def optional_int(value: str):
+    """
+    Parses an integer field, None for missing values written as "" or "None".
+    """
+    return int(value) if value not in ("", "None") else None
+
+def repository_properties(row: dict) -> dict:
+    """
+    Converts a metrics.csv row to the properties of its Repository node, None for missing values.
+
+    Args:
+        row (dict): The row, as read by csv.DictReader.
+
+    Returns:
+        dict: The properties, keyed by their schema.ttl name.
+    """
+    return {
+        "swhid": row["swhid"],
+        "url": row["url"],
+        "commits": optional_int(row["commits"]),
+        "age": optional_int(row["age"]),
+        "devCount": optional_int(row["devCount"]),
+        "size": optional_int(row["size"]),
+        "cIndex": round(float(row["c-index"]), 4) if row["c-index"] not in ("", "None") else None,
+        "lastUpdated": datetime.strptime(row["latest_commit"], "%Y-%m-%d %H:%M:%S").date().isoformat() if row["latest_commit"] else None,
+    }
+
+def repository_row(row: dict) -> list:
+    """
+    Converts a metrics.csv row to a Repository node row, in the order of REPOSITORY_HEADER.
+    """
+    properties = repository_properties(row)
+    field = lambda value: "" if value is None else value
+    return [
+        uri(row["swhid"]),
+        properties["swhid"],
+        properties["url"],
+        field(properties["commits"]),
+        field(properties["age"]),
+        field(properties["devCount"]),
+        field(properties["size"]),
+        "" if properties["cIndex"] is None else f"{properties['cIndex']:.4f}",
+        field(properties["lastUpdated"]),
+        REPOSITORY_LABELS,
+    ]
+
+def row_devs(row: dict) -> list:
+    """
+    Returns the distinct developer hashes of a metrics.csv row, in order.
+    """
+    return [dev_hash for dev_hash in dict.fromkeys(row["devs"].split(";")) if dev_hash]
+
+def export(metrics_file: str = METRICS_FILE, output_dir: str = IMPORT_DIR) -> dict:
+    """
+    Writes the deduplicated import files in one pass over metrics.csv.
+
+    Repository rows and their relationships are streamed to disk; only the
+    distinct sources, developers and developer-source pairs are kept in memory.
+
+    Args:
+        metrics_file (str): The metrics CSV written by main.py.
+        output_dir (str): The directory receiving the import files.
+
+    Returns:
+        dict: The files written, keyed by "nodes" and "relationships", and the row counts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    path = lambda name: os.path.join(output_dir, name)
+    sources = set()
+    devs = set()
+    dev_sources = set()
+    seen_repositories = set()
+    counts = {"Repository": 0, "hostedOn": 0, "contributedTo": 0, "hasContributor": 0}
+
+    with open(metrics_file, newline="") as csvfile, \
+         open(path("repositories.csv"), "w", newline="") as repositories_file, \
+         open(path("hosted_on.csv"), "w", newline="") as hosted_on_file, \
+         open(path("contributed_to.csv"), "w", newline="") as contributed_to_file, \
+         open(path("has_contributor.csv"), "w", newline="") as has_contributor_file:
+        repositories = csv.writer(repositories_file)
+        hosted_on = csv.writer(hosted_on_file)
+        contributed_to = csv.writer(contributed_to_file)
+        has_contributor = csv.writer(has_contributor_file)
+        repositories.writerow(REPOSITORY_HEADER)
+        for writer in (hosted_on, contributed_to, has_contributor):
+            writer.writerow(RELATIONSHIP_HEADER)
+
+        for row in csv.DictReader(csvfile):
+            # A resumed or merged run can repeat an origin, the import needs unique ids
+            if row["swhid"] in seen_repositories:
+                continue
+            seen_repositories.add(row["swhid"])
+            repo_uri = uri(row["swhid"])
+            source = row["source"]
+
+            repositories.writerow(repository_row(row))
+            counts["Repository"] += 1
+            sources.add(source)
+            hosted_on.writerow([repo_uri, uri(source), "hostedOn"])
+            counts["hostedOn"] += 1
+
+            for dev_hash in row_devs(row):
+                devs.add(dev_hash)
+                dev_sources.add((dev_hash, source))
+                contributed_to.writerow([uri(dev_hash), repo_uri, "contributedTo"])
+                has_contributor.writerow([repo_uri, uri(dev_hash), "hasContributor"])
+                counts["contributedTo"] += 1
+                counts["hasContributor"] += 1
+
+    with open(path("sources.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(SOURCE_HEADER)
+        writer.writerows([uri(source), source, SOURCE_LABELS] for source in sorted(sources))
+    with open(path("devs.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(DEV_HEADER)
+        writer.writerows([uri(dev_hash), dev_hash, DEV_LABELS] for dev_hash in sorted(devs))
+    with open(path("contributes_to_source.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(RELATIONSHIP_HEADER)
+        writer.writerows([uri(dev_hash), uri(source), "contributesToSource"] for dev_hash, source in sorted(dev_sources))
+    counts.update({"Source": len(sources), "Dev": len(devs), "contributesToSource": len(dev_sources)})
+
+    return {
+        "nodes": [path(name) for name in ("repositories.csv", "sources.csv", "devs.csv")],
+        "relationships": [path(name) for name in ("hosted_on.csv", "contributed_to.csv", "has_contributor.csv", "contributes_to_source.csv")],
+        "counts": counts,
+    }
+
+def import_command(files: dict, database: str = DATABASE) -> str:
+    """
+    Returns the neo4j-admin command loading the exported files into an empty, stopped database.
+    """
+    args = ["neo4j-admin", "database", "import", "full", database, "--overwrite-destination"]
+    args += [f"--nodes={path}" for path in files["nodes"]]
+    args += [f"--relationships={path}" for path in files["relationships"]]
+    return shlex.join(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export metrics.csv for neo4j-admin database import.")
+    parser.add_argument("--input", default=METRICS_FILE, help="The metrics CSV file.")
+    parser.add_argument("--output", default=IMPORT_DIR, help="The directory receiving the import files.")
+    parser.add_argument("--database", default=DATABASE, help="The database name used in the printed import command.")
+    args = parser.parse_args()
+
+    files = export(args.input, args.output)
+    for name, count in files["counts"].items():
+        print(f"{name}: {count}")
+    print("Import with (database stopped):")
+    print(import_command(files, args.database))
@@ -6,6 +6,13 @@ from rdflib import RDF, RDFS, XSD, Graph, Literal, Namespace, URIRef
 from rdflib_neo4j import HANDLE_VOCAB_URI_STRATEGY, Neo4jStore, Neo4jStoreConfig
 
 
+def add_literal(graph, subject, predicate, value: str, datatype):
+    """
+    Adds a property, leaving out the fields that partial and timeout rows have empty.
+    """
+    if value not in ("", "None"):
+        graph.add((subject, predicate, Literal(value, datatype=datatype)))
+
 def main():
     # Load environment variables for authentification
     auth_data = {'uri': os.getenv("AURA_DB_URI"),
@@ -44,20 +51,22 @@ def main():
             # Add repository properties
             neo4j_aura.add((repo_uri, EX.swhid, Literal(row["swhid"], datatype=XSD.string)))
             neo4j_aura.add((repo_uri, EX.url, Literal(row["url"], datatype=XSD.string)))
-            neo4j_aura.add((repo_uri, EX.commits, Literal(row["commits"], datatype=XSD.integer)))
-            neo4j_aura.add((repo_uri, EX.age, Literal(row["age"], datatype=XSD.integer)))
-            neo4j_aura.add((repo_uri, EX.developers, Literal(row["devCount"], datatype=XSD.integer)))
-            neo4j_aura.add((repo_uri, EX.size, Literal(row["size"], datatype=XSD.integer)))
-            neo4j_aura.add((repo_uri, EX.cIndex, Literal(f"{float(row['c-index']):.4f}", datatype=XSD.float)))
+            add_literal(neo4j_aura, repo_uri, EX.commits, row["commits"], XSD.integer)
+            add_literal(neo4j_aura, repo_uri, EX.age, row["age"], XSD.integer)
+            add_literal(neo4j_aura, repo_uri, EX.devCount, row["devCount"], XSD.integer)
+            add_literal(neo4j_aura, repo_uri, EX.size, row["size"], XSD.integer)
+            if row["c-index"] not in ("", "None"):
+                add_literal(neo4j_aura, repo_uri, EX.cIndex, f"{float(row['c-index']):.4f}", XSD.float)
 
-            last_updated_date = datetime.strptime(row["latest_commit"], "%Y-%m-%d %H:%M:%S").date()
-            neo4j_aura.add((repo_uri, EX.lastUpdated, Literal(last_updated_date.isoformat(), datatype=XSD.date)))
+            if row["latest_commit"]:
+                last_updated_date = datetime.strptime(row["latest_commit"], "%Y-%m-%d %H:%M:%S").date()
+                add_literal(neo4j_aura, repo_uri, EX.lastUpdated, last_updated_date.isoformat(), XSD.date)
 
             # Link repository to its source
             neo4j_aura.add((repo_uri, EX.hostedOn, source_uri))
 
             # Process developers
-            devs = row["devs"].split(";")
+            devs = row["devs"].split(";") if row["devs"] else []
             for dev_hash in devs:
                 # Create a unique URI for the developer
                 dev_uri = URIRef(EX[dev_hash])
@@ -0,0 +1,303 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+from bulk_export import METRICS_FILE, repository_properties, row_devs, uri
+
+# Incremental sync of metrics.csv into Neo4j. Each row is fingerprinted and
+# diffed against the state saved by the previous sync, and only inserted,
+# changed or removed repositories and developer links are sent, as batched
+# UNWIND queries run in parallel write transactions. The state is saved only
+# once every batch has been committed, so a failed sync is simply retried.
+#
+# Parallel MERGEs rely on the n10s_unique_uri constraint (see README.md).
+# Upserts also drop the `developers` property that load_csv.py used to write
+# instead of the schema.ttl `devCount`.
+
+SYNC_STATE_FILE = "data/neo4j_sync_state.json"
+BATCH_SIZE = 5_000
+PARALLELISM = 4
+
+DELETE_REPOSITORIES = """
+UNWIND $rows AS row
+MATCH (r:Repository {uri: row.uri})
+DETACH DELETE r
+"""
+
+UNLINK_DEVS = """
+UNWIND $rows AS row
+MATCH (d:Dev {uri: row.dev})-[c:contributedTo]->(r:Repository {uri: row.repo})
+OPTIONAL MATCH (r)-[h:hasContributor]->(d)
+DELETE c, h
+"""
+
+UPSERT_REPOSITORIES = """
+UNWIND $rows AS row
+MERGE (r:Resource:Repository {uri: row.uri})
+SET r += row.props, r.lastUpdated = CASE WHEN row.lastUpdated IS NULL THEN null ELSE date(row.lastUpdated) END
+REMOVE r.developers
+MERGE (s:Resource:Source {uri: row.source_uri})
+ON CREATE SET s.label = row.source
+WITH r, s, row
+OPTIONAL MATCH (r)-[old:hostedOn]->(other:Source)
+WHERE other.uri <> row.source_uri
+DELETE old
+MERGE (r)-[:hostedOn]->(s)
+"""
+
+LINK_DEVS = """
+UNWIND $rows AS row
+MATCH (r:Repository {uri: row.repo})
+MATCH (s:Source {uri: row.source_uri})
+MERGE (d:Resource:Dev {uri: row.dev})
+ON CREATE SET d.hash = row.hash
+MERGE (d)-[:contributedTo]->(r)
+MERGE (r)-[:hasContributor]->(d)
+MERGE (d)-[:contributesToSource]->(s)
+"""
+
+# contributesToSource is derived from the other links, so it is recomputed for the developers that lost some
+CLEANUP_DEVS = """
+UNWIND $rows AS row
+MATCH (d:Dev {uri: row.dev})
+OPTIONAL MATCH (d)-[c:contributesToSource]->(s:Source)
+WHERE NOT EXISTS { MATCH (d)-[:contributedTo]->(:Repository)-[:hostedOn]->(s) }
+DELETE c
+WITH DISTINCT d
+WHERE NOT EXISTS { MATCH (d)-[:contributedTo]->() }
+DETACH DELETE d
+"""
+
+
+def fingerprint(row: dict) -> str:
+    """
+    Hashes the fields of a metrics.csv row that end up in the graph. Developer order is ignored.
+    """
+    properties = repository_properties(row)
+    payload = json.dumps([properties, row["source"], sorted(row_devs(row))], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def read_metrics(metrics_file: str) -> Iterator[dict]:
+    """
+    Reads metrics.csv, keeping the last row of each repository.
+    """
+    with open(metrics_file, newline="") as csvfile:
+        rows = {row["swhid"]: row for row in csv.DictReader(csvfile)}
+    return iter(rows.values())
+
+def load_state(state_file: str) -> Dict[str, dict]:
+    """
+    Reads the state of the previous sync: per swhid, its fingerprint, source and developers.
+    """
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file) as f:
+        return json.load(f)
+
+def save_state(state_file: str, state: Dict[str, dict]):
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+def plan(rows: Iterator[dict], state: Dict[str, dict]) -> Tuple[Dict[str, List[dict]], Dict[str, dict], Dict[str, int]]:
+    """
+    Diffs the metrics against the previous state.
+
+    Args:
+        rows (Iterator[dict]): The metrics.csv rows.
+        state (Dict[str, dict]): The state of the previous sync.
+
+    Returns:
+        Tuple[Dict[str, List[dict]], Dict[str, dict], Dict[str, int]]:
+        - The query parameters to send, keyed by query name.
+        - The new state.
+        - The number of inserted, changed, unchanged and removed repositories.
+    """
+    changes = {"delete": [], "unlink": [], "upsert": [], "link": [], "cleanup": []}
+    new_state = {}
+    counts = {"inserted": 0, "changed": 0, "unchanged": 0, "removed": 0}
+    cleanup = set()
+
+    for row in rows:
+        swhid = row["swhid"]
+        entry = {"fingerprint": fingerprint(row), "source": row["source"], "devs": row_devs(row)}
+        new_state[swhid] = entry
+        previous = state.get(swhid)
+        if previous is not None and previous["fingerprint"] == entry["fingerprint"]:
+            counts["unchanged"] += 1
+            continue
+        counts["changed" if previous is not None else "inserted"] += 1
+
+        repo_uri = uri(swhid)
+        properties = repository_properties(row)
+        last_updated = properties.pop("lastUpdated")
+        changes["upsert"].append({"uri": repo_uri, "props": properties, "lastUpdated": last_updated,
+                                  "source": row["source"], "source_uri": uri(row["source"])})
+
+        old_devs = set(previous["devs"]) if previous is not None else set()
+        source_changed = previous is not None and previous["source"] != row["source"]
+        for dev_hash in entry["devs"]:
+            # Links to a new source need contributesToSource, so they are all re-sent
+            if dev_hash not in old_devs or source_changed:
+                changes["link"].append({"dev": uri(dev_hash), "hash": dev_hash, "repo": repo_uri, "source_uri": uri(row["source"])})
+        for dev_hash in old_devs.difference(entry["devs"]):
+            changes["unlink"].append({"dev": uri(dev_hash), "repo": repo_uri})
+            cleanup.add(dev_hash)
+        if source_changed:
+            cleanup.update(old_devs)
+
+    for swhid, previous in state.items():
+        if swhid not in new_state:
+            counts["removed"] += 1
+            changes["delete"].append({"uri": uri(swhid)})
+            cleanup.update(previous["devs"])
+
+    changes["cleanup"] = [{"dev": uri(dev_hash)} for dev_hash in sorted(cleanup)]
+    return changes, new_state, counts
+
+# Phases run in order; the batches of one phase run in parallel
+PHASES = [("delete", DELETE_REPOSITORIES), ("unlink", UNLINK_DEVS), ("upsert", UPSERT_REPOSITORIES),
+          ("link", LINK_DEVS), ("cleanup", CLEANUP_DEVS)]
+
+def batches(rows: List[dict], batch_size: int) -> Iterator[List[dict]]:
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+def apply(driver, changes: Dict[str, List[dict]], database: str = None, batch_size: int = BATCH_SIZE, parallelism: int = PARALLELISM) -> Dict[str, int]:
+    """
+    Sends the planned changes as UNWIND batches in write transactions.
+
+    Args:
+        driver: A neo4j.Driver, or a DryRunDriver.
+        changes (Dict[str, List[dict]]): The query parameters, as returned by plan.
+        database (str): The database to write to, None for the default one.
+        batch_size (int): The number of rows per transaction.
+        parallelism (int): The number of transactions in flight within a phase.
+
+    Returns:
+        Dict[str, int]: The number of batches sent per phase.
+    """
+    def write(query, rows):
+        with driver.session(database=database) as session:
+            session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+
+    sent = {}
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as executor:
+        for name, query in PHASES:
+            futures = [executor.submit(write, query, batch) for batch in batches(changes[name], batch_size)]
+            for future in futures:
+                future.result()  # Re-raises the first failure, the state is then left untouched
+            sent[name] = len(futures)
+    return sent
+
+
+class DryRunDriver:
+    """
+    Stand-in for neo4j.Driver that records the queries instead of sending them.
+    """
+
+    def __init__(self):
+        self.queries: List[Tuple[str, dict]] = []
+
+    def session(self, database=None):
+        return _DryRunSession(self)
+
+    def close(self):
+        pass
+
+
+class _DryRunSession:
+    def __init__(self, driver: DryRunDriver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute_write(self, work):
+        return work(self)
+
+    def run(self, query: str, **parameters):
+        self.driver.queries.append((query, parameters))
+        return self
+
+    def consume(self):
+        return None
+
+
+def get_driver(pool_size: int):
+    """
+    Opens a pooled driver with the credentials used by load_csv.py.
+    """
+    from neo4j import GraphDatabase
+    return GraphDatabase.driver(os.getenv("AURA_DB_URI"),
+                                auth=(os.getenv("AURA_DB_USERNAME"), os.getenv("AURA_DB_PWD")),
+                                max_connection_pool_size=pool_size)
+
+def sync(driver, metrics_file: str = METRICS_FILE, state_file: str = SYNC_STATE_FILE, database: str = None,
+         batch_size: int = BATCH_SIZE, parallelism: int = PARALLELISM, mark_synced: bool = False) -> Dict[str, int]:
+    """
+    Brings the database in line with metrics.csv and saves the new state.
+
+    Args:
+        driver: A neo4j.Driver, or a DryRunDriver.
+        metrics_file (str): The metrics CSV written by main.py.
+        state_file (str): The state of the previous sync.
+        database (str): The database to write to, None for the default one.
+        batch_size (int): The number of rows per transaction.
+        parallelism (int): The number of transactions in flight within a phase.
+        mark_synced (bool): Only save the state, e.g. after a bulk import of the same metrics.csv.
+
+    Returns:
+        Dict[str, int]: The repository counts of the diff.
+    """
+    changes, new_state, counts = plan(read_metrics(metrics_file), load_state(state_file))
+    if not mark_synced:
+        counts.update({f"{name} batches": sent for name, sent in apply(driver, changes, database, batch_size, parallelism).items()})
+    save_state(state_file, new_state)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally sync metrics.csv into Neo4j.")
+    parser.add_argument("--input", default=METRICS_FILE, help="The metrics CSV file.")
+    parser.add_argument("--state", default=SYNC_STATE_FILE, help="The state file of the previous sync.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per UNWIND transaction.")
+    parser.add_argument("--parallelism", type=int, default=PARALLELISM, help="Transactions in flight.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the batches instead of sending them; the state is not saved.")
+    parser.add_argument("--mark-synced", action="store_true",
+                        help="Only record metrics.csv as synced, e.g. after loading it with bulk_export.py.")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        driver = DryRunDriver()
+        changes, _, counts = plan(read_metrics(args.input), load_state(args.state))
+        apply(driver, changes, None, args.batch_size, args.parallelism)
+        names = {query: name for name, query in PHASES}
+        for query, parameters in driver.queries:
+            print(f"{names[query]}: {len(parameters['rows'])} rows")
+        print(counts)
+        exit(0)
+
+    if args.mark_synced:
+        print(sync(None, args.input, args.state, mark_synced=True))
+        exit(0)
+
+    if not load_dotenv():
+        print("Error: .env file not found.")
+        exit(1)
+
+    driver = get_driver(args.parallelism)
+    try:
+        print(sync(driver, args.input, args.state, os.getenv("AURA_DB_NAME"), args.batch_size, args.parallelism, args.mark_synced))
+    finally:
+        driver.close()
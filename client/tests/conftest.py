@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The client runs from its own directory, the helpers package is imported relative to it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
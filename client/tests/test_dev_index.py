@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from helpers.dev_index import DevIndex
+
+
+@pytest.fixture(scope="module")
+def rows():
+    rng = random.Random(0)
+    swhids = [f"swh:1:ori:{i:040x}" for i in range(40)]
+    devs = [[f"dev{rng.randrange(30)}" for _ in range(rng.randrange(6))] for _ in swhids]  # Repeats and empty repositories included
+    return swhids, [f"https://github.com/x/r{i}" for i in range(40)], ["GitHub" if i % 3 else "PyPI" for i in range(40)], devs
+
+@pytest.fixture(scope="module")
+def index(rows):
+    return DevIndex.from_rows(*rows)
+
+def brute_shared(rows):
+    swhids, _, _, devs = rows
+    return {(i, j): len(set(devs[i]) & set(devs[j])) for i in range(len(swhids)) for j in range(len(swhids))}
+
+
+@pytest.mark.parametrize("k", [1, 3, 100])
+def test_neighbors(rows, index, k):
+    swhids = rows[0]
+    shared = brute_shared(rows)
+    for i, swhid in enumerate(swhids):
+        expected = sorted(((shared[i, j], j) for j in range(len(swhids)) if j != i and shared[i, j]), key=lambda pair: (-pair[0], pair[1]))
+        assert index.neighbors(swhid, k) == [(swhids[j], count) for count, j in expected[:k]]
+
+@pytest.mark.parametrize("k", [1, 5, 10_000])
+def test_top_pairs(rows, index, k):
+    swhids = rows[0]
+    shared = brute_shared(rows)
+    expected = sorted(((count, i, j) for (i, j), count in shared.items() if i < j and count), key=lambda pair: (-pair[0], pair[1], pair[2]))
+    assert index.top_pairs(k) == [(swhids[i], swhids[j], count) for count, i, j in expected[:k]]
+
+def test_contributors_and_repositories(rows, index):
+    swhids, _, _, devs = rows
+    for swhid, repo_devs in zip(swhids, devs):
+        assert sorted(index.contributors(swhid)) == sorted(set(repo_devs))
+    for dev in index.devs:
+        assert index.repositories(dev) == [swhid for swhid, repo_devs in zip(swhids, devs) if dev in repo_devs]
+
+def test_save_and_load(index, tmp_path):
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = DevIndex.load(path)
+    assert loaded.swhids == index.swhids and loaded.devs == index.devs
+    assert loaded.top_pairs(20) == index.top_pairs(20)
+    assert loaded.neighbors(index.swhids[0]) == index.neighbors(index.swhids[0])
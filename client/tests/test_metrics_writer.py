@@ -0,0 +1,78 @@
+import csv
+
+from helpers.metrics_writer import METRICS_HEADER, MetricsWriter, format_row, load_checkpoint
+
+
+def metric(i, **overrides):
+    row = {"url": f"https://github.com/x/r{i}", "commits": i, "latest_commit": 1500000000 + i, "age": 86400 * i,
+           "devCount": 1, "devs": [str(i)], "c-index": 0.0, "size": 10 * i, "source": "GitHub"}
+    row.update(overrides)
+    return row
+
+def swhid(i):
+    return f"swh:1:ori:{i:040x}"
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_rows_and_checkpoint(tmp_path):
+    output = str(tmp_path / "metrics.csv")
+    with MetricsWriter(output, fsync_every=2) as writer:
+        for i in range(5):
+            writer.write(swhid(i), metric(i))
+    rows = read_rows(output)
+    assert rows[0] == METRICS_HEADER
+    assert [row[0] for row in rows[1:]] == [swhid(i) for i in range(5)]
+    completed, offset = load_checkpoint(f"{output}.checkpoint")
+    assert completed == {swhid(i) for i in range(5)}
+    assert offset == len(open(output, "rb").read())
+
+def test_resume_drops_the_uncommitted_batch(tmp_path):
+    output = str(tmp_path / "metrics.csv")
+    crashed = MetricsWriter(output, fsync_every=2)
+    for i in range(3):
+        crashed.write(swhid(i), metric(i))
+    crashed._file.flush()  # The third row reached the file but not the checkpoint, then the run died
+
+    with MetricsWriter(output, resume=True, fsync_every=2) as writer:
+        assert writer.completed == {swhid(0), swhid(1)}
+        writer.write(swhid(2), metric(2))
+    assert [row[0] for row in read_rows(output)[1:]] == [swhid(0), swhid(1), swhid(2)]
+
+def test_torn_checkpoint_keeps_the_previous_batches(tmp_path):
+    output = str(tmp_path / "metrics.csv")
+    with MetricsWriter(output, fsync_every=1) as writer:
+        writer.write(swhid(0), metric(0))
+    with open(f"{output}.checkpoint", "a") as f:
+        f.write(f"{swhid(1)}\n@12")  # Torn offset line of a batch never committed
+    completed, _ = load_checkpoint(f"{output}.checkpoint")
+    assert completed == {swhid(0)}
+
+def test_resume_without_checkpoint_starts_over(tmp_path):
+    output = str(tmp_path / "metrics.csv")
+    with open(output, "w") as f:
+        f.write("stale\n")
+    with MetricsWriter(output, resume=True) as writer:
+        assert writer.completed == set()
+    assert read_rows(output) == [METRICS_HEADER]
+
+def test_rows_without_commits_have_empty_dates():
+    row = format_row(swhid(0), metric(0, commits=None, latest_commit=None, age=None, **{"c-index": None}))
+    header = dict(zip(METRICS_HEADER, row))
+    assert header["latest_commit"] == "" and header["age"] == ""
+
+def test_resume_after_a_torn_checkpoint(tmp_path):
+    output = str(tmp_path / "metrics.csv")
+    with MetricsWriter(output, fsync_every=1) as writer:
+        writer.write(swhid(0), metric(0))
+    with open(f"{output}.checkpoint", "a") as f:
+        f.write(f"{swhid(1)}\n@1")
+    with MetricsWriter(output, resume=True, fsync_every=1) as writer:
+        writer.write(swhid(1), metric(1))
+        writer.write(swhid(2), metric(2))
+    completed, offset = load_checkpoint(f"{output}.checkpoint")
+    assert completed == {swhid(0), swhid(1), swhid(2)}
+    assert offset == len(open(output, "rb").read())
+    assert [row[0] for row in read_rows(output)[1:]] == [swhid(0), swhid(1), swhid(2)]
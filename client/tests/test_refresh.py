@@ -0,0 +1,82 @@
+import swh.graph.grpc.swhgraph_pb2 as swhgraph
+
+import pytest
+
+from helpers.refresh import COMPUTE, RESOLVE, REUSE, SKIP, RefreshState
+
+ORIGIN = "swh:1:ori:" + "0" * 40
+
+
+def origin(*snapshots):
+    return swhgraph.Node(swhid=ORIGIN, successor=[swhgraph.Successor(swhid=f"swh:1:snp:{s:040x}") for s in snapshots])
+
+def rev(i):
+    return f"swh:1:rev:{i:040x}"
+
+@pytest.fixture
+def state(tmp_path):
+    refresh = RefreshState(str(tmp_path / "refresh.sqlite"))
+    yield refresh
+    refresh.close()
+
+
+def test_unknown_origin_is_resolved(state):
+    assert state.check(origin(1)) == RESOLVE
+    assert state.check_heads(origin(1), [rev(1)]) == COMPUTE
+
+def test_same_snapshots_reuse_the_metrics(state):
+    metric = {"commits": 3, "status": "complete"}
+    state.record(origin(1, 2), [rev(1)], metric=metric)
+    assert state.check(origin(1, 2)) == REUSE
+    assert state.metric(ORIGIN) == metric
+
+def test_snapshot_order_matters(state):
+    state.record(origin(1, 2), [rev(1)], metric={"status": "complete"})
+    assert state.check(origin(2, 1)) == RESOLVE
+
+def test_new_snapshots_with_the_same_heads_reuse_and_record_them(state):
+    metric = {"commits": 3, "status": "complete"}
+    state.record(origin(1), [rev(1)], metric=metric)
+    assert state.check(origin(1, 2)) == RESOLVE
+    assert state.check_heads(origin(1, 2), [rev(1)]) == REUSE
+    # The new snapshots are stored, the next refresh reuses without resolving
+    assert state.check(origin(1, 2)) == REUSE
+    assert state.metric(ORIGIN) == metric
+
+def test_new_heads_are_computed(state):
+    state.record(origin(1), [rev(1)], metric={"status": "complete"})
+    assert state.check_heads(origin(1, 2), [rev(2)]) == COMPUTE
+
+@pytest.mark.parametrize("status", ["partial", "timeout"])
+def test_incomplete_metrics_are_computed_again(state, status):
+    state.record(origin(1), [rev(1)], metric={"status": status})
+    assert state.check(origin(1)) == RESOLVE
+    assert state.check_heads(origin(1), [rev(1)]) == COMPUTE
+
+def test_deterministic_failure_is_skipped_on_the_same_snapshots(state):
+    state.record(origin(1), [], error="No snapshot found")
+    assert state.check(origin(1)) == SKIP
+    assert state.check(origin(1, 2)) == RESOLVE
+
+def test_transient_failure_is_retried(state):
+    state.record(origin(1), [rev(1)], error="gRPC request failed: unavailable (Code: StatusCode.UNAVAILABLE)")
+    assert state.check(origin(1)) == RESOLVE
+    assert state.check_heads(origin(1), [rev(1)]) == COMPUTE
+
+def test_deterministic_resolution_error_is_recorded(state):
+    assert state.check_heads(origin(1), [], "No distinct revisions found") == SKIP
+    assert state.check(origin(1)) == SKIP
+
+def test_transient_resolution_error_is_computed(state):
+    state.record(origin(1), [rev(1)], metric={"status": "complete"})
+    assert state.check_heads(origin(1, 2), [], "gRPC request failed: deadline") == COMPUTE
+
+def test_state_persists_across_runs(tmp_path):
+    path = str(tmp_path / "refresh.sqlite")
+    first = RefreshState(path)
+    first.record(origin(1), [rev(1)], metric={"status": "complete"})
+    first.close()
+    second = RefreshState(path)
+    assert second.check(origin(1)) == REUSE
+    assert second.stats() == "1 reused, 0 skipped, 0 recomputed"
+    second.close()
@@ -0,0 +1,69 @@
+import grpc
+import pytest
+import swh.graph.grpc.swhgraph_pb2 as swhgraph
+
+from benchmarks.fake_server import start_fake_server
+from benchmarks.synthetic_graph import generate_graph
+from helpers.controllers import GraphClient
+from helpers.local_graph import LocalGraphBackend, build_arrays
+from helpers.replay import ReplayError, configure_recording, configure_replay, read_recording
+
+
+@pytest.fixture(scope="module")
+def server():
+    nodes, origins = generate_graph(origins=3, depth=5, branches=2, tree_dirs=2, tree_files=2)
+    grpc_server, port, _ = start_fake_server(LocalGraphBackend.from_arrays(*build_arrays(nodes)))
+    yield f"localhost:{port}", origins
+    grpc_server.stop(None)
+
+@pytest.fixture(autouse=True)
+def reset():
+    yield
+    configure_recording(None)
+    configure_replay(None)
+
+def run(client, origins):
+    """
+    Issues a unary, a streaming and a failing call of each kind, returning their serialized results.
+    """
+    results = []
+    for swhid in origins:
+        node, error = client.get_node(swhid)
+        results.append((node.SerializeToString() if node is not None else None, error))
+        nodes, error = client.traverse([swhid], profile="origin-snapshots")
+        results.append(([n.SerializeToString() for n in nodes] if nodes is not None else None, error))
+    results.append(client.get_node("swh:1:ori:" + "f" * 40))
+    return results
+
+
+def test_replay_answers_like_the_server(server, tmp_path):
+    address, origins = server
+    recording = str(tmp_path / "calls.gz")
+
+    configure_recording(recording)
+    with GraphClient(address) as client:
+        recorded = run(client, origins)
+    configure_recording(None)
+
+    assert recorded[0][1] is None and recorded[-1][1] is not None  # A success and a failure were recorded
+    assert sum(len(calls) for calls in read_recording(recording).values()) == 2 * len(origins) + 1
+
+    replay = configure_replay(recording)
+    with GraphClient(address) as client:
+        assert run(client, origins) == recorded
+    assert replay.missing == 0
+
+def test_unrecorded_call_raises(server, tmp_path):
+    address, origins = server
+    recording = str(tmp_path / "calls.gz")
+    configure_recording(recording)
+    with GraphClient(address) as client:
+        client.get_node(origins[0])
+    configure_recording(None)
+
+    replay = configure_replay(recording)
+    stub = GraphClient(address).stub()
+    with pytest.raises(ReplayError) as raised:
+        stub.GetNode(swhgraph.GetNodeRequest(swhid=origins[1]))
+    assert raised.value.code() == grpc.StatusCode.NOT_FOUND
+    assert replay.missing == 1
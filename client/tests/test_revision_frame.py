@@ -0,0 +1,90 @@
+import random
+
+import numpy as np
+import pytest
+import swh.graph.grpc.swhgraph_pb2 as swhgraph
+
+from helpers.reducers import ContentLengthSum, reduce_stream
+from helpers.revision_frame import RevisionFrame, gini_from_counts
+from helpers.revisions_traversal import summarize_history
+
+
+def revision(i, author, date):
+    return swhgraph.Node(swhid=f"swh:1:rev:{i:040x}", rev=swhgraph.RevisionData(author=author, author_date=date))
+
+def baseline(nodes):
+    """
+    The set and dict collection of the original collect_revisions_timestamps_and_devs_and_size.
+    """
+    distinct_revs, timestamps, devs, commits_per_developer = set(), [], set(), {}
+    for node in nodes:
+        if node.swhid.startswith("swh:1:rev"):
+            distinct_revs.add(node.swhid)
+            if node.HasField("rev"):
+                timestamps.append(node.rev.author_date)
+                devs.add(node.rev.author)
+                commits_per_developer[node.rev.author] = commits_per_developer.get(node.rev.author, 0) + 1
+    return distinct_revs, timestamps, devs, commits_per_developer
+
+def baseline_gini(commits_per_developer):
+    n = len(commits_per_developer)
+    if n == 0:
+        return 0
+    commits = sorted(commits_per_developer.values())
+    total_commits = sum(commits)
+    if total_commits == 0:
+        return 0
+    cumulative_sum = sum((i + 1) * commit for i, commit in enumerate(commits))
+    return (2 * cumulative_sum) / (n * total_commits) - (n + 1) / n
+
+def histories(seed, heads=3, length=300, authors=25):
+    """
+    The streams of several heads sharing part of their history, as the history traversals return them.
+    """
+    rng = random.Random(seed)
+    revisions = [revision(i, rng.randrange(authors), 1_500_000_000 + rng.randrange(10**7)) for i in range(length)]
+    streams = []
+    for _ in range(heads):
+        start = rng.randrange(length // 2)
+        streams.extend(revisions[start:])
+    return streams
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("chunk_size", [7, 8192])
+def test_frame_matches_baseline(seed, chunk_size):
+    nodes = histories(seed)
+    frame = RevisionFrame(chunk_size)
+    reduce_stream(nodes, [frame])
+    distinct_revs, timestamps, devs, commits_per_developer = baseline(nodes)
+
+    assert frame.commit_count() == len(distinct_revs)
+    assert frame.timestamp_range() == (min(timestamps), max(timestamps))
+    assert frame.developer_count() == len(devs)
+    assert frame.commits_per_developer() == commits_per_developer
+    assert list(frame.commits_per_developer()) == list(commits_per_developer)  # Order of first appearance
+    assert frame.gini() == pytest.approx(baseline_gini(commits_per_developer))
+
+    latest_commit, age, gini = summarize_history(frame.timestamp_range(), frame.developer_counts())
+    assert latest_commit == max(timestamps)
+    assert age == max(timestamps) - min(timestamps)
+    assert gini == pytest.approx(baseline_gini(commits_per_developer))
+
+def test_empty_frame():
+    frame = RevisionFrame()
+    reduce_stream([swhgraph.Node(swhid="swh:1:snp:" + "0" * 40)], [frame])
+    assert frame.commit_count() == 0
+    assert frame.timestamp_range() is None
+    assert frame.developer_count() == 0
+    assert frame.gini() is None
+    assert summarize_history(frame.timestamp_range(), frame.developer_counts()) == (None, None, None)
+
+@pytest.mark.parametrize("counts", [[1], [5, 5, 5], [1, 2, 3, 100], [0, 0], [3, 0, 9, 1]])
+def test_gini_matches_baseline(counts):
+    assert gini_from_counts(np.array(counts)) == pytest.approx(baseline_gini(dict(enumerate(counts))))
+
+def test_content_length_sum_counts_each_content_once():
+    contents = [swhgraph.Node(swhid=f"swh:1:cnt:{i % 4:040x}", cnt=swhgraph.ContentData(length=10 * (i % 4))) for i in range(10)]
+    reducer = ContentLengthSum()
+    assert reduce_stream(contents, [reducer]) == [60]
+    assert len(reducer.lengths) == 4
@@ -0,0 +1,87 @@
+import csv
+
+import pytest
+
+from helpers.scheduler import COST_REPORT_HEADER, DEFAULT_COEFFICIENTS, MIN_FIT_ROWS, CostModel, CostScheduler
+
+# Costs one second per commit
+COMMITS = CostModel([0.0, 1.0, 0.0, 0.0])
+FEATURES = {"a": [10, 0, 0], "b": [5, 0, 0], "c": [1, 0, 0]}
+
+
+def drain(scheduler, dedicated):
+    taken = []
+    while (item := scheduler.take(dedicated)) is not None:
+        taken.append(item)
+    return taken
+
+
+def test_plan_orders_longest_first():
+    scheduler = CostScheduler(COMMITS, FEATURES, slots=4, large_slots=0, failures={"e": 7.0, "a": 1.0})
+    # d is unknown and expected to cost the median of the known ones, ties stay in input order
+    assert scheduler.plan(["c", "b", "d", "a", "e"]) == ["a", "e", "b", "d", "c"]
+    assert scheduler.predicted == {"a": 10.0, "b": 5.0, "c": 1.0, "d": 5.0, "e": 7.0}
+    assert scheduler.large == set()
+
+def test_plan_without_known_origins_uses_the_model():
+    scheduler = CostScheduler(CostModel([2.0, 1.0, 0.0, 0.0]), {}, slots=2, large_slots=0)
+    assert scheduler.plan(["x", "y"]) == ["x", "y"]
+    assert scheduler.predicted == {"x": 2.0, "y": 2.0}
+
+def test_only_origins_above_the_share_are_large():
+    features = {"a": [100, 0, 0], "b": [90, 0, 0], **{f"s{i}": [1, 0, 0] for i in range(10)}}
+    scheduler = CostScheduler(COMMITS, features, slots=4, large_slots=3)
+    scheduler.plan(list(features))
+    # The threshold is a quarter of 200 / 4 seconds; only a and b are above it among the 3 largest
+    assert scheduler.large == {"a", "b"}
+
+def test_take_serves_dedicated_slots_the_large_origins():
+    features = {"a": [100, 0, 0], **{f"s{i}": [10 - i, 0, 0] for i in range(5)}}
+    scheduler = CostScheduler(COMMITS, features, slots=3, large_slots=1)
+    order = scheduler.plan(list(features))
+    assert scheduler.large == {"a"}
+
+    assert scheduler.take(False) == (1, "s0")
+    assert scheduler.take(True) == (0, "a")
+    # The large queue is empty, dedicated slots fall back to the small origins
+    assert scheduler.take(True) == (2, "s1")
+    assert drain(scheduler, False) == [(index, order[index]) for index in range(3, 6)]
+    assert scheduler.take(True) is None
+
+def test_take_falls_back_to_the_large_origins():
+    scheduler = CostScheduler(COMMITS, {"a": [100, 0, 0], "b": [1, 0, 0]}, slots=2, large_slots=1)
+    scheduler.plan(["b", "a"])
+    assert drain(scheduler, False) == [(1, "b"), (0, "a")]
+
+def test_large_slots_leave_one_slot_for_the_small_origins():
+    scheduler = CostScheduler(COMMITS, FEATURES, slots=2, large_slots=5)
+    assert scheduler.large_slots == 1
+    scheduler = CostScheduler(COMMITS, FEATURES, slots=1, large_slots=1)
+    scheduler.plan(list(FEATURES))
+    assert scheduler.large == set()
+
+
+def write_report(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COST_REPORT_HEADER)
+        writer.writerows(rows)
+
+def test_fit_recovers_the_coefficients(tmp_path):
+    report = str(tmp_path / "report.csv")
+    coefficients = [0.5, 0.01, 1e-6, 0.1]
+    rows = []
+    for i in range(MIN_FIT_ROWS + 10):
+        features = [i * 37 % 500, i * 7919 % 100_000, i % 9]
+        actual = coefficients[0] + sum(c * x for c, x in zip(coefficients[1:], features))
+        rows.append([f"o{i}", *features, 0, "0", f"{actual:.9f}"])
+    rows.append(["failed", "", "", "", 0, "0", "30.0"])  # Failures have no features and are ignored
+    write_report(report, rows)
+
+    assert CostModel.fit(report).coefficients == pytest.approx(coefficients, rel=1e-4, abs=1e-9)
+
+def test_fit_falls_back_to_the_defaults(tmp_path):
+    report = str(tmp_path / "report.csv")
+    write_report(report, [[f"o{i}", i, i, i, 0, "0", "1.0"] for i in range(MIN_FIT_ROWS)])
+    assert CostModel.fit(report).coefficients.tolist() == DEFAULT_COEFFICIENTS
+    assert CostModel.fit(str(tmp_path / "missing.csv")).coefficients.tolist() == DEFAULT_COEFFICIENTS
@@ -0,0 +1,71 @@
+import csv
+import importlib.util
+import os
+
+from helpers.metrics_writer import METRICS_HEADER
+from helpers.sharding import merge_logs, merge_metrics, shard_of, shard_path
+
+EXTRACT_ORIGINS = os.path.join(os.path.dirname(__file__), "..", "..", "server", "extract_origins.py")
+
+
+def swhid(i):
+    return f"swh:1:ori:{i:040x}"
+
+def row(i, url=None):
+    return [swhid(i), url or f"https://github.com/x/r{i}"] + [""] * (len(METRICS_HEADER) - 2)
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(METRICS_HEADER)
+        writer.writerows(rows)
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_shard_of_is_stable_and_in_range():
+    shards = [shard_of(swhid(i), 8) for i in range(1000)]
+    assert shards == [shard_of(swhid(i), 8) for i in range(1000)]
+    assert set(shards) == set(range(8))
+    assert all(shard_of(swhid(i), 1) == 0 for i in range(10))
+
+def test_shard_of_matches_extract_origins():
+    spec = importlib.util.spec_from_file_location("extract_origins", EXTRACT_ORIGINS)
+    extract_origins = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(extract_origins)
+    for i in range(100):
+        assert shard_of(swhid(i), 7) == extract_origins.shard_of(swhid(i).encode(), 7)
+
+def test_shard_path():
+    assert shard_path("data/metrics.csv", 2, 8) == "data/metrics.shard-002-of-008.csv"
+    assert shard_path("data/output_log.txt", 11, 16) == "data/output_log.shard-011-of-016.txt"
+
+def test_merge_metrics(tmp_path):
+    first, second = str(tmp_path / "a.csv"), str(tmp_path / "b.csv")
+    write_csv(first, [row(3), row(1), row(9)])
+    write_csv(second, [row(2), row(1, "https://github.com/x/rerun"), row(0)])
+    output = str(tmp_path / "metrics.csv")
+
+    count = merge_metrics([first, second, str(tmp_path / "missing.csv")], output, [swhid(i) for i in range(4)])
+
+    rows = read_rows(output)
+    assert rows[0] == METRICS_HEADER
+    # Input order first, then the unknown origins by swhid; the re-run row of origin 1 wins
+    assert [r[0] for r in rows[1:]] == [swhid(i) for i in (0, 1, 2, 3, 9)]
+    assert rows[2][1] == "https://github.com/x/rerun"
+    assert count == 5
+
+def test_merge_logs(tmp_path):
+    first, second = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    with open(first, "w") as f:
+        f.write("2024-01-01 10:00:00,000 - INFO - a1\n2024-01-01 10:00:02,000 - INFO - a2\n")
+    with open(second, "w") as f:
+        f.write("2024-01-01 10:00:01,000 - INFO - b1\n2024-01-01 10:00:03,000 - INFO - b2\n")
+    output = str(tmp_path / "log.txt")
+
+    merge_logs([first, second, str(tmp_path / "missing.txt")], output)
+
+    with open(output) as f:
+        assert [line.rsplit(" ", 1)[1] for line in f.read().splitlines()] == ["a1", "b1", "a2", "b2"]
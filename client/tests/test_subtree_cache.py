@@ -0,0 +1,73 @@
+import hashlib
+
+import pytest
+
+from helpers.controllers import set_client
+from helpers.local_graph import LocalGraphBackend, build_arrays
+from helpers.revisions_traversal import tree_size
+from helpers.subtree_cache import ContentSet, SubtreeSizeCache, configure_subtree_cache, get_subtree_cache
+
+
+def swhid(node_type, name):
+    return f"swh:1:{node_type}:{hashlib.sha1(name.encode()).hexdigest()}"
+
+def contents(*names):
+    return ContentSet.from_lengths({swhid("cnt", name): len(name) for name in names})
+
+
+def test_union_counts_shared_contents_once():
+    union = ContentSet.union([contents("a", "bb"), contents("bb", "ccc"), contents()])
+    assert len(union) == 3
+    assert union.size == 6
+    assert list(union.ids) == sorted(union.ids)
+    assert ContentSet.union([]).size == 0
+
+def test_cache_is_bounded_by_contents():
+    cache = SubtreeSizeCache(max_contents=4)
+    cache.put("d1", contents("a", "b"))
+    cache.put("d2", contents("c", "d"))
+    assert cache.get("d1") is not None  # d2 is now the least recently used
+    cache.put("d3", contents("e"))
+    assert cache.get("d2") is None
+    assert cache.contents == 3 and len(cache) == 2
+    cache.put("big", contents("f", "g", "h", "i", "j"))  # Larger than the whole cache
+    assert cache.get("big") is None and cache.contents == 3
+
+def test_disabled_cache_stores_nothing():
+    cache = SubtreeSizeCache(max_contents=0)
+    cache.put("d1", contents("a"))
+    assert not cache.enabled and len(cache) == 0
+
+
+@pytest.fixture
+def trees():
+    """
+    Two roots sharing a subdirectory, with a content present in several subdirectories and in a root.
+    """
+    nodes = {}
+    def add(node_id, successors=(), length=-1):
+        nodes[node_id] = ([(successor, ()) for successor in successors], 0, 0, length, None)
+    for name, length in [("shared", 100), ("x", 10), ("y", 20), ("z", 40)]:
+        add(swhid("cnt", name), length=length)
+    add(swhid("dir", "common"), [swhid("cnt", "shared"), swhid("cnt", "x")])
+    add(swhid("dir", "nested"), [swhid("dir", "common"), swhid("cnt", "y")])
+    add(swhid("dir", "other"), [swhid("cnt", "shared"), swhid("cnt", "z")])
+    add(swhid("dir", "root1"), [swhid("dir", "common"), swhid("dir", "other"), swhid("cnt", "shared")])
+    add(swhid("dir", "root2"), [swhid("dir", "nested"), swhid("dir", "other"), swhid("cnt", "y")])
+    set_client(LocalGraphBackend.from_arrays(*build_arrays(nodes)))
+    previous = get_subtree_cache().max_contents
+    yield [swhid("dir", "root1"), swhid("dir", "root2")]
+    set_client(None)
+    configure_subtree_cache(previous)
+
+def test_cached_sizes_match_a_full_traversal(trees):
+    configure_subtree_cache(0)
+    expected = [tree_size(root) for root in trees]
+    assert expected == [(150, None), (170, None)]
+
+    configure_subtree_cache(1000)
+    assert [tree_size(root) for root in trees] == expected
+    cache = get_subtree_cache()
+    assert cache.hits >= 1  # root2 reused the "other" subdirectory of root1
+    assert [tree_size(root) for root in trees] == expected
+    assert all(cache.get(root) is not None for root in trees)
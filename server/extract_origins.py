@@ -0,0 +1,228 @@
+import argparse
+import hashlib
+import mmap
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+ORIGIN_PREFIX = b"swh:1:ori:"
+CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def scan_chunk(data) -> Iterator[bytes]:
+    """
+    Finds the origin lines of a buffer that starts at a line boundary.
+
+    Args:
+        data (bytes | mmap.mmap): The buffer. Its last line must be complete.
+
+    Yields:
+        bytes: The origin swhids, without the newline.
+    """
+    pos = 0 if data[:len(ORIGIN_PREFIX)] == ORIGIN_PREFIX else data.find(b"\n" + ORIGIN_PREFIX)
+    while pos != -1:
+        if data[pos:pos + 1] == b"\n":
+            pos += 1
+        end = data.find(b"\n", pos)
+        if end == -1:
+            end = len(data)
+        yield bytes(data[pos:end]).rstrip(b"\r")
+        pos = data.find(b"\n" + ORIGIN_PREFIX, end)
+
+def scan_stream(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Scans a node list read sequentially, one chunk at a time.
+
+    Args:
+        stream (BinaryIO): The uncompressed graph.nodes.csv content.
+        chunk_size (int): The number of bytes read at once.
+
+    Yields:
+        bytes: The origin swhids, in file order.
+    """
+    tail = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        data = tail + chunk
+        cut = data.rfind(b"\n") + 1
+        tail = data[cut:]
+        yield from scan_chunk(data[:cut])
+    if tail:
+        yield from scan_chunk(tail)
+
+def _scan_range(args: Tuple[str, int, int, str]) -> int:
+    path, start, end, part_path = args
+    count = 0
+    with open(path, "rb") as f, open(part_path, "wb") as out:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # Slicing an mmap copies, so scan it in windows aligned on newlines
+            pos = start
+            while pos < end:
+                window_end = min(end, pos + CHUNK_SIZE)
+                if window_end < end:
+                    window_end = data.rfind(b"\n", pos, window_end) + 1 or window_end
+                for swhid in scan_chunk(data[pos:window_end]):
+                    out.write(swhid + b"\n")
+                    count += 1
+                pos = window_end
+    return count
+
+def split_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """
+    Splits a file into byte ranges that start and end on line boundaries.
+
+    Args:
+        path (str): The file.
+        parts (int): The number of ranges wanted.
+
+    Returns:
+        List[Tuple[int, int]]: The (start, end) offsets, in file order.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def scan_file_parallel(path: str, output_file: str, workers: int = DEFAULT_WORKERS) -> int:
+    """
+    Scans an uncompressed node list with one process per byte range. Each worker
+    memory-maps the file and writes its origins to a part file; the parts are then
+    concatenated in order, so the output matches a sequential scan.
+
+    Args:
+        path (str): The uncompressed graph.nodes.csv.
+        output_file (str): Where to write the origin swhids, one per line.
+        workers (int): The number of processes.
+
+    Returns:
+        int: The number of origins written.
+    """
+    ranges = split_ranges(path, max(1, workers))
+    parts = [f"{output_file}.part{i}" for i in range(len(ranges))]
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+            count = sum(executor.map(_scan_range, [(path, start, end, part) for (start, end), part in zip(ranges, parts)]))
+        with open(output_file, "wb") as out:
+            for part in parts:
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, out)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+    return count
+
+def open_nodes(source: str, command: Optional[List[str]] = None) -> Tuple[BinaryIO, Optional[subprocess.Popen]]:
+    """
+    Opens the uncompressed node list as a binary stream.
+
+    Args:
+        source (str): A graph.nodes.csv or graph.nodes.csv.zst path, ignored if a command is given.
+        command (Optional[List[str]]): A command writing the node list to stdout, e.g. a docker exec.
+
+    Returns:
+        Tuple[BinaryIO, Optional[subprocess.Popen]]: The stream and the process feeding it, if any.
+    """
+    if command is None and source.endswith(".zst"):
+        command = ["zstd", "-dc", source]
+    if command is not None:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=CHUNK_SIZE)
+        return process.stdout, process
+    return open(source, "rb"), None
+
+def shard_of(swhid: bytes, shards: int) -> int:
+    """
+    Returns the index shard of an origin. Stable across runs and Python versions.
+    """
+    return int.from_bytes(hashlib.blake2b(swhid, digest_size=8).digest(), "big") % shards
+
+def write_shards(origins_file: str, index_dir: str, shards: int):
+    """
+    Splits an origin list into shards, so a lookup or a worker only loads one of them.
+
+    Args:
+        origins_file (str): The origin swhids, one per line.
+        index_dir (str): The directory receiving origins-<k>.csv files.
+        shards (int): The number of shards.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    outputs = [open(os.path.join(index_dir, f"origins-{k:03d}.csv"), "wb") for k in range(shards)]
+    try:
+        with open(origins_file, "rb") as f:
+            for line in f:
+                swhid = line.rstrip(b"\n")
+                if swhid:
+                    outputs[shard_of(swhid, shards)].write(swhid + b"\n")
+    finally:
+        for output in outputs:
+            output.close()
+
+def extract_origins(source: str, output_file: str, command: Optional[List[str]] = None, workers: int = 1, shards: int = 0, index_dir: Optional[str] = None) -> int:
+    """
+    Writes the origins of a node list to output_file, in constant memory. Plain CSV
+    files are scanned in parallel when workers > 1; compressed files and command
+    output are streamed.
+
+    Args:
+        source (str): A graph.nodes.csv or graph.nodes.csv.zst path.
+        output_file (str): Where to write the origin swhids, one per line.
+        command (Optional[List[str]]): A command writing the node list to stdout, used instead of source.
+        workers (int): The number of processes for plain CSV files.
+        shards (int): The number of index shards to write, 0 for none.
+        index_dir (Optional[str]): Where to write the shards, defaults to <output_file>.index.
+
+    Returns:
+        int: The number of origins written.
+
+    Raises:
+        RuntimeError: If the decompression command fails.
+    """
+    tmp_file = f"{output_file}.tmp"
+    if command is None and workers > 1 and not source.endswith(".zst"):
+        count = scan_file_parallel(source, tmp_file, workers)
+    else:
+        stream, process = open_nodes(source, command)
+        count = 0
+        try:
+            with open(tmp_file, "wb") as out:
+                for swhid in scan_stream(stream):
+                    out.write(swhid + b"\n")
+                    count += 1
+        finally:
+            stream.close()
+            if process is not None and process.wait() != 0:
+                os.remove(tmp_file)
+                raise RuntimeError(f"{' '.join(process.args)} exited with code {process.returncode}")
+    # Only expose complete lists, so an interrupted run is not mistaken for a finished one
+    os.replace(tmp_file, output_file)
+
+    if shards > 0:
+        write_shards(output_file, index_dir or f"{output_file}.index", shards)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the origin swhids of a graph.nodes.csv(.zst).")
+    parser.add_argument("source", help="graph.nodes.csv or graph.nodes.csv.zst, '-' to read a command's output.")
+    parser.add_argument("output", help="Output file, one origin swhid per line.")
+    parser.add_argument("--command", nargs=argparse.REMAINDER,
+                        help="Command writing the node list to stdout, e.g. docker exec <container> zstd -dc <path>.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Processes used to scan plain CSV files.")
+    parser.add_argument("--shards", type=int, default=0, help="Also write a sharded origin index with this many shards.")
+    parser.add_argument("--index-dir", help="Directory of the sharded index, defaults to <output>.index.")
+    args = parser.parse_args()
+
+    count = extract_origins(args.source, args.output, args.command, args.workers, args.shards, args.index_dir)
+    print(f"Extracted {count} origins to {args.output}")
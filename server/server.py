@@ -1,10 +1,12 @@
 import docker.docker as docker 
 import os
 
+from server.extract_origins import extract_origins
+
 IMAGE_NAME = "swh-graph-service"
 CONTAINER_NAME = "swh-graph-service-container"
 DOCKER_FILE_PATH = os.path.join(os.getcwd(), "server")
-TARGET_PATH = "/root/2021-03-23-popular-3k-python/output/graph.nodes.csv"
+TARGET_PATH = "/root/2021-03-23-popular-3k-python/compressed/graph.nodes.csv.zst"
 DEST_PATH = os.path.join(os.getcwd(), "server", "files", "data", "graph.nodes.csv")
 
 
@@ -21,20 +23,11 @@ def main():
             if not res:
                 raise Exception("Failed to run the Docker container.")
             else:
-                # Copy the file from the container to the host
-                res = docker.docker_cp(CONTAINER_NAME, TARGET_PATH, DEST_PATH)
-                if not res:
-                    raise Exception("Failed to copy the file from the container.")
-                else:
-                    with open(DEST_PATH, "r") as f:
-                        lines = f.readlines()
-                    
-                    print("Filtering origins")
-                    # Keep only origins and rewrite file
-                    with open(DEST_PATH, "w") as f:
-                        for line in lines:
-                            if line.startswith("swh:1:ori"):
-                                f.write(line)
+                # Stream the node list out of the container and keep only the origins
+                print("Extracting origins")
+                cmd = ["docker", "exec", CONTAINER_NAME, "zstd", "-dc", TARGET_PATH]
+                count = extract_origins(TARGET_PATH, DEST_PATH, command=cmd)
+                print(f"Extracted {count} origins to '{DEST_PATH}'.")
                 
         while True:
             inp = input("Type 'exit' to stop the program: ")